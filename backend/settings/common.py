@@ -42,6 +42,19 @@ CACHES = {
     }
 }
 
+# Max time the memberships of a user are kept in the cache (they are also
+# invalidated whenever they change)
+PERMISSIONS_MEMBERSHIPS_CACHE_TIMEOUT = 300  # seconds
+
+# Max time the filters data of a project is shared between the requests with
+# the same params and permissions (it is also invalidated whenever the project
+# items change). None or 0 disables the cache.
+FILTERS_DATA_CACHE_TIMEOUT = 60  # seconds
+
+# Store the generated CSV exports (of epics, user stories, tasks and issues)
+# in the default storage and serve them from there until their data changes.
+CSV_SNAPSHOTS_ENABLED = True
+
 INSTANCE_TYPE = "SRC"
 
 # CELERY
@@ -217,6 +230,7 @@ DJMAIL_TEMPLATE_EXTENSION = "jinja"
 EVENTS_PUSH_BACKEND = "taiga.events.backends.postgresql.EventsPushBackend"
 # EVENTS_PUSH_BACKEND = "taiga.events.backends.rabbitmq.EventsPushBackend"
 # EVENTS_PUSH_BACKEND_OPTIONS = {"url": "//guest:guest@127.0.0.1/"}
+EVENTS_PUSH_OUTBOX_MAX_SIZE = 100  # max events of a transaction sent in one batch
 
 # Message System
 MESSAGE_STORAGE = "django.contrib.messages.storage.session.SessionStorage"
@@ -455,6 +469,9 @@ SIMPLE_JWT = {
 
 FLUSH_REFRESHED_TOKENS_PERIODICITY = 3 * 24 * 3600 # seconds
 
+# Recompute the week/month/year totals of the projects (fans and activity)
+PROJECTS_TOTALS_REFRESH_PERIODICITY = 3600 # seconds
+
 FORMAT_MODULE_PATH = "taiga.base.formats"
 
 DATE_INPUT_FORMATS = (
@@ -525,6 +542,8 @@ USER_EMAIL_ALLOWED_DOMAINS = None
 PRIVATE_USER_PROFILES = False
 
 SEARCHES_MAX_RESULTS = 150
+SEARCHES_TYPEAHEAD_MAX_RESULTS = 10
+SEARCHES_TYPEAHEAD_CACHE_TIMEOUT = 30  # seconds
 
 SOUTH_MIGRATION_MODULES = {
     'easy_thumbnails': 'easy_thumbnails.south_migrations',
@@ -598,6 +617,11 @@ GITLAB_VALID_ORIGIN_IPS = []
 
 EXPORTS_TTL = 60 * 60 * 24  # 24 hours
 
+# Store the epics, user stories, tasks, issues and timeline entries of the
+# imported project dumps in batches, with bulk inserts and without the model
+# signals (their effects on the new project are reproduced by the importer).
+IMPORTS_BULK_STORE_ENABLED = True
+
 WEBHOOKS_ENABLED = False
 WEBHOOKS_ALLOW_PRIVATE_ADDRESS = False
 WEBHOOKS_ALLOW_REDIRECTS = False
@@ -660,10 +684,19 @@ IMPORTERS = {
 # Configuration for sending notifications
 NOTIFICATIONS_CUSTOM_FILTER = False
 
+# TIMELINE
+# If True every project event is stored only once and the user and profile
+# timelines are built when they are read (see the compact_timeline_fanout command
+# to migrate the existing timelines).
+TIMELINE_FANOUT_ON_READ = False
+TIMELINE_PAGE_CACHE_TIMEOUT = 60  # In seconds
+TIMELINE_PAGE_CACHE_MAX_PAGE = 3  # Only the first pages of each timeline are cached
+
 # MDRENDER
 MDRENDER_CACHE_ENABLE = True
 MDRENDER_CACHE_MIN_SIZE = 40
 MDRENDER_CACHE_TIMEOUT = 86400
+MDRENDER_ENGINES_POOL_SIZE = 2  # idle Markdown engines kept by every thread
 
 # TELEMETRY
 
@@ -12,24 +12,26 @@ class LoginFailRateThrottle(throttling.GlobalThrottlingMixin, throttling.Throttl
     scope = "login-fail"
     throttled_actions = ["create", "refresh", "verify"]
 
-    def throttle_success(self, request, view):
-        return True
+    def exceeded_throttling_restriction(self, request, view):
+        # Only the failed requests are counted (on finalize)
+        self._wait = self.counter.check(self.get_rates(), now=self.now)
+        return self._wait is not None
 
     def finalize(self, request, response, view):
         if response.status_code in [400, 401]:
-            self.history.insert(0, self.now)
-            self.cache.set(self.key, self.history, self.duration)
+            self.count_request()
 
 
 class RegisterSuccessRateThrottle(throttling.GlobalThrottlingMixin, throttling.ThrottleByActionMixin, throttling.SimpleRateThrottle):
     scope = "register-success"
     throttled_actions = ["register"]
 
-    def throttle_success(self, request, view):
-        return True
+    def exceeded_throttling_restriction(self, request, view):
+        # Only the successful requests are counted (on finalize)
+        self._wait = self.counter.check(self.get_rates(), now=self.now)
+        return self._wait is not None
 
     def finalize(self, request, response, view):
         if response.status_code == 201:
-            self.history.insert(0, self.now)
-            self.cache.set(self.key, self.history, self.duration)
+            self.count_request()
 
@@ -43,6 +43,169 @@ from .settings import api_settings
 import time
 
 
+# Check all the rates and, if none of them is exceeded, count the request in
+# all of them. KEYS are the (previous, current) window counters of every rate
+# and ARGV the cost followed by the (weight of the previous window, number of
+# requests, ttl) of every rate. It returns the counters read.
+SLIDING_WINDOW_HIT_SCRIPT = """
+local cost = tonumber(ARGV[1])
+local counts = {}
+local allowed = 1
+for i = 1, #KEYS / 2 do
+    local previous = tonumber(redis.call("GET", KEYS[2 * i - 1]) or "0")
+    local current = tonumber(redis.call("GET", KEYS[2 * i]) or "0")
+    if previous * tonumber(ARGV[3 * i - 1]) + current + cost > tonumber(ARGV[3 * i]) then
+        allowed = 0
+    end
+    counts[2 * i - 1] = previous
+    counts[2 * i] = current
+end
+if allowed == 1 and cost > 0 then
+    for i = 1, #KEYS / 2 do
+        redis.call("INCRBY", KEYS[2 * i], cost)
+        redis.call("EXPIRE", KEYS[2 * i], tonumber(ARGV[3 * i + 1]))
+    end
+end
+return counts
+"""
+
+
+def _get_redis_client(cache):
+    # django-redis and the django (>= 4.0) redis cache backends
+    client = getattr(cache, "client", None) or getattr(cache, "_cache", None)
+    if client is not None and hasattr(client, "get_client"):
+        return client.get_client(write=True)
+    return None
+
+
+class SlidingWindowCounter(object):
+    """
+    Sliding window rate limiter. Only two counters are stored per rate: the
+    requests of the current and the previous fixed windows. The requests of
+    the previous window are weighted by how much it overlaps with the sliding
+    window that ends now.
+
+    The counters are updated with an atomic `incr` or, if the cache is a
+    redis cache, with a lua script that checks and updates all the rates in a
+    single round-trip.
+
+    Rates are (key, number of requests, duration in seconds) tuples.
+    """
+
+    def __init__(self, cache=None, timer=time.time):
+        self.cache = cache or default_cache
+        self.timer = timer
+
+    def _get_windows(self, rates, now):
+        windows = []
+        for key, num_requests, duration in rates:
+            window = int(now // duration)
+            elapsed = now - window * duration
+            windows.append({
+                "previous_key": "{}:{}".format(key, window - 1),
+                "current_key": "{}:{}".format(key, window),
+                "weight": 1 - elapsed / duration,
+                "elapsed": elapsed,
+                "num_requests": num_requests,
+                "duration": duration,
+            })
+        return windows
+
+    def _get_wait(self, window, previous, current, cost):
+        """
+        Seconds until `cost` requests fit in the rate, or None if they already fit.
+        """
+        num_requests, duration, elapsed = window["num_requests"], window["duration"], window["elapsed"]
+        if previous * window["weight"] + current + cost <= num_requests:
+            return None
+
+        if cost > num_requests:
+            return duration
+
+        if current + cost > num_requests:
+            # The current window will be the previous one
+            return (duration - elapsed) + duration * (1 - (num_requests - cost) / current)
+
+        return duration * (1 - (num_requests - cost - current) / previous) - elapsed
+
+    def _get_waits(self, windows, counts, cost):
+        waits = [self._get_wait(window, previous, current, cost)
+                 for window, (previous, current) in zip(windows, counts)]
+        waits = [wait for wait in waits if wait is not None]
+        return max(waits) if waits else None
+
+    def _read_counts(self, windows):
+        keys = [k for window in windows for k in (window["previous_key"], window["current_key"])]
+        values = self.cache.get_many(keys)
+        return [(values.get(window["previous_key"], 0), values.get(window["current_key"], 0))
+                for window in windows]
+
+    def _incr(self, window, cost):
+        key = window["current_key"]
+        if self.cache.add(key, cost, timeout=2 * window["duration"]):
+            return cost
+        try:
+            return self.cache.incr(key, cost)
+        except ValueError:
+            # Expired between add and incr
+            self.cache.add(key, cost, timeout=2 * window["duration"])
+            return cost
+
+    def _redis_hit(self, client, windows, cost):
+        keys, args = [], [cost]
+        for window in windows:
+            keys += [self.cache.make_key(window["previous_key"]), self.cache.make_key(window["current_key"])]
+            args += [repr(window["weight"]), window["num_requests"], 2 * window["duration"]]
+
+        result = [int(count) for count in client.eval(SLIDING_WINDOW_HIT_SCRIPT, len(keys), *keys, *args)]
+        return list(zip(result[::2], result[1::2]))
+
+    def hit(self, rates, cost=1, now=None):
+        """
+        Count a request of `cost` in all the rates if none of them is
+        exceeded. Return None if it is allowed or the seconds to wait.
+        """
+        windows = self._get_windows(rates, self.timer() if now is None else now)
+
+        client = _get_redis_client(self.cache)
+        if client is not None:
+            return self._get_waits(windows, self._redis_hit(client, windows, cost), cost)
+
+        # Count the request first, so concurrent requests can't exceed the
+        # rates, and discount it if any of them is exceeded.
+        previous_counts = [previous for previous, current in self._read_counts(windows)]
+        counts = [(previous, self._incr(window, cost) - cost)
+                  for window, previous in zip(windows, previous_counts)]
+
+        wait = self._get_waits(windows, counts, cost)
+        if wait is not None:
+            for window in windows:
+                try:
+                    self.cache.decr(window["current_key"], cost)
+                except ValueError:
+                    pass
+        return wait
+
+    def check(self, rates, cost=1, now=None):
+        """
+        Like `hit` but without counting the request.
+        """
+        windows = self._get_windows(rates, self.timer() if now is None else now)
+
+        client = _get_redis_client(self.cache)
+        if client is not None:
+            return self._get_waits(windows, self._redis_hit(client, windows, 0), cost)
+
+        return self._get_waits(windows, self._read_counts(windows), cost)
+
+    def add(self, rates, cost=1, now=None):
+        """
+        Count a request of `cost` in all the rates without checking them.
+        """
+        for window in self._get_windows(rates, self.timer() if now is None else now):
+            self._incr(window, cost)
+
+
 class BaseThrottle(object):
     """
     Rate throttling of requests.
@@ -77,7 +240,8 @@ class SimpleRateThrottle(BaseThrottle):
 
     Period should be one of: ("s", "sec", "m", "min", "h", "hour", "d", "day")
 
-    Previous request information used for throttling is stored in the cache.
+    Previous request information used for throttling is stored in the cache
+    by a `SlidingWindowCounter`.
     """
 
     cache = default_cache
@@ -133,6 +297,12 @@ class SimpleRateThrottle(BaseThrottle):
         duration = {"s": 1, "m": 60, "h": 3600, "d": 86400}[period[0]]
         return (num_requests, duration)
 
+    def get_counter(self):
+        return SlidingWindowCounter(self.cache, self.timer)
+
+    def get_rates(self):
+        return [(self.key, self.num_requests, self.duration)]
+
     def allow_request(self, request, view):
         """
         Implement the check to see if the request should be throttled.
@@ -147,28 +317,39 @@ class SimpleRateThrottle(BaseThrottle):
         if self.key is None:
             return True
 
-        self.history = self.cache.get(self.key, [])
+        self.counter = self.get_counter()
         self.now = self.timer()
-
-        # Drop any requests from the history which have now passed the
-        # throttle duration
-        while self.history and self.history[-1] <= self.now - self.duration:
-            self.history.pop()
+        self._wait = None
 
         if self.exceeded_throttling_restriction(request, view):
             return self.throttle_failure()
         return self.throttle_success(request, view)
 
+    def get_request_cost(self, request, view):
+        """
+        Number of requests counted for this request.
+        """
+        return 1
+
     def exceeded_throttling_restriction(self, request, view):
-        return len(self.history) >= self.num_requests
+        """
+        Check the rate and count the request if it is not exceeded.
+        """
+        cost = self.get_request_cost(request, view)
+        self._wait = self.counter.hit(self.get_rates(), cost=cost, now=self.now)
+        return self._wait is not None
+
+    def count_request(self, cost=1):
+        """
+        Count a request without checking the rate, for the throttles that
+        only count some responses (see `finalize`).
+        """
+        self.counter.add(self.get_rates(), cost=cost, now=self.now)
 
     def throttle_success(self, request, view):
         """
-        Inserts the current request's timestamp along with the key
-        into the cache.
+        Called when a request to the API has been allowed.
         """
-        self.history.insert(0, self.now)
-        self.cache.set(self.key, self.history, self.duration)
         return True
 
     def throttle_failure(self):
@@ -181,16 +362,7 @@ class SimpleRateThrottle(BaseThrottle):
         """
         Returns the recommended next request time in seconds.
         """
-        if self.history:
-            remaining_duration = self.duration - (self.now - self.history[-1])
-        else:
-            remaining_duration = self.duration
-
-        available_requests = self.num_requests - len(self.history) + 1
-        if available_requests <= 0:
-            return None
-
-        return remaining_duration / float(available_requests)
+        return getattr(self, "_wait", None)
 
 
 class AnonRateThrottle(SimpleRateThrottle):
@@ -17,6 +17,7 @@ from django.utils.translation import gettext as _
 from taiga.base import exceptions as exc
 from taiga.base.api.utils import get_object_or_error
 from taiga.base.utils.db import to_tsquery
+from taiga.permissions.services import get_user_project_ids_with_perm
 
 logger = logging.getLogger(__name__)
 
@@ -27,16 +28,7 @@ def get_filter_expression_can_view_projects(user, project_id=None):
         return Q()
     elif user.is_authenticated:
         # authenticated user & project member
-        membership_model = apps.get_model("projects", "Membership")
-        memberships_qs = membership_model.objects.filter(user=user)
-        if project_id:
-            memberships_qs = memberships_qs.filter(project_id=project_id)
-        memberships_qs = memberships_qs.filter(
-            Q(role__permissions__contains=['view_project']) |
-            Q(is_admin=True))
-
-        projects_list = [membership.project_id for membership in
-                         memberships_qs]
+        projects_list = get_user_project_ids_with_perm(user, "view_project", project_id=project_id)
 
         return (Q(id__in=projects_list) |
                 Q(public_permissions__contains=["view_project"]))
@@ -154,15 +146,8 @@ class PermissionBasedFilterBackend(FilterBackend):
         if request.user.is_authenticated and request.user.is_superuser:
             qs = qs
         elif request.user.is_authenticated:
-            membership_model = apps.get_model('projects', 'Membership')
-            memberships_qs = membership_model.objects.filter(user=request.user)
-            if project_id:
-                memberships_qs = memberships_qs.filter(project_id=project_id)
-            memberships_qs = memberships_qs.filter(
-                Q(role__permissions__contains=[self.permission]) |
-                Q(is_admin=True))
-
-            projects_list = [membership.project_id for membership in memberships_qs]
+            projects_list = get_user_project_ids_with_perm(request.user, self.permission,
+                                                           project_id=project_id)
 
             qs = qs.filter(Q(**{f"{self.project_query_param}_id__in": projects_list}) |
                            Q(**{f"{self.project_query_param}__public_permissions__contains": [self.permission]}))
@@ -280,15 +265,8 @@ class MembersFilterBackend(PermissionBasedFilterBackend):
         if request.user.is_authenticated and request.user.is_superuser:
             qs = qs
         elif request.user.is_authenticated:
-            Membership = apps.get_model('projects', 'Membership')
-            memberships_qs = Membership.objects.filter(user=request.user)
-            if project_id:
-                memberships_qs = memberships_qs.filter(project_id=project_id)
-            memberships_qs = memberships_qs.filter(
-                Q(role__permissions__contains=[self.permission]) |
-                Q(is_admin=True))
-
-            projects_list = [membership.project_id for membership in memberships_qs]
+            projects_list = get_user_project_ids_with_perm(request.user, self.permission,
+                                                           project_id=project_id)
 
             if project:
                 is_member = project.id in projects_list
@@ -329,14 +307,13 @@ class BaseIsProjectAdminFilterBackend(object):
         if not request.user.is_authenticated:
             return []
 
-        membership_model = apps.get_model('projects', 'Membership')
-        memberships_qs = membership_model.objects.filter(user=request.user, is_admin=True)
         if project_id:
-            memberships_qs = memberships_qs.filter(project_id=project_id)
-
-        projects_list = [membership.project_id for membership in memberships_qs]
+            try:
+                project_id = int(project_id)
+            except (TypeError, ValueError):
+                return []
 
-        return projects_list
+        return get_user_project_ids_with_perm(request.user, project_id=project_id)
 
 
 class IsProjectAdminFilterBackend(FilterBackend, BaseIsProjectAdminFilterBackend):
@@ -655,11 +632,7 @@ class QFilter(FilterBackend):
         if q:
             table = queryset.model._meta.db_table
             where_clause = ("""
-                to_tsvector('simple',
-                            coalesce({table}.subject, '') || ' ' ||
-                            coalesce(array_to_string({table}.tags, ' '), '') || ' ' ||
-                            coalesce({table}.ref) || ' ' ||
-                            coalesce({table}.description, '')) @@ to_tsquery('simple', %s)
+                {table}.search_vector @@ to_tsquery('simple', %s)
             """.format(table=table))
 
             queryset = queryset.extra(where=[where_clause], params=[to_tsquery(q)])
@@ -8,6 +8,9 @@
 from collections import namedtuple
 
 from django.db import connection
+from django.db.models import Q
+from django.db.models.sql.datastructures import Join
+from django.core.exceptions import FieldDoesNotExist
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.exceptions import EmptyResultSet
 from taiga.base.api import serializers
@@ -33,14 +36,114 @@ def get_neighbors(obj, results_set=None):
     # Neighbors calculation is at least at project level
     results_set = results_set.filter(project_id=obj.project.id)
 
-    compiler = results_set.query.get_compiler('default')
     try:
-        base_sql, base_params = compiler.as_sql(with_col_aliases=True)
+        results_set.query.get_compiler('default').as_sql()
     except EmptyResultSet:
         # Generate a not empty queryset
         results_set = type(obj).objects.get_queryset().filter(project_id=obj.project.id)
-        compiler = results_set.query.get_compiler('default')
-        base_sql, base_params = compiler.as_sql(with_col_aliases=True)
+
+    ordering = _get_keyset_ordering(results_set)
+    if ordering is None:
+        return _get_neighbors_by_window(obj, results_set)
+    return _get_neighbors_by_keyset(obj, results_set, ordering)
+
+
+def _get_keyset_ordering(results_set):
+    """
+    Get the ordering of the results set as a list of `(attname, descending)`
+    if it can be used to find the neighbors by comparing the values of these
+    columns (ending with the id to make it unique), or None if it can't.
+    """
+    query = results_set.query
+    model = query.model
+
+    # Rows repeated by joins with multi-valued relations can't be compared
+    for join in query.alias_map.values():
+        if isinstance(join, Join) and (join.join_field.one_to_many or join.join_field.many_to_many):
+            if not query.distinct:
+                return None
+
+    if query.extra_order_by:
+        return None
+    elif query.order_by:
+        order_by = query.order_by
+    elif query.default_ordering:
+        order_by = model._meta.ordering
+    else:
+        order_by = []
+
+    ordering = []
+    for name in order_by:
+        if not isinstance(name, str) or name == "?":
+            return None
+
+        descending = name.startswith("-")
+        name = name.lstrip("-")
+        if name == "pk":
+            name = model._meta.pk.name
+
+        # All the neighbors are in the same project
+        if name == "project":
+            continue
+
+        if "__" in name or name in query.annotations or name in query.extra_select:
+            return None
+
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+        # Relations are ordered by the ordering of the related model
+        if not field.concrete or field.is_relation:
+            return None
+
+        if field.attname not in [attname for attname, _ in ordering]:
+            ordering.append((field.attname, descending))
+
+    if model._meta.pk.attname not in [attname for attname, _ in ordering]:
+        ordering.append((model._meta.pk.attname, False))
+    return ordering
+
+
+def _get_keyset_filter(ordering, values, forward):
+    """
+    Filter the rows after (`forward`) or before the row with `values` in the
+    ordering. Postgres sorts the NULL values as if they were greater than
+    any other value.
+    """
+    result = Q(pk__in=[])
+    equal = Q()
+    for (attname, descending), value in zip(ordering, values):
+        if forward != descending:
+            after = Q(**{attname + "__gt": value}) | Q(**{attname + "__isnull": True}) if value is not None else None
+        else:
+            after = Q(**{attname + "__lt": value}) if value is not None else Q(**{attname + "__isnull": False})
+
+        if after is not None:
+            result |= equal & after
+
+        equal &= Q(**{attname: value}) if value is not None else Q(**{attname + "__isnull": True})
+    return result
+
+
+def _get_neighbors_by_keyset(obj, results_set, ordering):
+    attnames = [attname for attname, descending in ordering]
+    values = results_set.filter(pk=obj.pk).values_list(*attnames).first()
+    if values is None:
+        return Neighbor(None, None)
+
+    order_by = [("-" if descending else "") + attname for attname, descending in ordering]
+    reverse_order_by = [("" if descending else "-") + attname for attname, descending in ordering]
+
+    left = results_set.filter(_get_keyset_filter(ordering, values, forward=False)).order_by(*reverse_order_by).first()
+    right = results_set.filter(_get_keyset_filter(ordering, values, forward=True)).order_by(*order_by).first()
+    return Neighbor(left, right)
+
+
+def _get_neighbors_by_window(obj, results_set):
+    compiler = results_set.query.get_compiler('default')
+    base_sql, base_params = compiler.as_sql(with_col_aliases=True)
 
     query = """
         SELECT * FROM
@@ -5,13 +5,102 @@
 #
 # Copyright (c) 2021-present Kaleidos INC
 
+import bisect
+import collections
+import ipaddress
+import logging
+
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 
 from taiga.base.api import throttling
 from ipware.ip import get_client_ip
-from netaddr import all_matching_cidrs
-from netaddr.core import AddrFormatError
+
+logger = logging.getLogger("taiga.throttling")
+
+
+class ThrottleWhitelist:
+    """
+    Compiled version of a throttle whitelist: a set with the user ids and, for
+    IPv4 and IPv6, a sorted list of disjoint address intervals, so every
+    lookup is a set lookup or a binary search.
+    """
+
+    def __init__(self, whitelist):
+        self.user_ids = set()
+        self.invalid_entries = []
+        self.stats = collections.Counter()
+
+        networks = {4: [], 6: []}
+        for entry in whitelist:
+            if isinstance(entry, int):
+                self.user_ids.add(entry)
+                continue
+
+            try:
+                network = ipaddress.ip_network(entry, strict=False)
+            except (TypeError, ValueError):
+                logger.warning("Invalid throttle whitelist entry: %r", entry)
+                self.invalid_entries.append(entry)
+                continue
+
+            networks[network.version].append((int(network.network_address), int(network.broadcast_address)))
+
+        self.starts = {}
+        self.ends = {}
+        for version, intervals in networks.items():
+            merged = []
+            for start, end in sorted(intervals):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self.starts[version] = [start for start, end in merged]
+            self.ends[version] = [end for start, end in merged]
+
+    def _match_address(self, address):
+        starts = self.starts[address.version]
+        index = bisect.bisect_right(starts, int(address)) - 1
+        return index >= 0 and int(address) <= self.ends[address.version][index]
+
+    def match(self, ident):
+        self.stats["lookups"] += 1
+
+        if isinstance(ident, int):
+            if ident in self.user_ids:
+                self.stats["user_matches"] += 1
+                return True
+            return False
+
+        try:
+            address = ipaddress.ip_address(ident)
+        except (TypeError, ValueError):
+            self.stats["invalid_idents"] += 1
+            return False
+
+        if self._match_address(address) or (
+                address.version == 6 and address.ipv4_mapped and self._match_address(address.ipv4_mapped)):
+            self.stats["network_matches"] += 1
+            return True
+        return False
+
+
+_compiled_whitelist = (None, None)
+
+
+def get_throttle_whitelist():
+    """
+    Get the compiled DEFAULT_THROTTLE_WHITELIST setting. It is only compiled
+    again if the setting is replaced.
+    """
+    global _compiled_whitelist
+
+    whitelist = settings.REST_FRAMEWORK.get('DEFAULT_THROTTLE_WHITELIST', [])
+    source, compiled = _compiled_whitelist
+    if source is not whitelist:
+        compiled = ThrottleWhitelist(whitelist)
+        _compiled_whitelist = (whitelist, compiled)
+    return compiled
 
 
 class GlobalThrottlingMixin:
@@ -62,16 +151,7 @@ class CommonThrottle(throttling.SimpleRateThrottle):
         return False
 
     def is_whitelisted(self, ident):
-        for whitelisted in settings.REST_FRAMEWORK['DEFAULT_THROTTLE_WHITELIST']:
-            if isinstance(whitelisted, int) and whitelisted == ident:
-                return True
-            elif isinstance(whitelisted, str):
-                try:
-                    if all_matching_cidrs(ident, [whitelisted]) != []:
-                        return True
-                except(AddrFormatError, ValueError):
-                    pass
-        return False
+        return get_throttle_whitelist().match(ident)
 
     def allow_request(self, request, view):
         scope = self.get_scope(request)
@@ -84,43 +164,12 @@ class CommonThrottle(throttling.SimpleRateThrottle):
         if rates is None or rates == []:
             return True
 
-        now = self.timer()
-
-        waits = []
-        history_writes = []
-
-        for rate in rates:
-            rate_name = rate[0]
-            rate_num_requests = rate[1]
-            rate_duration = rate[2]
-
-            key = self.get_cache_key(ident, scope, rate_name)
-            history = self.cache.get(key, [])
-
-            while history and history[-1] <= now - rate_duration:
-                history.pop()
-
-            if len(history) >= rate_num_requests:
-                waits.append(self.wait_time(history, rate, now))
-
-            history_writes.append({
-                "key": key,
-                "history": history,
-                "rate_duration": rate_duration,
-            })
-
-        if waits:
-            self._wait = max(waits)
-            return False
-
-        for history_write in history_writes:
-            history_write['history'].insert(0, now)
-            self.cache.set(
-                history_write['key'],
-                history_write['history'],
-                history_write['rate_duration']
-            )
-        return True
+        counter = throttling.SlidingWindowCounter(self.cache, self.timer)
+        self._wait = counter.hit([
+            (self.get_cache_key(ident, scope, rate_name), rate_num_requests, rate_duration)
+            for rate_name, rate_num_requests, rate_duration in rates
+        ])
+        return self._wait is None
 
     def get_rates(self, scope):
         try:
@@ -166,21 +215,6 @@ class CommonThrottle(throttling.SimpleRateThrottle):
     def get_cache_key(self, ident, scope, rate):
         return self.cache_format % { "scope": scope, "ident": ident, "rate": rate }
 
-    def wait_time(self, history, rate, now):
-        rate_num_requests = rate[1]
-        rate_duration = rate[2]
-
-        if history:
-            remaining_duration = rate_duration - (now - history[-1])
-        else:
-            remaining_duration = rate_duration
-
-        available_requests = rate_num_requests - len(history) + 1
-        if available_requests <= 0:
-            return remaining_duration
-
-        return remaining_duration / float(available_requests)
-
     def wait(self):
         return self._wait
 
@@ -6,6 +6,7 @@
 # Copyright (c) 2021-present Kaleidos INC
 
 from functools import wraps, partial
+from itertools import islice
 from django.core.paginator import Paginator
 
 
@@ -36,6 +37,19 @@ def split_by_n(seq:str, n:int):
         seq = seq[n:]
 
 
+def iter_batches(iterable, batch_size:int=500):
+    """
+    Iterate any iterable in lists of `batch_size` elements (the last one
+    can be shorter), without reading it all.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            break
+        yield batch
+
+
 def iter_queryset(queryset, itersize:int=20):
     """
     Util function for iterate in more efficient way
@@ -46,3 +60,20 @@ def iter_queryset(queryset, itersize:int=20):
         page = paginator.page(page_num)
         for element in page.object_list:
             yield element
+
+
+def iter_queryset_batches(queryset, batch_size:int=500):
+    """
+    Iterate all the objects of a queryset (with its select_related and
+    prefetch_related) in lists of `batch_size` objects. The ids are read
+    with a server side cursor, so the memory used doesn't grow with the size
+    of the queryset.
+    """
+    ids = queryset.values_list("pk", flat=True).iterator(chunk_size=batch_size)
+    while True:
+        batch_ids = list(islice(ids, batch_size))
+        if not batch_ids:
+            break
+
+        objects = {obj.pk: obj for obj in queryset.filter(pk__in=batch_ids)}
+        yield [objects[pk] for pk in batch_ids if pk in objects]
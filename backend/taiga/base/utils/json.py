@@ -23,6 +23,107 @@ def loads(data):
 
 load = json.load
 
+
+_WHITESPACE = json.decoder.WHITESPACE
+_NUMBER_CHARS = "0123456789.eE+-"
+
+
+class _StreamParser:
+    def __init__(self, fp, chunk_size):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def read(self):
+        # Read at least as much text as the pending one, so a big value is
+        # decoded after a few reads
+        chunk = self.fp.read(max(self.chunk_size, len(self.buffer) - self.pos))
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+
+    def peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                raise ValueError("Unexpected end of JSON document")
+            self.read()
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError("Expecting {!r}, found {!r}".format(chars, char))
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            else:
+                # A number at the end of the text read (or of a part of it,
+                # like "12." of "12.5") can go on in the next chunk
+                if self.eof or not self._is_cut_number(value, end):
+                    self.pos = end
+                    return value
+            self.read()
+
+    def _is_cut_number(self, value, end):
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return False
+        return end == len(self.buffer) or self.buffer[end] in _NUMBER_CHARS
+
+    def items(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+
+def iter_object(fp, arrays=(), chunk_size=64 * 1024):
+    """
+    Iterate the members of the JSON object of a text file without loading it
+    all, yielding (name, value) pairs. The values of the `arrays` members
+    (when they are arrays) are iterators of their items, loaded one at a
+    time, that must be consumed before the next member (or they are
+    skipped).
+    """
+    parser = _StreamParser(fp, chunk_size)
+    parser.expect("{")
+    if parser.peek() == "}":
+        return
+
+    while True:
+        name = parser.value()
+        if not isinstance(name, str):
+            raise ValueError("Expecting a property name, found {!r}".format(name))
+        parser.expect(":")
+
+        if name in arrays and parser.peek() == "[":
+            items = parser.items()
+            yield name, items
+            for _ in items:
+                pass
+        else:
+            yield name, parser.value()
+
+        if parser.expect(",}") == "}":
+            return
+
 # Some backward compatibility that should
 # be removed in near future.
 to_json = dumps
@@ -5,6 +5,9 @@
 #
 # Copyright (c) 2021-present Kaleidos INC
 
+import csv
+import io
+
 
 def strip_lines(text):
     """
@@ -26,3 +29,23 @@ def sanitize_csv_text_value(value):
         if isinstance(value, str) and value.startswith(("=", "+", "-", "@"))
         else value
     )
+
+
+def iter_csv(fieldnames, rows, chunk_size=64 * 1024):
+    """
+    Write the rows (dicts) as CSV, with a header, like a csv.DictWriter would
+    do, yielding the text in chunks of at least `chunk_size` characters.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
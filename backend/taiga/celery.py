@@ -11,6 +11,7 @@ import os
 
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_init
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings.common")
 
@@ -21,6 +22,13 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 
+
+@worker_process_init.connect
+def warm_up_worker_process(**kwargs):
+    from taiga.mdrender.service import warm_up_markdown_engines
+    warm_up_markdown_engines()
+
+
 if settings.ENABLE_TELEMETRY:
     rng = random.Random(settings.SECRET_KEY)
     hour = rng.randint(0, 4)
@@ -45,3 +53,10 @@ if ('taiga.auth.token_denylist' in settings.INSTALLED_APPS and
         'schedule': settings.FLUSH_REFRESHED_TOKENS_PERIODICITY,
         'args': (),
     }
+
+if getattr(settings, "PROJECTS_TOTALS_REFRESH_PERIODICITY", None):
+    app.conf.beat_schedule['projects-refresh-totals'] = {
+        'task': 'taiga.projects.services.totals.refresh_projects_totals_windows',
+        'schedule': settings.PROJECTS_TOTALS_REFRESH_PERIODICITY,
+        'args': (),
+    }
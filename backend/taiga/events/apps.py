@@ -7,6 +7,7 @@
 
 #
 from django.apps import apps, AppConfig
+from django.core.signals import request_finished
 from django.db.models import signals
 
 
@@ -30,7 +31,9 @@ class EventsAppConfig(AppConfig):
         self.events_watched_types = set()
 
     def ready(self):
+        from .events import flush_transaction_outbox
         connect_events_signals()
+        request_finished.connect(flush_transaction_outbox, dispatch_uid="events_flush_transaction_outbox")
         for config in apps.get_app_configs():
             if not hasattr(config, 'watched_types'):
                 continue
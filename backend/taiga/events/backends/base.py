@@ -17,6 +17,13 @@ class BaseEventsPushBackend(object, metaclass=abc.ABCMeta):
     def emit_event(self, message:str, *, routing_key:str, channel:str="events"):
         pass
 
+    def emit_events(self, events:list):
+        """
+        Emit a batch of events (dicts with the `emit_event` keyword arguments).
+        """
+        for event in events:
+            self.emit_event(**event)
+
 
 def load_class(path):
     """
@@ -5,11 +5,13 @@
 #
 # Copyright (c) 2021-present Kaleidos INC
 
-import json
 import logging
+import os
+import threading
+import time
 
 from amqp import Connection as AmqpConnection
-from amqp.exceptions import AccessRefused
+from amqp.exceptions import AMQPError
 from amqp.basic_message import Message as AmqpMessage
 from urllib.parse import urlparse
 
@@ -17,6 +19,11 @@ from . import base
 
 log = logging.getLogger("tagia.events")
 
+# Seconds to wait before reconnecting after a failed connection, doubled
+# on every consecutive failure up to the max.
+RECONNECT_BACKOFF = 0.5
+RECONNECT_BACKOFF_MAX = 30
+
 
 def _make_rabbitmq_connection(url):
     parse_result = urlparse(url)
@@ -37,31 +44,124 @@ def _make_rabbitmq_connection(url):
                           password=password, virtual_host=vhost[1:])
 
 
-class EventsPushBackend(base.BaseEventsPushBackend):
+class AmqpPublisher:
+    """
+    A persistent AMQP connection and channel used to publish all the events
+    of a process. The connection is opened lazily, reopened (with backoff)
+    when it fails and every exchange is only declared once per channel.
+    """
+
     def __init__(self, url):
         self.url = url
+        self.lock = threading.Lock()
+        self.connection = None
+        self.channel = None
+        self.declared_exchanges = set()
+        self.failures = 0
+        self.retry_at = 0
+
+    def _close(self):
+        connection, self.connection, self.channel = self.connection, None, None
+        self.declared_exchanges = set()
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _get_channel(self):
+        if self.channel is not None and self.channel.is_open:
+            return self.channel
+
+        self._close()
+
+        if time.monotonic() < self.retry_at:
+            return None
 
-    def emit_event(self, message:str, *, routing_key:str, channel:str="events"):
         connection = _make_rabbitmq_connection(self.url)
         try:
             connection.connect()
-        except ConnectionRefusedError:
-            err_msg = "EventsPushBackend: Unable to connect with RabbitMQ (connection refused) at {}".format(
-                                                                                                     self.url)
-            log.error(err_msg, exc_info=True)
-        except AccessRefused:
-            err_msg = "EventsPushBackend: Unable to connect with RabbitMQ (access refused) at {}".format(
-                                                                                                 self.url)
-            log.error(err_msg, exc_info=True)
-        else:
-            try:
-                message = AmqpMessage(message)
-                rchannel = connection.channel()
+            channel = connection.channel()
+        except (OSError, AMQPError) as e:
+            self.failures += 1
+            backoff = min(RECONNECT_BACKOFF * 2 ** (self.failures - 1), RECONNECT_BACKOFF_MAX)
+            self.retry_at = time.monotonic() + backoff
+            log.error("EventsPushBackend: Unable to connect with RabbitMQ ({}) at {}, retrying in {}s".format(
+                      e.__class__.__name__, self.url, backoff), exc_info=True)
+            return None
 
-                rchannel.exchange_declare(exchange=channel, type="topic", auto_delete=True)
-                rchannel.basic_publish(message, routing_key=routing_key, exchange=channel)
-                rchannel.close()
-            except Exception:
-                log.error("EventsPushBackend: Unhandled exception", exc_info=True)
-            finally:
-                connection.close()
+        self.failures = 0
+        self.retry_at = 0
+        self.connection, self.channel = connection, channel
+        return channel
+
+    def publish(self, events):
+        """
+        Publish a list of events (dicts with `message`, `routing_key` and
+        `channel`) and return the number of published ones.
+        """
+        published = 0
+        with self.lock:
+            # A broken connection is only detected when it is used, so retry once
+            # with a new one before giving up.
+            for attempt in range(2):
+                channel = self._get_channel()
+                if channel is None:
+                    break
+
+                try:
+                    for event in events[published:]:
+                        exchange = event["channel"]
+                        if exchange not in self.declared_exchanges:
+                            channel.exchange_declare(exchange=exchange, type="topic", auto_delete=True)
+                            self.declared_exchanges.add(exchange)
+
+                        channel.basic_publish(AmqpMessage(event["message"]),
+                                              routing_key=event["routing_key"],
+                                              exchange=exchange)
+                        published += 1
+                    break
+                except (OSError, AMQPError):
+                    log.warning("EventsPushBackend: Connection with RabbitMQ lost", exc_info=True)
+                    self._close()
+                except Exception:
+                    log.error("EventsPushBackend: Unhandled exception", exc_info=True)
+                    break
+
+        if published < len(events):
+            log.error("EventsPushBackend: {} events not sent to RabbitMQ".format(len(events) - published))
+        return published
+
+
+_publishers = {}
+_publishers_lock = threading.Lock()
+
+
+def get_publisher(url):
+    with _publishers_lock:
+        if url not in _publishers:
+            _publishers[url] = AmqpPublisher(url)
+        return _publishers[url]
+
+
+def _reset_publishers_after_fork():
+    # The connections (and the locks) of the parent process can't be shared
+    # with the forked children (gunicorn workers, celery prefork pool...),
+    # every process opens its own ones.
+    global _publishers, _publishers_lock
+    _publishers = {}
+    _publishers_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_publishers_after_fork)
+
+
+class EventsPushBackend(base.BaseEventsPushBackend):
+    def __init__(self, url):
+        self.url = url
+
+    def emit_event(self, message:str, *, routing_key:str, channel:str="events"):
+        self.emit_events([{"message": message, "routing_key": routing_key, "channel": channel}])
+
+    def emit_events(self, events:list):
+        get_publisher(self.url).publish(events)
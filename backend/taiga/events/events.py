@@ -7,7 +7,9 @@
 
 import collections
 
-from django.db import connection
+from functools import partial
+
+from django.db import connection, transaction
 from django.utils.translation import gettext_lazy as _
 
 from django.conf import settings
@@ -26,18 +28,129 @@ def emit_event(data:dict, routing_key:str, *,
     if not sessionid:
         sessionid = mw.get_current_session_id()
 
-    data = {"session_id": sessionid,
-            "data": data}
-
     backend = backends.get_events_backend()
+    event = {"session_id": sessionid, "data": data, "routing_key": routing_key, "channel": channel}
 
-    def backend_emit_event():
-        backend.emit_event(message=json.dumps(data), routing_key=routing_key, channel=channel)
-
-    if on_commit:
-        connection.on_commit(backend_emit_event)
+    if on_commit and connection.in_atomic_block:
+        _add_to_transaction_outbox(backend, event)
     else:
-        backend_emit_event()
+        flush_transaction_outbox()
+        backend.emit_event(**_serialize_event(event))
+
+
+def _serialize_event(event):
+    return {"message": json.dumps({"session_id": event["session_id"], "data": event["data"]}),
+            "routing_key": event["routing_key"],
+            "channel": event["channel"]}
+
+
+def _is_model_event(data):
+    # Events sent by `emit_event_for_model` and `emit_event_for_ids`
+    return isinstance(data, dict) and data.keys() == {"type", "matches", "pk"}
+
+
+class EventsOutbox:
+    """
+    The events of a transaction, sent in one batch when it is committed.
+
+    The model events with the same routing key, type and content type are
+    merged in one event with the list of pks, and the changes of the deleted
+    objects are dropped.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.events = []
+        self.model_events = {}
+        self.last_seq = 0
+
+    def add(self, event):
+        data = event["data"]
+        if not _is_model_event(data):
+            self.events.append(event)
+        else:
+            pk_list = isinstance(data["pk"], (list, tuple))
+            pks = data["pk"] if pk_list else [data["pk"]]
+            if data["type"] == "delete":
+                self._drop_changes(event, pks)
+
+            key = (event["session_id"], event["routing_key"], event["channel"], data["type"], data["matches"])
+            merged_event = self.model_events.get(key, None)
+            if merged_event is None:
+                merged_event = dict(event, data=dict(data, pk=list(pks)), pk_list=pk_list)
+                self.model_events[key] = merged_event
+                self.events.append(merged_event)
+            else:
+                merged_pks = merged_event["data"]["pk"]
+                new_pks = [pk for pk in pks if pk not in merged_pks]
+                merged_pks.extend(new_pks)
+                merged_event["pk_list"] |= pk_list or bool(new_pks)
+
+        if len(self.events) >= getattr(settings, "EVENTS_PUSH_OUTBOX_MAX_SIZE", 100):
+            self.flush()
+
+    def commit_event(self, event, seq):
+        self.add(event)
+        if seq == self.last_seq:
+            self.flush()
+
+    def _drop_changes(self, delete_event, pks):
+        for key, change_event in list(self.model_events.items()):
+            if (key[1:] != (delete_event["routing_key"], delete_event["channel"],
+                            "change", delete_event["data"]["matches"])):
+                continue
+
+            change_pks = change_event["data"]["pk"]
+            change_pks[:] = [pk for pk in change_pks if pk not in pks]
+            if not change_pks:
+                del self.model_events[key]
+                self.events = [e for e in self.events if e is not change_event]
+
+    def _get_event(self, event):
+        if event.pop("pk_list", True):
+            return event
+
+        # A single model event is sent as it was emitted
+        return dict(event, data=dict(event["data"], pk=event["data"]["pk"][0]))
+
+    def flush(self):
+        events, self.events, self.model_events = self.events, [], {}
+        if events:
+            self.backend.emit_events([_serialize_event(self._get_event(e)) for e in events])
+
+
+def _get_transaction_outbox(backend):
+    outbox = getattr(connection, "_events_outbox", None)
+    if outbox is None:
+        outbox = EventsOutbox(backend)
+        connection._events_outbox = outbox
+    outbox.backend = backend
+    return outbox
+
+
+def _add_to_transaction_outbox(backend, event):
+    """
+    Add an event to the outbox of the current transaction, to be sent after
+    it's committed.
+
+    Every event is added to the outbox by its own `on_commit` callback, so the
+    events of a rolled back savepoint are discarded as usual, and the outbox
+    is flushed by the callback of the last event emitted. If that one is
+    discarded the rest are sent with the next events (or at the end of the
+    request, see `flush_transaction_outbox`).
+    """
+    outbox = _get_transaction_outbox(backend)
+    outbox.last_seq += 1
+    transaction.on_commit(partial(outbox.commit_event, event, outbox.last_seq))
+
+
+def flush_transaction_outbox(**kwargs):
+    """
+    Send the committed events left in the outbox of the connection.
+    """
+    outbox = getattr(connection, "_events_outbox", None)
+    if outbox is not None:
+        outbox.flush()
 
 
 def emit_event_for_model(obj, *, type:str="change", channel:str="events",
@@ -5,7 +5,6 @@
 #
 # Copyright (c) 2021-present Kaleidos INC
 
-import codecs
 import uuid
 import gzip
 import logging
@@ -19,7 +18,6 @@ from django.conf import settings
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 
-from taiga.base.utils import json
 from taiga.base.decorators import detail_route, list_route
 from taiga.base import exceptions as exc
 from taiga.base import response
@@ -32,6 +30,7 @@ from taiga.projects.tasks.models import Task
 from taiga.projects.serializers import ProjectSerializer
 from taiga.users import services as users_services
 
+from . import archive
 from . import exceptions as err
 from . import mixins
 from . import permissions
@@ -70,6 +69,10 @@ class ProjectExporterViewSet(mixins.ImportThrottlingPolicyMixin, GenericViewSet)
             path = "exports/{}/{}-{}.json.gz".format(project.pk, project.slug, uuid.uuid4().hex)
             with default_storage.open(path, mode="wb") as outfile:
                 services.render_project(project, gzip.GzipFile(fileobj=outfile, mode="wb"))
+        elif dump_format == "zip":
+            path = "exports/{}/{}-{}.zip".format(project.pk, project.slug, uuid.uuid4().hex)
+            with default_storage.open(path, mode="wb") as outfile:
+                services.render_project_archive(project, outfile)
         else:
             path = "exports/{}/{}-{}.json".format(project.pk, project.slug, uuid.uuid4().hex)
             with default_storage.open(path, mode="wb") as outfile:
@@ -324,26 +327,23 @@ class ProjectImporterViewSet(mixins.ImportThrottlingPolicyMixin, CreateModelMixi
 
         self.check_permissions(request, "load_dump", None)
 
-        dump = request.FILES.get('dump', None)
+        dump_file = request.FILES.get('dump', None)
 
-        if not dump:
+        if not dump_file:
             raise exc.WrongArguments(_("Needed dump file"))
 
-        if dump.content_type == "application/gzip":
-            dump = gzip.GzipFile(fileobj=dump)
-
-        reader = codecs.getreader("utf-8")
+        is_gzip = dump_file.content_type == "application/gzip"
 
         try:
-            dump = json.load(reader(dump))
-            
+            document, dump_archive = services.open_dump(dump_file, is_gzip=is_gzip)
+            if settings.CELERY_ENABLED:
+                # The task reads all the dump
+                dump = services.read_dump_header(document)
+            else:
+                dump = services.read_dump(document)
         except Exception:
             raise exc.WrongArguments(_("Invalid dump format"))
 
-        if not isinstance(dump, dict):
-            logger.error("trying a load_dump with a different format than dict: {0}, from user {1}".format(dump, request.user))
-            raise exc.WrongArguments(_("Invalid dump format"))
-
         slug = dump.get('slug', None)
         if slug is not None and Project.objects.filter(slug=slug).exists():
             del dump['slug']
@@ -364,12 +364,16 @@ class ProjectImporterViewSet(mixins.ImportThrottlingPolicyMixin, CreateModelMixi
 
         # Async mode
         if settings.CELERY_ENABLED:
-            task = tasks.load_project_dump.delay(user, dump)
+            # The task reads the dump from the storage
+            dump_file.seek(0)
+            dump_path = default_storage.save("imports/{}".format(uuid.uuid4().hex), dump_file)
+            task = tasks.load_project_dump.delay(user, dump_path, is_gzip)
             return response.Accepted({"import_id": task.id})
 
         # Sync mode
+        archive_files = archive.ArchiveFilesReader(dump_archive) if dump_archive is not None else None
         try:
-            project = services.store_project_from_dict(dump, request.user)
+            project = services.store_project_from_dict(dump, request.user, archive_files=archive_files)
         except err.TaigaImportError as e:
             # On Error
             ## remove project
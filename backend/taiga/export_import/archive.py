@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+import hashlib
+import shutil
+import time
+import zipfile
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.files import File
+
+
+#####################################################################
+# Dump archives
+#####################################################################
+#
+# A dump archive ("zip" dump format) is a zip file with the JSON document
+# of the project ("project.json") and the content of its files (the
+# attachments and the logo) out of it. Every file of the document is
+# referenced by the sha1 of its content ({"name": ..., "sha1": ...}
+# instead of {"name": ..., "data": <base64>}), and the identical files are
+# only stored once, in "files/<sha1>".
+#
+# While a project is rendered or stored the files of the archive are
+# written or read by the FileFields (see `using_archive_files`).
+
+ARCHIVE_DOCUMENT_NAME = "project.json"
+ARCHIVE_FILES_DIR = "files"
+ARCHIVE_CHUNK_SIZE = 64 * 1024
+
+_current_archive_files = ContextVar("export_import_archive_files", default=None)
+
+
+@contextmanager
+def using_archive_files(archive_files):
+    token = _current_archive_files.set(archive_files)
+    try:
+        yield archive_files
+    finally:
+        _current_archive_files.reset(token)
+
+
+def get_archive_files():
+    """
+    Return the files (an ArchiveFilesWriter or an ArchiveFilesReader) of the
+    dump archive being rendered or stored, if any.
+    """
+    return _current_archive_files.get()
+
+
+def get_archive_file_name(sha1):
+    return "{}/{}".format(ARCHIVE_FILES_DIR, sha1)
+
+
+def _get_zip_info(name, compress_type):
+    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    info.compress_type = compress_type
+    return info
+
+
+def get_file_sha1(field_file):
+    sha1 = hashlib.sha1()
+    with field_file.storage.open(field_file.name, "rb") as f:
+        for chunk in iter(lambda: f.read(ARCHIVE_CHUNK_SIZE), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+class ArchiveFilesWriter:
+    """
+    The files referenced by the document of a dump archive, written to the
+    archive (in chunks) once the document is complete.
+    """
+
+    def __init__(self):
+        self.files = {}
+
+    def add(self, field_file, sha1=None):
+        """
+        Reference a file (a FieldFile) and return its sha1.
+        """
+        sha1 = sha1 or get_file_sha1(field_file)
+        self.files.setdefault(sha1, (field_file.storage, field_file.name))
+        return sha1
+
+    def write(self, archive):
+        # The files are stored as they are, most of them (images,
+        # documents...) are already compressed.
+        for sha1, (storage, name) in self.files.items():
+            info = _get_zip_info(get_archive_file_name(sha1), zipfile.ZIP_STORED)
+            with storage.open(name, "rb") as src, archive.open(info, "w", force_zip64=True) as dst:
+                shutil.copyfileobj(src, dst, ARCHIVE_CHUNK_SIZE)
+
+
+class ArchiveFilesReader:
+    """
+    The files of a dump archive, opened (without reading them) when the
+    document references them.
+    """
+
+    def __init__(self, archive):
+        self.archive = archive
+
+    def open(self, sha1, name):
+        """
+        Return a File with the content of the file with this sha1, or None
+        if the archive doesn't have it.
+        """
+        try:
+            info = self.archive.getinfo(get_archive_file_name(sha1))
+        except KeyError:
+            return None
+
+        file = File(self.archive.open(info), name=name)
+        file.size = info.file_size
+        return file
+
+
+def is_archive(dump_file):
+    """
+    Check if a dump file (a path or a seekable file) is a dump archive,
+    without moving the position of the file.
+    """
+    if isinstance(dump_file, str):
+        return zipfile.is_zipfile(dump_file)
+
+    position = dump_file.tell()
+    try:
+        return zipfile.is_zipfile(dump_file)
+    finally:
+        dump_file.seek(position)
+
+
+def open_archive(dump_file):
+    return zipfile.ZipFile(dump_file)
+
+
+def open_archive_document(archive):
+    return archive.open(ARCHIVE_DOCUMENT_NAME)
+
+
+def write_archive(outfile, render_document):
+    """
+    Write a dump archive: `render_document` renders the JSON document into
+    the file that receives, with the files referenced by it.
+    """
+    archive_files = ArchiveFilesWriter()
+    with zipfile.ZipFile(outfile, "w") as archive:
+        with using_archive_files(archive_files):
+            info = _get_zip_info(ARCHIVE_DOCUMENT_NAME, zipfile.ZIP_DEFLATED)
+            with archive.open(info, "w", force_zip64=True) as document:
+                render_document(document)
+
+        archive_files.write(archive)
@@ -8,7 +8,7 @@
 from django.core.management.base import BaseCommand, CommandError
 
 from taiga.projects.models import Project
-from taiga.export_import.services import render_project
+from taiga.export_import.services import render_project, render_project_archive
 
 import os
 import gzip
@@ -33,8 +33,9 @@ class Command(BaseCommand):
                             action="store",
                             dest="format",
                             default="plain",
-                            metavar="[plain|gzip]",
-                            help="Format to the output file plain json or gzipped json. ('plain' by default)")
+                            metavar="[plain|gzip|zip]",
+                            help=("Format to the output file plain json, gzipped json or zip archive with the "
+                                  "attachments out of the json. ('plain' by default)"))
 
     def handle(self, *args, **options):
         dst_dir = options["dst_dir"]
@@ -57,6 +58,10 @@ class Command(BaseCommand):
                 dst_file = os.path.join(dst_dir, "{}.json.gz".format(project_slug))
                 with gzip.GzipFile(dst_file, "wb") as f:
                     render_project(project, f)
+            elif options["format"] == "zip":
+                dst_file = os.path.join(dst_dir, "{}.zip".format(project_slug))
+                with open(dst_file, "wb") as f:
+                    render_project_archive(project, f)
             else:
                 dst_file = os.path.join(dst_dir, "{}.json".format(project_slug))
                 with open(dst_file, "wb") as f:
@@ -10,6 +10,7 @@ from django.db import transaction
 from django.db.models import signals
 
 from taiga.base.utils import json
+from taiga.export_import import archive
 from taiga.export_import import services
 from taiga.export_import import exceptions as err
 from taiga.projects.models import Project
@@ -21,7 +22,7 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("dump_file",
-                            help="The path to a dump file (.json).")
+                            help="The path to a dump file (.json or .zip).")
 
         parser.add_argument("owner_email",
                             help="The email of the new project owner.")
@@ -37,7 +38,10 @@ class Command(BaseCommand):
         owner_email = options["owner_email"]
         overwrite = options["overwrite"]
 
-        data = json.loads(open(dump_file_path, 'r').read())
+        dump_file = open(dump_file_path, "rb")
+        document, dump_archive = services.open_dump(dump_file)
+        archive_files = archive.ArchiveFilesReader(dump_archive) if dump_archive is not None else None
+        data = services.read_dump(document)
         try:
             if overwrite:
                 receivers_back = signals.post_delete.receivers
@@ -59,7 +63,7 @@ class Command(BaseCommand):
                     del data['slug']
 
             user = User.objects.get(email=owner_email)
-            services.store_project_from_dict(data, user)
+            services.store_project_from_dict(data, user, archive_files=archive_files)
         except err.TaigaImportError as e:
             if e.project:
                 e.project.delete_related_content()
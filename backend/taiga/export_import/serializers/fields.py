@@ -15,6 +15,7 @@ from collections import OrderedDict
 from taiga.base.fields import Field
 from taiga.users import models as users_models
 
+from ..archive import get_archive_files
 from .cache import cached_get_user_by_pk
 
 
@@ -26,6 +27,15 @@ class FileField(Field):
         if not obj:
             return None
 
+        archive_files = get_archive_files()
+        if archive_files is not None:
+            # The attachments have the sha1 of their content
+            sha1 = archive_files.add(obj, sha1=getattr(obj.instance, "sha1", None))
+            return OrderedDict([
+                ("sha1", sha1),
+                ("name", os.path.basename(obj.name)),
+            ])
+
         try:
             read_file = obj.read()
         except UnicodeEncodeError:
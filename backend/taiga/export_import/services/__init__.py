@@ -9,8 +9,14 @@
 # is not the baddest practice ;)
 
 from .render import render_project
+from .render import render_project_archive
 from . import render
 
+from .read import open_dump
+from .read import read_dump
+from .read import read_dump_header
+from . import read
+
 from .store import store_project_from_dict
 from . import store
 
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+import codecs
+import gzip
+import tempfile
+from collections.abc import Iterator
+
+from taiga.base.utils import json
+
+from .. import archive
+
+
+# The sections of a dump with an item for every element of the project
+# (they are most of it), that are never loaded at once.
+DUMP_ITEMS_SECTIONS = ("epics", "user_stories", "tasks", "issues", "wiki_pages", "timeline")
+
+
+class DumpSection:
+    """
+    The items of a section of a dump spooled to a temporary file, one per
+    line, to iterate them (as many times as needed) loading only one at a
+    time.
+    """
+
+    def __init__(self, items):
+        self.file = tempfile.TemporaryFile()
+        for item in items:
+            # The items are dumped as ASCII, so they never have a line break
+            self.file.write(json.dumps(item).encode("utf-8"))
+            self.file.write(b"\n")
+
+    def __iter__(self):
+        position = 0
+        while True:
+            # Other iterations of the section can move the file in between
+            self.file.seek(position)
+            line = self.file.readline()
+            if not line:
+                return
+            position = self.file.tell()
+            yield json.loads(line)
+
+
+def open_dump(dump_file, is_gzip=False):
+    """
+    Open the JSON document of a dump file: a plain or gzipped JSON file or
+    a dump archive.
+
+    :return: A (text file of the document, dump archive or None) tuple.
+    """
+    dump_archive = None
+    if is_gzip:
+        document = gzip.GzipFile(fileobj=dump_file)
+    elif archive.is_archive(dump_file):
+        dump_archive = archive.open_archive(dump_file)
+        document = archive.open_archive_document(dump_archive)
+    else:
+        document = dump_file
+
+    return codecs.getreader("utf-8")(document), dump_archive
+
+
+def read_dump(document):
+    """
+    Read the JSON document of a dump, without having all of it in memory:
+    the sections with the items of the project (DUMP_ITEMS_SECTIONS) are
+    DumpSections, the rest are loaded as usual.
+
+    A ValueError is raised if it isn't a valid JSON object.
+    """
+    dump = {}
+    for name, value in json.iter_object(document, arrays=DUMP_ITEMS_SECTIONS):
+        if isinstance(value, Iterator):
+            value = DumpSection(value)
+        dump[name] = value
+    return dump
+
+
+def read_dump_header(document):
+    """
+    Read the JSON document of a dump, skipping the sections with the items
+    of the project (DUMP_ITEMS_SECTIONS).
+
+    A ValueError is raised if it isn't a valid JSON object.
+    """
+    return {name: value for name, value in json.iter_object(document, arrays=DUMP_ITEMS_SECTIONS)
+            if name not in DUMP_ITEMS_SECTIONS}
@@ -15,6 +15,7 @@ from taiga.base.fields import MethodField
 from taiga.timeline.service import get_project_timeline
 from taiga.base.api.fields import get_component
 
+from .. import archive
 from .. import serializers
 
 
@@ -86,3 +87,11 @@ def render_project(project, outfile, chunk_size=8190):
         outfile.write(dumped_value.encode())
 
     outfile.write(b']}\n')
+
+
+def render_project_archive(project, outfile):
+    """
+    Render a project as a dump archive, with its files out of the JSON
+    document (see taiga.export_import.archive).
+    """
+    archive.write_archive(outfile, lambda document: render_project(project, document))
@@ -13,23 +13,41 @@ import uuid
 
 from unidecode import unidecode
 
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import utils
 from django.template.defaultfilters import slugify
+from django.utils import timezone
 from django.utils.translation import gettext as _
 
-from taiga.projects.history.services import make_key_from_model_object, take_snapshot
+from taiga.base.utils import iterators
+from taiga.mdrender.service import bump_project_links_epochs
+from taiga.projects.epics.models import RelatedUserStory
+from taiga.projects.history.models import HistoryEntry
+from taiga.projects.history.services import (make_key_from_model_object, take_snapshot,
+                                             invalidate_snapshot_state_for_keys)
+from taiga.projects.issues import signals as issues_signals
+from taiga.projects.mixins.blocked import blocked_pre_save
 from taiga.projects.models import Membership
+from taiga.projects.notifications.models import Watched
 from taiga.projects.references import sequences as seq
 from taiga.projects.references import models as refs
-from taiga.projects.userstories.models import RolePoints
+from taiga.projects.tagging.signals import tags_normalization
+from taiga.projects.tasks import signals as tasks_signals
+from taiga.projects.tasks.models import Task
+from taiga.projects.userstories.models import RolePoints, UserStory
 from taiga.projects.services import find_invited_user
+from taiga.projects.services.csv_snapshots import bump_csv_watermarks
+from taiga.projects.services.facets import bump_filters_data_version
+from taiga.timeline.models import Timeline
 from taiga.timeline.service import build_project_namespace
 
 from .. import exceptions as err
 from .. import validators
 from .. import services
+from ..archive import using_archive_files
 
 import logging
 logger = logging.getLogger('taiga.export_import')
@@ -83,6 +101,7 @@ def store_project(data):
             "wiki_pages", "wiki_links",
             "notify_policies",
             "epics", "user_stories", "issues", "tasks",
+            "timeline",
             "is_featured"
         ]
         if key not in excluded_fields:
@@ -369,12 +388,16 @@ def _store_role_point(project, us, role_point):
     return None
 
 
-def store_user_story(project, data):
+def _get_user_story_validator_data(project, data):
     if "status" not in data and project.default_us_status:
         data["status"] = project.default_us_status.name
 
-    us_data = {key: value for key, value in data.items() if key not in
-               ["role_points", "custom_attributes_values", 'generated_from_task', 'generated_from_issue']}
+    return {key: value for key, value in data.items() if key not in
+            ["role_points", "custom_attributes_values", 'generated_from_task', 'generated_from_issue']}
+
+
+def store_user_story(project, data):
+    us_data = _get_user_story_validator_data(project, data)
 
     validator = validators.UserStoryExportValidator(data=us_data, context={"project": project})
 
@@ -433,7 +456,7 @@ def store_user_stories(project, data):
     for userstory in data.get("user_stories", []):
         validator = store_user_story(project, userstory)
         if validator:
-            user_stories[validator.object.ref] = validator.object
+            user_stories[validator.object.ref] = validator.object.id
     return user_stories
 
 
@@ -442,19 +465,23 @@ def store_user_stories_related_entities(imported_user_stories,
                                         imported_issues,
                                         data):
     for us_data in data.get("user_stories", []):
-        us = imported_user_stories.get(us_data.get('ref'))
-        if not us or \
+        us_id = imported_user_stories.get(us_data.get('ref'))
+        if not us_id or \
                 not (us_data.get('generated_from_task')
                      or us_data.get('generated_from_issue')):
             continue
 
+        us = UserStory.objects.get(id=us_id)
+        us._importing = True
+        us._not_notify = True
+
         if us_data.get('generated_from_task'):
             generated_from_task_ref = int(us_data.get('generated_from_task'))
-            us.generated_from_task = imported_tasks.get(generated_from_task_ref)
+            us.generated_from_task_id = imported_tasks.get(generated_from_task_ref)
 
         if us_data.get('generated_from_issue'):
             generated_from_issue_ref = int(us_data.get('generated_from_issue'))
-            us.generated_from_issue = imported_issues.get(generated_from_issue_ref)
+            us.generated_from_issue_id = imported_issues.get(generated_from_issue_ref)
 
         us.save()
 
@@ -473,17 +500,21 @@ def _store_epic_related_user_story(project, epic, related_user_story):
     return None
 
 
-def store_epic(project, data):
+def _get_epic_validator_data(project, data):
     if "status" not in data and project.default_epic_status:
         data["status"] = project.default_epic_status.name
 
     # Ignore external related user stories
-    data["related_user_stories"] = filter(
-       lambda x: x.get("source_project_slug", None) is None,
-       data.get("related_user_stories", [])
-    )
+    data["related_user_stories"] = [
+        related_user_story for related_user_story in data.get("related_user_stories", [])
+        if related_user_story.get("source_project_slug", None) is None
+    ]
+    return data
+
 
-    validator = validators.EpicExportValidator(data=data, context={"project": project})
+def store_epic(project, data):
+    validator = validators.EpicExportValidator(data=_get_epic_validator_data(project, data),
+                                               context={"project": project})
 
     if validator.is_valid():
         validator.object.project = project
@@ -535,20 +566,22 @@ def store_epic(project, data):
 
 
 def store_epics(project, data):
-    results = []
     for epic in data.get("epics", []):
-        epic = store_epic(project, epic)
-        results.append(epic)
-    return results
+        store_epic(project, epic)
 
 
 ## TASKS
 
-def store_task(project, data):
+def _get_task_validator_data(project, data):
     if "status" not in data and project.default_task_status:
         data["status"] = project.default_task_status.name
 
-    validator = validators.TaskExportValidator(data=data, context={"project": project})
+    return data
+
+
+def store_task(project, data):
+    validator = validators.TaskExportValidator(data=_get_task_validator_data(project, data),
+                                               context={"project": project})
     if validator.is_valid():
         validator.object.project = project
         if validator.object.owner is None:
@@ -601,15 +634,13 @@ def store_tasks(project, data):
     for task in data.get("tasks", []):
         validator = store_task(project, task)
         if validator:
-            tasks[validator.object.ref] = validator.object
+            tasks[validator.object.ref] = validator.object.id
     return tasks
 
 
 ## ISSUES
 
-def store_issue(project, data):
-    validator = validators.IssueExportValidator(data=data, context={"project": project})
-
+def _get_issue_validator_data(project, data):
     if "type" not in data and project.default_issue_type:
         data["type"] = project.default_issue_type.name
 
@@ -622,6 +653,13 @@ def store_issue(project, data):
     if "severity" not in data and project.default_severity:
         data["severity"] = project.default_severity.name
 
+    return data
+
+
+def store_issue(project, data):
+    validator = validators.IssueExportValidator(data=_get_issue_validator_data(project, data),
+                                                context={"project": project})
+
     if validator.is_valid():
         validator.object.project = project
         if validator.object.owner is None:
@@ -673,7 +711,7 @@ def store_issues(project, data):
     for issue in data.get("issues", []):
         validator = store_issue(project, issue)
         if validator:
-            issues[validator.object.ref] = validator.object
+            issues[validator.object.ref] = validator.object.id
     return issues
 
 
@@ -708,10 +746,8 @@ def store_wiki_page(project, wiki_page):
 
 
 def store_wiki_pages(project, data):
-    results = []
     for wiki_page in data.get("wiki_pages", []):
-        results.append(store_wiki_page(project, wiki_page))
-    return results
+        store_wiki_page(project, wiki_page)
 
 
 ## WIKI LINKS
@@ -759,19 +795,363 @@ def _store_timeline_entry(project, timeline):
     return validator
 
 
-def store_timeline_entries(project, data):
+def _get_timeline_items(project, data):
     # Exclude epic.related_userstories entries if they are not from this project
-    timeline_items = filter(
+    return filter(
         lambda t: not(
             (t.get("event_type", None) in ["epics.relateduserstory.create", "epics.relateduserstory.delete"]) and
             (t.get("data", {}).get("userstory", {}).get("project", {}).get("slug", None) != project.slug)
         ), data.get("timeline", []))
 
-    results = []
-    for timeline in timeline_items:
-        tl = _store_timeline_entry(project, timeline)
-        results.append(tl)
-    return results
+
+def store_timeline_entries(project, data):
+    for timeline in _get_timeline_items(project, data):
+        _store_timeline_entry(project, timeline)
+
+
+########################################################################
+## Bulk store
+########################################################################
+#
+# In the bulk store mode (settings.IMPORTS_BULK_STORE_ENABLED) the epics,
+# user stories, tasks, issues and timeline entries of a dump are validated
+# one by one, as usual, but stored in batches: their rows and the rows of
+# their role points, custom attributes values, watchers, related user
+# stories and history entries are inserted with bulk_create, so no model
+# signal is sent for them. What those signals would do in the new project
+# is done after every batch (refs, finished dates, closed user stories and
+# sprints, history snapshot states...) or once at the end of the import
+# (see _bump_project_versions_after_bulk_store). The attachments are still
+# stored one by one, with their files.
+
+BULK_STORE_BATCH_SIZE = 500
+
+
+def is_bulk_store_enabled():
+    return getattr(settings, "IMPORTS_BULK_STORE_ENABLED", True)
+
+
+def _validate_item_for_bulk_store(project, data, validator_class, section, context):
+    validator = validator_class(data=data, context=context)
+    if not validator.is_valid():
+        add_errors(section, validator.errors)
+        return None
+
+    validator.object.project = project
+    if validator.object.owner is None:
+        validator.object.owner = project.owner
+    validator.object._importing = True
+    validator.object._not_notify = True
+    return validator
+
+
+def _allocate_refs_in_bulk(project, objs):
+    sequence_name = refs.make_sequence_name(project)
+    if not seq.exists(sequence_name):
+        seq.create(sequence_name)
+
+    # The sequence is moved past the refs of the dump before giving new ones
+    max_ref = max((obj.ref for obj in objs if obj.ref), default=None)
+    if max_ref is not None:
+        seq.set_max(sequence_name, max_ref)
+
+    objs_without_ref = [obj for obj in objs if not obj.ref]
+    if objs_without_ref:
+        for obj, ref in zip(objs_without_ref, seq.next_values(sequence_name, len(objs_without_ref))):
+            obj.ref = ref
+
+    return objs_without_ref
+
+
+def _store_m2m_data_in_bulk(model, objs):
+    through_objs = {}
+    for obj in objs:
+        for field_name, related_objs in obj._m2m_data.items():
+            if not related_objs:
+                continue
+
+            field = model._meta.get_field(field_name)
+            through = getattr(field, "remote_field", None) and field.remote_field.through
+            if not through or not through._meta.auto_created:
+                getattr(obj, field_name).set(related_objs)
+                continue
+
+            through_objs.setdefault(through, []).extend(
+                through(**{field.m2m_column_name(): obj.id, field.m2m_reverse_name(): related_obj.id})
+                for related_obj in related_objs
+            )
+
+    for through, rows in through_objs.items():
+        through.objects.bulk_create(rows)
+
+
+def _store_watchers_in_bulk(project, content_type, item_validators):
+    emails = {email for validator in item_validators for email in validator._watchers}
+    users_by_email = {user.email: user for user in get_user_model().objects.filter(email__in=emails)}
+
+    Watched.objects.bulk_create([
+        Watched(content_type=content_type, object_id=validator.object.id,
+                user=users_by_email[email], project=project)
+        for validator in item_validators
+        for email in set(validator._watchers) if email in users_by_email
+    ])
+
+
+def _create_items_in_bulk(project, item_validators, default_attributes, pre_save_handlers):
+    """
+    Insert the objects of a batch of item validators with their refs,
+    assigned users, watchers and (empty) custom attributes values. Return
+    the custom attributes values by item id.
+    """
+    objs = [validator.object for validator in item_validators]
+    model = type(objs[0])
+
+    # What the model save and its pre_save signals would do
+    now = timezone.now()
+    for obj in objs:
+        if not obj.modified_date:
+            obj.modified_date = now
+        for field_name, project_field_name in default_attributes:
+            if getattr(obj, field_name + "_id") is None:
+                setattr(obj, field_name, getattr(project, project_field_name))
+        for handler in pre_save_handlers:
+            handler(model, obj)
+
+    objs_without_ref = _allocate_refs_in_bulk(project, objs)
+
+    model.objects.bulk_create(objs)
+
+    content_type = ContentType.objects.get_for_model(model)
+    refs.Reference.objects.bulk_create([
+        refs.Reference(content_type=content_type, object_id=obj.id, ref=obj.ref, project=project)
+        for obj in objs_without_ref
+    ])
+
+    _store_m2m_data_in_bulk(model, objs)
+    _store_watchers_in_bulk(project, content_type, item_validators)
+
+    custom_attributes_values_field = model._meta.get_field("custom_attributes_values")
+    custom_attributes_values_model = custom_attributes_values_field.related_model
+    custom_attributes_values = custom_attributes_values_model.objects.bulk_create([
+        custom_attributes_values_model(**{custom_attributes_values_field.field.name: obj, "attributes_values": {}})
+        for obj in objs
+    ])
+    return {obj.id: values for obj, values in zip(objs, custom_attributes_values)}
+
+
+def _store_history_in_bulk(project, items, statuses):
+    entries = []
+    for obj, data in items:
+        key = make_key_from_model_object(obj)
+        for history in data.get("history", []):
+            validator = validators.HistoryExportValidator(data=history,
+                                                          context={"project": project, "statuses": statuses})
+            if not validator.is_valid():
+                add_errors("history", validator.errors)
+                continue
+
+            validator.object.key = key
+            if validator.object.diff is None:
+                validator.object.diff = []
+            validator.object.project_id = project.id
+            entries.append(validator.object)
+
+    HistoryEntry.objects.bulk_create(entries)
+    invalidate_snapshot_state_for_keys({entry.key for entry in entries})
+
+
+def _store_items_in_bulk(project, items, *, section, validator_class, get_validator_data, custom_attributes,
+                         statuses, default_attributes=(), pre_save_handlers=(), store_related=None,
+                         after_batch=None):
+    """
+    Store the items (epics, user stories, tasks or issues) of a section of
+    a dump in batches.
+
+    :return: A dict of the ids of the stored items by ref.
+    """
+    context = {"project": project, "related_objects_cache": {}}
+    stored = {}
+
+    for batch in iterators.iter_batches(items, BULK_STORE_BATCH_SIZE):
+        item_validators, stored_items = [], []
+        for data in batch:
+            validator = _validate_item_for_bulk_store(project, get_validator_data(project, data),
+                                                      validator_class, section, context)
+            if validator:
+                item_validators.append(validator)
+                stored_items.append((validator.object, data))
+
+        if not item_validators:
+            continue
+
+        custom_attributes_values = _create_items_in_bulk(project, item_validators, default_attributes,
+                                                         pre_save_handlers)
+        if after_batch:
+            after_batch(project, [obj for obj, data in stored_items])
+
+        for obj, data in stored_items:
+            for attachment in data.get("attachments", []):
+                _store_attachment(project, obj, attachment)
+
+        if store_related:
+            store_related(project, stored_items, context)
+
+        _store_history_in_bulk(project, stored_items, statuses)
+        for obj, data in stored_items:
+            if not data.get("history", []):
+                take_snapshot(obj, user=obj.owner)
+
+        updated_custom_attributes_values = []
+        for obj, data in stored_items:
+            if data.get("custom_attributes_values", None):
+                # Only the values of the custom attributes of the project are kept
+                values = custom_attributes_values[obj.id]
+                values.attributes_values = _use_id_instead_name_as_key_in_custom_attributes_values(
+                    custom_attributes, data["custom_attributes_values"])
+                updated_custom_attributes_values.append(values)
+
+        if updated_custom_attributes_values:
+            type(updated_custom_attributes_values[0]).objects.bulk_update(updated_custom_attributes_values,
+                                                                          ["attributes_values"])
+
+        stored.update((obj.ref, obj.id) for obj, data in stored_items)
+
+    return stored
+
+
+def _store_role_points_in_bulk(project, user_stories, context):
+    # The user stories are created with the default points for every
+    # computable role (see UserStory.save)
+    computable_roles_ids = list(project.roles.filter(computable=True).values_list("id", flat=True))
+
+    role_points = []
+    for us, data in user_stories:
+        points_by_role_id = {role_id: project.default_points for role_id in computable_roles_ids}
+        for role_point in data.get("role_points", []):
+            validator = validators.RolePointsExportValidator(data=role_point, context=context)
+            if validator.is_valid():
+                points_by_role_id[validator.object.role.id] = validator.object.points
+            else:
+                add_errors("role_points", validator.errors)
+
+        role_points += [RolePoints(user_story=us, role_id=role_id, points=points)
+                        for role_id, points in points_by_role_id.items()]
+
+    RolePoints.objects.bulk_create(role_points)
+
+
+def _store_epics_related_user_stories_in_bulk(project, epics, context):
+    related_user_stories = []
+    for epic, data in epics:
+        for related_user_story in data.get("related_user_stories", []):
+            validator = validators.EpicRelatedUserStoryExportValidator(data=related_user_story, context=context)
+            if validator.is_valid():
+                validator.object.epic = epic
+                related_user_stories.append(validator.object)
+            else:
+                add_errors("epic_related_user_stories", validator.errors)
+
+    RelatedUserStory.objects.bulk_create(related_user_stories)
+
+
+def _try_to_close_or_open_user_stories_and_milestones_of_tasks(project, tasks):
+    # What the post_save signal of every task would do, once for every user
+    # story and sprint (in the order of their last task)
+    last_tasks = {}
+    for task in tasks:
+        key = (task.user_story_id, task.milestone_id)
+        last_tasks.pop(key, None)
+        last_tasks[key] = task
+
+    for task in last_tasks.values():
+        task.prev = None
+        tasks_signals.try_to_close_or_open_us_and_milestone_when_create_or_edit_task(Task, task, created=True)
+
+
+def store_epics_in_bulk(project, data):
+    return _store_items_in_bulk(
+        project, data.get("epics", []),
+        section="epics",
+        validator_class=validators.EpicExportValidator,
+        get_validator_data=_get_epic_validator_data,
+        custom_attributes=list(project.epiccustomattributes.all().values('id', 'name')),
+        statuses={s.name: s.id for s in project.epic_statuses.all()},
+        default_attributes=(("status", "default_epic_status"),),
+        pre_save_handlers=(blocked_pre_save, tags_normalization),
+        store_related=_store_epics_related_user_stories_in_bulk,
+    )
+
+
+def store_user_stories_in_bulk(project, data):
+    return _store_items_in_bulk(
+        project, data.get("user_stories", []),
+        section="user_stories",
+        validator_class=validators.UserStoryExportValidator,
+        get_validator_data=_get_user_story_validator_data,
+        custom_attributes=list(project.userstorycustomattributes.all().values('id', 'name')),
+        statuses={s.name: s.id for s in project.us_statuses.all()},
+        default_attributes=(("status", "default_us_status"),),
+        pre_save_handlers=(blocked_pre_save, tags_normalization),
+        store_related=_store_role_points_in_bulk,
+    )
+
+
+def store_tasks_in_bulk(project, data):
+    return _store_items_in_bulk(
+        project, data.get("tasks", []),
+        section="tasks",
+        validator_class=validators.TaskExportValidator,
+        get_validator_data=_get_task_validator_data,
+        custom_attributes=list(project.taskcustomattributes.all().values('id', 'name')),
+        statuses={s.name: s.id for s in project.task_statuses.all()},
+        default_attributes=(("status", "default_task_status"),),
+        pre_save_handlers=(blocked_pre_save, tasks_signals.set_finished_date_when_edit_task, tags_normalization),
+        after_batch=_try_to_close_or_open_user_stories_and_milestones_of_tasks,
+    )
+
+
+def store_issues_in_bulk(project, data):
+    return _store_items_in_bulk(
+        project, data.get("issues", []),
+        section="issues",
+        validator_class=validators.IssueExportValidator,
+        get_validator_data=_get_issue_validator_data,
+        custom_attributes=list(project.issuecustomattributes.all().values('id', 'name')),
+        statuses={s.name: s.id for s in project.issue_statuses.all()},
+        default_attributes=(("status", "default_issue_status"), ("type", "default_issue_type"),
+                            ("severity", "default_severity"), ("priority", "default_priority")),
+        pre_save_handlers=(blocked_pre_save, issues_signals.set_finished_date_when_edit_issue, tags_normalization),
+    )
+
+
+def store_timeline_entries_in_bulk(project, data):
+    context = {"project": project}
+    namespace = build_project_namespace(project)
+    content_type = ContentType.objects.get_for_model(project.__class__)
+
+    for batch in iterators.iter_batches(_get_timeline_items(project, data), BULK_STORE_BATCH_SIZE):
+        entries = []
+        for timeline in batch:
+            validator = validators.TimelineExportValidator(data=timeline, context=context)
+            if not validator.is_valid():
+                add_errors("timeline", validator.errors)
+                continue
+
+            validator.object.project = project
+            validator.object.namespace = namespace
+            validator.object.object_id = project.id
+            validator.object.content_type = content_type
+            entries.append(validator.object)
+
+        Timeline.objects.bulk_create(entries)
+
+
+def _bump_project_versions_after_bulk_store(project):
+    # The caches and exports versions moved by the signals of the objects
+    # stored in bulk
+    bump_filters_data_version(project.id)
+    bump_csv_watermarks(project.id)
+    bump_project_links_epochs([project.id])
 
 
 #############################################
@@ -869,20 +1249,22 @@ def _populate_project_object(project, data):
     store_milestones(project, data)
     check_if_there_is_some_error(_("error importing sprints"), project)
 
+    bulk = is_bulk_store_enabled()
+
     # Create issues
-    imported_issues = store_issues(project, data)
+    imported_issues = (store_issues_in_bulk if bulk else store_issues)(project, data)
     check_if_there_is_some_error(_("error importing issues"), project)
 
     # Create user stories
-    imported_user_stories = store_user_stories(project, data)
+    imported_user_stories = (store_user_stories_in_bulk if bulk else store_user_stories)(project, data)
     check_if_there_is_some_error(_("error importing user stories"), project)
 
     # Create epics
-    store_epics(project, data)
+    (store_epics_in_bulk if bulk else store_epics)(project, data)
     check_if_there_is_some_error(_("error importing epics"), project)
 
     # Create tasks
-    imported_tasks = store_tasks(project, data)
+    imported_tasks = (store_tasks_in_bulk if bulk else store_tasks)(project, data)
     check_if_there_is_some_error(_("error importing tasks"), project)
 
     # Create user stories relationships
@@ -901,14 +1283,27 @@ def _populate_project_object(project, data):
     check_if_there_is_some_error(_("error importing tags"), project)
 
     # Create timeline
-    store_timeline_entries(project, data)
+    (store_timeline_entries_in_bulk if bulk else store_timeline_entries)(project, data)
     check_if_there_is_some_error(_("error importing timelines"), project)
 
+    if bulk:
+        _bump_project_versions_after_bulk_store(project)
+
     # Regenerate stats
     project.refresh_totals()
 
 
-def store_project_from_dict(data, owner=None):
+def store_project_from_dict(data, owner=None, archive_files=None):
+    """
+    Create a project from the data of a dump (loaded or got with
+    `read_dump`). `archive_files` are the files of the dump archive (an
+    ArchiveFilesReader), if it was one.
+    """
+    with using_archive_files(archive_files):
+        return _store_project_from_dict(data, owner)
+
+
+def _store_project_from_dict(data, owner=None):
     # Validate
     if owner:
         _validate_if_owner_have_enough_space_to_this_project(owner, data)
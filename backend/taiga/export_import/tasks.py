@@ -9,6 +9,7 @@ import datetime
 import logging
 import sys
 import gzip
+import zipfile
 
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
@@ -20,7 +21,9 @@ from django.utils.translation import gettext as _
 from taiga.base.mails import mail_builder
 from taiga.base.utils import json
 from taiga.celery import app
+from taiga.projects.models import Project
 
+from . import archive
 from . import exceptions as err
 from . import services
 from .renderers import ExportRenderer
@@ -35,6 +38,10 @@ def dump_project(self, user, project, dump_format):
             path = "exports/{}/{}-{}.json.gz".format(project.pk, project.slug, self.request.id)
             with default_storage.open(path, mode="wb") as outfile:
                 services.render_project(project, gzip.GzipFile(fileobj=outfile, mode="wb"))
+        elif dump_format == "zip":
+            path = "exports/{}/{}-{}.zip".format(project.pk, project.slug, self.request.id)
+            with default_storage.open(path, mode="wb") as outfile:
+                services.render_project_archive(project, outfile)
         else:
             path = "exports/{}/{}-{}.json".format(project.pk, project.slug, self.request.id)
             with default_storage.open(path, mode="wb") as outfile:
@@ -70,6 +77,8 @@ def dump_project(self, user, project, dump_format):
 def delete_project_dump(project_id, project_slug, task_id, dump_format):
     if dump_format == "gzip":
         path = "exports/{}/{}-{}.json.gz".format(project_id, project_slug, task_id)
+    elif dump_format == "zip":
+        path = "exports/{}/{}-{}.zip".format(project_id, project_slug, task_id)
     else:
         path = "exports/{}/{}-{}.json".format(project_id, project_slug, task_id)
     default_storage.delete(path)
@@ -92,10 +101,34 @@ TRACE ERROR:
 ------------""")
 
 
+def _store_project_from_dump(user, dump_path, is_gzip):
+    try:
+        with default_storage.open(dump_path, mode="rb") as dump_file:
+            try:
+                document, dump_archive = services.open_dump(dump_file, is_gzip=is_gzip)
+                dump = services.read_dump(document)
+            except (ValueError, OSError, EOFError, zipfile.BadZipFile):
+                # Not JSON, or a truncated or corrupted gzip or zip file
+                raise err.TaigaImportError(_("Invalid dump format"), None)
+
+            slug = dump.get('slug', None)
+            if slug is not None and Project.objects.filter(slug=slug).exists():
+                del dump['slug']
+
+            archive_files = archive.ArchiveFilesReader(dump_archive) if dump_archive is not None else None
+            return services.store_project_from_dict(dump, user, archive_files=archive_files)
+    finally:
+        default_storage.delete(dump_path)
+
+
 @app.task
-def load_project_dump(user, dump):
+def load_project_dump(user, dump_path, is_gzip=False):
     try:
-        project = services.store_project_from_dict(dump, user)
+        if isinstance(dump_path, dict):
+            # Tasks queued by older versions have the loaded dump
+            project = services.store_project_from_dict(dump_path, user)
+        else:
+            project = _store_project_from_dump(user, dump_path, is_gzip)
     except err.TaigaImportError as e:
         # On Error
         ## remove project
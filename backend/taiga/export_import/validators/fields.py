@@ -19,6 +19,7 @@ from taiga.base.fields import JSONField
 from taiga.mdrender.service import render as mdrender
 from taiga.users import models as users_models
 
+from ..archive import get_archive_files
 from .cache import cached_get_user_by_email
 
 
@@ -29,6 +30,14 @@ class FileField(serializers.WritableField):
         if not data:
             return None
 
+        if "sha1" in data:
+            # A file of a dump archive
+            archive_files = get_archive_files()
+            file = archive_files.open(data["sha1"], data["name"]) if archive_files is not None else None
+            if file is None:
+                raise ValidationError(_("The file {} is not in the dump").format(data["name"]))
+            return file
+
         decoded_data = b''
         # The original file was encoded by chunks but we don't really know its
         # length or if it was multiple of 3 so we must iterate over all those chunks
@@ -126,12 +135,22 @@ class ProjectRelatedField(serializers.RelatedField):
         super().__init__(*args, **kwargs)
 
     def from_native(self, data):
+        # The validators of a bulk store share the objects found in a cache
+        cache = self.context.get("related_objects_cache", None)
+        cache_key = (self.queryset.model, self.slug_field, data)
+        if cache is not None and cache_key in cache:
+            return cache[cache_key]
+
         try:
             kwargs = {self.slug_field: data, "project": self.context['project']}
-            return self.queryset.get(**kwargs)
+            obj = self.queryset.get(**kwargs)
         except ObjectDoesNotExist:
             raise ValidationError(_("{}=\"{}\" not found in this project".format(self.slug_field, data)))
 
+        if cache is not None:
+            cache[cache_key] = obj
+        return obj
+
 
 class HistorySnapshotField(JSONField):
     def from_native(self, data):
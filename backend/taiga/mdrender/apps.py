@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+from django.apps import AppConfig
+from django.apps import apps
+from django.db.models import signals
+
+
+class MdRenderAppConfig(AppConfig):
+    name = "taiga.mdrender"
+    verbose_name = "Markdown render"
+
+    def ready(self):
+        from . import signals as handlers
+
+        # The rendered texts of a project are invalidated when its members,
+        # its references or its slug change.
+        for model in ("projects.Membership", "references.Reference"):
+            signals.post_save.connect(handlers.bump_links_epoch_of_related_project,
+                                      sender=apps.get_model(model),
+                                      dispatch_uid="mdrender_links_epoch_{}_post_save".format(model))
+            signals.post_delete.connect(handlers.bump_links_epoch_of_related_project,
+                                        sender=apps.get_model(model),
+                                        dispatch_uid="mdrender_links_epoch_{}_post_delete".format(model))
+        signals.post_save.connect(handlers.bump_links_epoch_of_project,
+                                  sender=apps.get_model("projects", "Project"),
+                                  dispatch_uid="mdrender_links_epoch_project_post_save")
@@ -28,6 +28,8 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
+import re
+
 from django.contrib.auth import get_user_model
 
 from markdown.extensions import Extension
@@ -36,17 +38,36 @@ from markdown.util import AtomicString
 from xml.etree import ElementTree as etree
 from taiga.front.templatetags.functions import resolve
 
+MENTION_RE = r"\B(@)([\w.-]+)\b"
+
+
+def get_mentioned_users(text, project=None):
+    """
+    Find all the users mentioned in the text with only one query. Return a dict
+    with the user (or None if it doesn't exist) of every mentioned username.
+    """
+    usernames = sorted({m.group(2) for m in re.finditer(MENTION_RE, text)})
+    if not usernames:
+        return {}
+
+    kwargs = {"username__in": usernames}
+    if project is not None:
+        kwargs["memberships__project_id"] = project.id
+    users = {user.username: user for user in get_user_model().objects.filter(**kwargs)}
+    return {username: users.get(username, None) for username in usernames}
+
 
 class MentionsExtension(Extension):
     project = None
+    users = None
 
     def __init__(self, *args, **kwargs):
         self.project = kwargs.pop("project", None)
+        self.users = kwargs.pop("users", None)
         super().__init__(*args, **kwargs)
 
     def extendMarkdown(self, md):
-        MENTION_RE = r"\B(@)([\w.-]+)\b"
-        mentionsPattern = MentionsPattern(MENTION_RE, project=self.project)
+        mentionsPattern = MentionsPattern(MENTION_RE, project=self.project, users=self.users)
         mentionsPattern.md = md
         md.inlinePatterns.register(mentionsPattern, "mentions", 80)
 
@@ -54,18 +75,28 @@ class MentionsExtension(Extension):
 class MentionsPattern(Pattern):
     project = None
 
-    def __init__(self, pattern, md=None, project=None):
+    def __init__(self, pattern, md=None, project=None, users=None):
         self.project = project
+        self.users = users or {}
         super().__init__(pattern, md)
 
-    def handleMatch(self, m):
-        username = m.group(3)
+    def _get_user(self, username):
+        if username in self.users:
+            return self.users[username]
+
         kwargs = {"username": username}
         if self.project is not None:
             kwargs["memberships__project_id"]=self.project.id
         try:
-            user = get_user_model().objects.get(**kwargs)
+            return get_user_model().objects.get(**kwargs)
         except get_user_model().DoesNotExist:
+            return None
+
+    def handleMatch(self, m):
+        username = m.group(3)
+        self.md.project_dependent = True
+        user = self._get_user(username)
+        if user is None:
             return "@{}".format(username)
 
         url = resolve("user", username)
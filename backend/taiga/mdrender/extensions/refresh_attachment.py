@@ -43,6 +43,7 @@ class RefreshAttachmentTreeprocessor(Treeprocessor):
                     # It's not an attachment
                     break
 
+                self.md.project_dependent = True
                 type_, attachment_id = extract_refresh_id(url)
                 if not attachment_id:
                     # There is no refresh parameter
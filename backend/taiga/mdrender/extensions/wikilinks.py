@@ -34,11 +34,11 @@ class WikiLinkExtension(Extension):
 class WikiLinksPattern(Pattern):
     def __init__(self, md, pattern, project):
         self.project = project
-        self.md = md
-        super().__init__(pattern)
+        super().__init__(pattern, md)
 
     def handleMatch(self, m):
         label = m.group(2).strip()
+        self.md.project_dependent = True
 
         # `project` could be other object (!)
         slug = getattr(self.project, "slug", None)
@@ -78,6 +78,7 @@ class RelativeLinksTreeprocessor(Treeprocessor):
 
             if SLUG_RE.search(href):
                 # [wiki](wiki_page) -> <a href="FRONT_HOST/.../wiki/wiki_page" ...
+                self.md.project_dependent = True
 
                 # `project` could be other object (!)
                 slug = getattr(self.project, "slug", None)
@@ -7,10 +7,16 @@
 
 from django.conf import settings
 
+import collections
 import hashlib
 import functools
+import itertools
+import threading
+import uuid
 import bleach
 
+from contextlib import contextmanager
+
 # BEGIN PATCH
 import html5lib
 from html5lib.serializer import HTMLSerializer
@@ -39,8 +45,8 @@ from .extensions.semi_sane_lists import SemiSaneListExtension
 from .extensions.strikethrough import StrikethroughExtension
 from .extensions.wikilinks import WikiLinkExtension
 from .extensions.emojify import EmojifyExtension
-from .extensions.mentions import MentionsExtension
-from .extensions.references import TaigaReferencesExtension
+from .extensions.mentions import MentionsExtension, get_mentioned_users
+from .extensions.references import TaigaReferencesExtension, get_referenced_instances
 from .extensions.target_link import TargetBlankLinkExtension
 from .extensions.refresh_attachment import RefreshAttachmentExtension
 
@@ -60,7 +66,7 @@ bleach.ALLOWED_ATTRIBUTES["*"] = ["class", "style", "id"]
 ALLOWED_PROTOCOLS = ["http", "https", "ftp", "mailto"]
 
 
-def _make_extensions_list(project=None):
+def _make_extensions_list(project=None, users=None, references=None):
     return ["pymdownx.tasklist",
             AutolinkExtension(),
             AutomailExtension(),
@@ -68,8 +74,8 @@ def _make_extensions_list(project=None):
             StrikethroughExtension(),
             WikiLinkExtension(project),
             EmojifyExtension(),
-            MentionsExtension(project=project),
-            TaigaReferencesExtension(project),
+            MentionsExtension(project=project, users=users),
+            TaigaReferencesExtension(project, references=references),
             TargetBlankLinkExtension(),
             RefreshAttachmentExtension(project=project),
             "markdown.extensions.extra",
@@ -92,49 +98,169 @@ def _make_extension_configs():
 import diff_match_patch
 
 
+#####################################################################
+# Render cache
+#####################################################################
+#
+# The rendered texts are cached in two levels:
+#
+# - The texts whose html doesn't depend on the project (no mentions,
+#   references, wiki links or attachments) are cached by the hash of the
+#   text and the version of the renderer, shared by all the projects.
+# - The rest are cached by the hash of the text, the project and its links
+#   epoch, that changes every time the members, the references or the slug
+#   of the project change.
+
+# Change it whenever the html generated for the same text changes.
+RENDER_VERSION = "1"
+
+# Hits and misses of the render cache in this process.
+cache_stats = collections.Counter()
+
+
+def _get_project_links_epoch_key(project_id):
+    return "mdrender-links-epoch:{}".format(project_id)
+
+
+def bump_project_links_epochs(project_ids):
+    cache.set_many({_get_project_links_epoch_key(project_id): uuid.uuid4().hex for project_id in project_ids}, None)
+
+
 def cache_by_sha(func):
+    """
+    Cache the results of `func(project, text)`, that must return a tuple
+    `(result, project_dependent)`, and return only the result.
+    """
     @functools.wraps(func)
     def _decorator(project, text):
         if not settings.MDRENDER_CACHE_ENABLE:
-            return func(project, text)
+            return func(project, text)[0]
 
         # Avoid cache of too short texts
         if len(text) <= settings.MDRENDER_CACHE_MIN_SIZE:
-            return func(project, text)
+            return func(project, text)[0]
 
         sha1_hash = hashlib.sha1(force_bytes(text)).hexdigest()
-        key = "mdrender/{}-{}".format(sha1_hash, project.id)
+        key = "mdrender/{}/{}".format(RENDER_VERSION, sha1_hash)
+        epoch_key = _get_project_links_epoch_key(project.id)
 
         # Try to get it from the cache
-        cached = cache.get(key)
-        if cached is not None:
-            return cached
-
-        returned_value = func(project, text)
-        cache.set(key, returned_value, timeout=settings.MDRENDER_CACHE_TIMEOUT)
+        cached = cache.get_many([key, epoch_key])
+        epoch = cached.get(epoch_key, None)
+        if epoch is None:
+            epoch = uuid.uuid4().hex
+            cache.set(epoch_key, epoch, None)
+        project_key = "{}/{}-{}".format(key, project.id, epoch)
+
+        shared = cached.get(key, None)
+        if shared is not None:
+            project_dependent, returned_value = shared
+            if not project_dependent:
+                cache_stats["shared_hits"] += 1
+                return returned_value
+
+            returned_value = cache.get(project_key)
+            if returned_value is not None:
+                cache_stats["project_hits"] += 1
+                return returned_value
+
+        cache_stats["misses"] += 1
+        returned_value, project_dependent = func(project, text)
+        if project_dependent:
+            cache.set_many({key: (True, None), project_key: returned_value},
+                           timeout=settings.MDRENDER_CACHE_TIMEOUT)
+        else:
+            cache.set(key, (False, returned_value), timeout=settings.MDRENDER_CACHE_TIMEOUT)
         return returned_value
 
     return _decorator
 
 
-def _get_markdown(project):
-    extensions = _make_extensions_list(project=project)
+#####################################################################
+# Markdown engines pool
+#####################################################################
+#
+# Building a Markdown engine (all the extensions, their processors and
+# regexes) is expensive, so every thread keeps a pool of idle engines. The
+# project dependent objects (the project, the resolved mentions and
+# references) are bound to the processors of an engine when it's taken
+# from the pool and unbound when it's given back.
+
+_engines_pool = threading.local()
+
+_BINDABLE_ATTRIBUTES = ("project", "users", "references")
+
+
+def _build_markdown_engine():
+    extensions = _make_extensions_list()
     extension_configs = _make_extension_configs()
     md = Markdown(extensions=extensions, extension_configs=extension_configs)
-    md.extracted_data = {"mentions": [], "references": []}
+
+    processors = itertools.chain(extensions, md.preprocessors, md.parser.blockprocessors,
+                                 md.inlinePatterns, md.treeprocessors, md.postprocessors)
+    md.bindable_processors = [p for p in processors
+                              if any(hasattr(p, attr) for attr in _BINDABLE_ATTRIBUTES)]
     return md
 
 
+def _bind_markdown_engine(md, **values):
+    for processor in md.bindable_processors:
+        for attr, value in values.items():
+            if hasattr(processor, attr):
+                setattr(processor, attr, value)
+
+
+def _get_idle_engines():
+    engines = getattr(_engines_pool, "engines", None)
+    if engines is None:
+        engines = _engines_pool.engines = []
+    return engines
+
+
+def warm_up_markdown_engines(size=None):
+    """
+    Fill the pool of engines of the current thread (call it at the start of
+    the workers to avoid building them on the first renders).
+    """
+    engines = _get_idle_engines()
+    size = settings.MDRENDER_ENGINES_POOL_SIZE if size is None else size
+    while len(engines) < size:
+        engines.append(_build_markdown_engine())
+
+
+@contextmanager
+def _get_markdown(project, text):
+    engines = _get_idle_engines()
+    md = engines.pop() if engines else _build_markdown_engine()
+
+    # Mentions and references are resolved before rendering, with a few set
+    # based queries, instead of one by one while rendering the text.
+    md.reset()
+    _bind_markdown_engine(md, project=project,
+                          users=get_mentioned_users(text, project=project),
+                          references=get_referenced_instances(text, project))
+    md.extracted_data = {"mentions": [], "references": []}
+    md.project_dependent = False
+    try:
+        yield md
+    finally:
+        _bind_markdown_engine(md, project=None, users={}, references={})
+        md.extracted_data = None
+        if len(engines) < settings.MDRENDER_ENGINES_POOL_SIZE:
+            engines.append(md)
+
+
 @cache_by_sha
 def render(project, text):
-    md = _get_markdown(project)
-    return bleach.clean(md.convert(text), protocols=ALLOWED_PROTOCOLS)
+    with _get_markdown(project, text) as md:
+        result = bleach.clean(md.convert(text), protocols=ALLOWED_PROTOCOLS)
+        return (result, md.project_dependent)
 
 
 def render_and_extract(project, text):
-    md = _get_markdown(project)
-    result = bleach.clean(md.convert(text), protocols=ALLOWED_PROTOCOLS)
-    return (result, md.extracted_data)
+    with _get_markdown(project, text) as md:
+        result = bleach.clean(md.convert(text), protocols=ALLOWED_PROTOCOLS)
+        return (result, md.extracted_data)
 
 
 class DiffMatchPatch(diff_match_patch.diff_match_patch):
@@ -185,4 +311,4 @@ def get_diff_of_htmls(html1, html2):
     return diffutil.diff_pretty_html(diffs)
 
 
-__all__ = ["render", "get_diff_of_htmls", "render_and_extract"]
+__all__ = ["render", "get_diff_of_htmls", "render_and_extract", "warm_up_markdown_engines"]
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+from .service import bump_project_links_epochs
+
+
+def bump_links_epoch_of_related_project(sender, instance, **kwargs):
+    bump_project_links_epochs([instance.project_id])
+
+
+def bump_links_epoch_of_project(sender, instance, **kwargs):
+    bump_project_links_epochs([instance.id])
@@ -5,9 +5,94 @@
 #
 # Copyright (c) 2021-present Kaleidos INC
 
+import uuid
+
 from .choices import ADMINS_PERMISSIONS, MEMBERS_PERMISSIONS, ANON_PERMISSIONS
 
 from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+#####################################################################
+# Shared memberships cache
+#####################################################################
+#
+# The memberships of every user are cached, shared by all the requests
+# and processes, as a map `{project_id: (is_admin, role_permissions)}`.
+# The key of the map includes a version that is changed (see the signals
+# of projects) every time a membership or a role of the user changes.
+
+# Incremented on every invalidation done by this process, to discard the
+# maps memoized in the user instances.
+_memberships_cache_generation = 0
+
+
+def get_memberships_cache_version(user_id):
+    key = "permissions-version:{}".format(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(key, version, None)
+    return version
+
+
+def _bump_memberships_cache_versions(user_ids):
+    global _memberships_cache_generation
+    _memberships_cache_generation += 1
+    cache.set_many({"permissions-version:{}".format(user_id): uuid.uuid4().hex for user_id in user_ids}, None)
+
+
+def invalidate_user_memberships_cache(user_ids):
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+
+    _bump_memberships_cache_versions(user_ids)
+    # Other requests could cache the old memberships until the current
+    # transaction is committed.
+    transaction.on_commit(lambda: _bump_memberships_cache_versions(user_ids))
+
+
+def get_user_memberships_cache(user):
+    """
+    Return a dict `{project_id: (is_admin, role_permissions)}` with the
+    memberships of the user.
+    """
+    if user.is_anonymous:
+        return {}
+
+    generation = _memberships_cache_generation
+    cached = getattr(user, "_cached_memberships_permissions", None)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+
+    key = "permissions:{}:{}".format(user.id, get_memberships_cache_version(user.id))
+    memberships = cache.get(key)
+    if memberships is None:
+        qs = apps.get_model("projects", "Membership").objects.filter(user_id=user.id)
+        memberships = {project_id: (is_admin, role_permissions or [])
+                       for project_id, is_admin, role_permissions in qs.values_list("project_id",
+                                                                                    "is_admin",
+                                                                                    "role__permissions")}
+        cache.set(key, memberships, settings.PERMISSIONS_MEMBERSHIPS_CACHE_TIMEOUT)
+
+    user._cached_memberships_permissions = (generation, memberships)
+    return memberships
+
+
+def get_user_project_ids_with_perm(user, perm=None, project_id=None):
+    """
+    Return the ids of the projects where the user is admin or has `perm`
+    by its role (only the admin ones if `perm` is None).
+    """
+    memberships = get_user_memberships_cache(user)
+    if project_id:
+        memberships = {project_id: memberships[project_id]} if project_id in memberships else {}
+
+    return [project_id for project_id, (is_admin, role_permissions) in memberships.items()
+            if is_admin or (perm is not None and perm in role_permissions)]
 
 
 def _get_user_project_membership(user, project, cache="user"):
@@ -53,11 +138,8 @@ def is_project_admin(user, obj):
     if project is None:
         return False
 
-    membership = _get_user_project_membership(user, project)
-    if membership and membership.is_admin:
-        return True
-
-    return False
+    is_admin, _ = get_user_memberships_cache(user).get(project.id, (False, []))
+    return is_admin
 
 
 def user_has_perm(user, perm, obj=None, cache="user"):
@@ -115,15 +197,22 @@ def get_user_project_permissions(user, project, cache="user"):
     cache param determines how memberships are calculated trying to reuse the existing data
     in cache
     """
-    membership = _get_user_project_membership(user, project, cache=cache)
-    is_member = membership is not None
-    is_admin = is_member and membership.is_admin
+    if cache == "user":
+        membership = get_user_memberships_cache(user).get(project.id, None)
+        is_member = membership is not None
+        is_admin, role_permissions = membership if is_member else (False, [])
+    else:
+        membership = _get_user_project_membership(user, project, cache=cache)
+        is_member = membership is not None
+        is_admin = is_member and membership.is_admin
+        role_permissions = _get_membership_permissions(membership)
+
     return calculate_permissions(
         is_authenticated = user.is_authenticated,
         is_superuser =  user.is_superuser,
         is_member = is_member,
         is_admin = is_admin,
-        role_permissions = _get_membership_permissions(membership),
+        role_permissions = role_permissions,
         anon_permissions = project.anon_permissions,
         public_permissions = project.public_permissions
     )
@@ -55,6 +55,108 @@ def disconnect_memberships_signals():
                                  dispatch_uid='membership_post_save')
 
 
+## Permissions cache Signals
+
+def connect_permissions_cache_signals():
+    from . import signals as handlers
+    # On membership, role or project changes, invalidate the cached memberships of the users.
+    signals.post_save.connect(handlers.membership_invalidate_permissions_cache,
+                              sender=apps.get_model("projects", "Membership"),
+                              dispatch_uid="membership_post_save_invalidate_permissions_cache")
+    signals.post_delete.connect(handlers.membership_invalidate_permissions_cache,
+                                sender=apps.get_model("projects", "Membership"),
+                                dispatch_uid="membership_post_delete_invalidate_permissions_cache")
+    signals.post_save.connect(handlers.role_invalidate_permissions_cache,
+                              sender=apps.get_model("users", "Role"),
+                              dispatch_uid="role_post_save_invalidate_permissions_cache")
+    signals.pre_delete.connect(handlers.role_invalidate_permissions_cache,
+                               sender=apps.get_model("users", "Role"),
+                               dispatch_uid="role_pre_delete_invalidate_permissions_cache")
+    signals.pre_delete.connect(handlers.project_invalidate_permissions_cache,
+                               sender=apps.get_model("projects", "Project"),
+                               dispatch_uid="project_pre_delete_invalidate_permissions_cache")
+
+
+def disconnect_permissions_cache_signals():
+    signals.post_save.disconnect(sender=apps.get_model("projects", "Membership"),
+                                 dispatch_uid="membership_post_save_invalidate_permissions_cache")
+    signals.post_delete.disconnect(sender=apps.get_model("projects", "Membership"),
+                                   dispatch_uid="membership_post_delete_invalidate_permissions_cache")
+    signals.post_save.disconnect(sender=apps.get_model("users", "Role"),
+                                 dispatch_uid="role_post_save_invalidate_permissions_cache")
+    signals.pre_delete.disconnect(sender=apps.get_model("users", "Role"),
+                                  dispatch_uid="role_pre_delete_invalidate_permissions_cache")
+    signals.pre_delete.disconnect(sender=apps.get_model("projects", "Project"),
+                                  dispatch_uid="project_pre_delete_invalidate_permissions_cache")
+
+
+## Filters data cache Signals
+
+# Models of a project whose changes can change its filters data
+FILTERS_DATA_MODELS = (
+    "epics.Epic",
+    "userstories.UserStory",
+    "tasks.Task",
+    "issues.Issue",
+    "projects.Membership",
+    "projects.EpicStatus",
+    "projects.UserStoryStatus",
+    "projects.TaskStatus",
+    "projects.IssueStatus",
+    "projects.IssueType",
+    "projects.Priority",
+    "projects.Severity",
+    "projects.Swimlane",
+    "milestones.Milestone",
+    "users.Role",
+)
+
+
+def connect_filters_data_cache_signals():
+    from . import signals as handlers
+    for model_label in FILTERS_DATA_MODELS:
+        model = apps.get_model(model_label)
+        signals.post_save.connect(handlers.bump_filters_data_version_of_related_project,
+                                  sender=model,
+                                  dispatch_uid="{}_post_save_filters_data_cache".format(model_label))
+        signals.post_delete.connect(handlers.bump_filters_data_version_of_related_project,
+                                    sender=model,
+                                    dispatch_uid="{}_post_delete_filters_data_cache".format(model_label))
+
+    related_userstory_model = apps.get_model("epics", "RelatedUserStory")
+    signals.post_save.connect(handlers.bump_filters_data_version_of_related_userstory,
+                              sender=related_userstory_model,
+                              dispatch_uid="related_userstory_post_save_filters_data_cache")
+    signals.post_delete.connect(handlers.bump_filters_data_version_of_related_userstory,
+                                sender=related_userstory_model,
+                                dispatch_uid="related_userstory_post_delete_filters_data_cache")
+    signals.m2m_changed.connect(handlers.bump_filters_data_version_of_userstory_assigned_users,
+                                sender=apps.get_model("userstories", "UserStory").assigned_users.through,
+                                dispatch_uid="userstory_assigned_users_filters_data_cache")
+    signals.post_save.connect(handlers.bump_filters_data_version_of_project,
+                              sender=apps.get_model("projects", "Project"),
+                              dispatch_uid="project_post_save_filters_data_cache")
+
+
+def disconnect_filters_data_cache_signals():
+    for model_label in FILTERS_DATA_MODELS:
+        model = apps.get_model(model_label)
+        signals.post_save.disconnect(sender=model,
+                                     dispatch_uid="{}_post_save_filters_data_cache".format(model_label))
+        signals.post_delete.disconnect(sender=model,
+                                       dispatch_uid="{}_post_delete_filters_data_cache".format(model_label))
+
+    related_userstory_model = apps.get_model("epics", "RelatedUserStory")
+    signals.post_save.disconnect(sender=related_userstory_model,
+                                 dispatch_uid="related_userstory_post_save_filters_data_cache")
+    signals.post_delete.disconnect(sender=related_userstory_model,
+                                   dispatch_uid="related_userstory_post_delete_filters_data_cache")
+    signals.m2m_changed.disconnect(sender=apps.get_model("userstories", "UserStory").assigned_users.through,
+                                   dispatch_uid="userstory_assigned_users_filters_data_cache")
+    signals.post_save.disconnect(sender=apps.get_model("projects", "Project"),
+                                 dispatch_uid="project_post_save_filters_data_cache")
+
+
 ## US Statuses Signals
 
 def connect_us_status_signals():
@@ -67,6 +169,41 @@ def connect_us_status_signals():
                               dispatch_uid="create_swimlane_user_story_statuses_on_userstory_status_post_save")
 
 
+def connect_csv_snapshots_signals():
+    from . import signals as handlers
+    from .services.csv_snapshots import CSV_WATERMARK_MODELS
+    for model_label in CSV_WATERMARK_MODELS:
+        model = apps.get_model(model_label)
+        signals.post_save.connect(handlers.bump_csv_watermarks_of_related_project,
+                                  sender=model,
+                                  dispatch_uid="{}_post_save_csv_snapshots".format(model_label))
+        signals.post_delete.connect(handlers.bump_csv_watermarks_of_related_project,
+                                    sender=model,
+                                    dispatch_uid="{}_post_delete_csv_snapshots".format(model_label))
+
+    signals.m2m_changed.connect(handlers.bump_csv_watermarks_of_userstory_assigned_users,
+                                sender=apps.get_model("userstories", "UserStory").assigned_users.through,
+                                dispatch_uid="userstory_assigned_users_csv_snapshots")
+    signals.post_delete.connect(handlers.delete_csv_snapshot_file,
+                                sender=apps.get_model("projects", "ProjectCsvSnapshot"),
+                                dispatch_uid="project_csv_snapshot_post_delete")
+
+
+def disconnect_csv_snapshots_signals():
+    from .services.csv_snapshots import CSV_WATERMARK_MODELS
+    for model_label in CSV_WATERMARK_MODELS:
+        model = apps.get_model(model_label)
+        signals.post_save.disconnect(sender=model,
+                                     dispatch_uid="{}_post_save_csv_snapshots".format(model_label))
+        signals.post_delete.disconnect(sender=model,
+                                       dispatch_uid="{}_post_delete_csv_snapshots".format(model_label))
+
+    signals.m2m_changed.disconnect(sender=apps.get_model("userstories", "UserStory").assigned_users.through,
+                                   dispatch_uid="userstory_assigned_users_csv_snapshots")
+    signals.post_delete.disconnect(sender=apps.get_model("projects", "ProjectCsvSnapshot"),
+                                   dispatch_uid="project_csv_snapshot_post_delete")
+
+
 def disconnect_us_status_signals():
     signals.post_save.disconnect(sender=apps.get_model("projects", "UserStoryStatus"),
                                  dispatch_uid="try_to_close_or_open_user_stories_when_edit_us_status")
@@ -120,6 +257,9 @@ class ProjectsAppConfig(AppConfig):
     def ready(self):
         connect_projects_signals()
         connect_memberships_signals()
+        connect_permissions_cache_signals()
+        connect_filters_data_cache_signals()
+        connect_csv_snapshots_signals()
         connect_us_status_signals()
         connect_swimlane_signals()
         connect_task_status_signals()
@@ -5,7 +5,6 @@
 #
 # Copyright (c) 2021-present Kaleidos INC
 
-from django.http import HttpResponse
 from django.utils.translation import gettext as _
 
 from taiga.base.api.utils import get_object_or_error
@@ -22,6 +21,8 @@ from taiga.projects.mixins.by_ref import ByRefMixin
 from taiga.projects.models import Project, EpicStatus
 from taiga.projects.notifications.mixins import WatchedResourceMixin, WatchersViewSetMixin
 from taiga.projects.occ import OCCResourceMixin
+from taiga.projects.services import csv_snapshots
+from taiga.projects.services import facets
 from taiga.projects.tagging.api import TaggedResourceMixin
 from taiga.projects.votes.mixins.viewsets import VotedResourceMixin, VotersViewSetMixin
 
@@ -149,19 +150,22 @@ class EpicViewSet(OCCResourceMixin, VotedResourceMixin, HistoryResourceMixin, Wa
         project_id = request.QUERY_PARAMS.get("project", None)
         project = get_object_or_error(Project, request.user, id=project_id)
 
-        filter_backends = self.get_filter_backends()
-        statuses_filter_backends = (f for f in filter_backends if f != filters.StatusesFilter)
-        assigned_to_filter_backends = (f for f in filter_backends if f != filters.AssignedToFilter)
-        owners_filter_backends = (f for f in filter_backends if f != filters.OwnersFilter)
+        def get_filters_data():
+            filter_backends = self.get_filter_backends()
+            statuses_filter_backends = (f for f in filter_backends if f != filters.StatusesFilter)
+            assigned_to_filter_backends = (f for f in filter_backends if f != filters.AssignedToFilter)
+            owners_filter_backends = (f for f in filter_backends if f != filters.OwnersFilter)
 
-        queryset = self.get_queryset()
-        querysets = {
-            "statuses": self.filter_queryset(queryset, filter_backends=statuses_filter_backends),
-            "assigned_to": self.filter_queryset(queryset, filter_backends=assigned_to_filter_backends),
-            "owners": self.filter_queryset(queryset, filter_backends=owners_filter_backends),
-            "tags": self.filter_queryset(queryset)
-        }
-        return response.Ok(services.get_epics_filters_data(project, querysets))
+            queryset = self.get_queryset()
+            querysets = {
+                "statuses": self.filter_queryset(queryset, filter_backends=statuses_filter_backends),
+                "assigned_to": self.filter_queryset(queryset, filter_backends=assigned_to_filter_backends),
+                "owners": self.filter_queryset(queryset, filter_backends=owners_filter_backends),
+                "tags": self.filter_queryset(queryset)
+            }
+            return services.get_epics_filters_data(project, querysets)
+
+        return response.Ok(facets.get_cached_filters_data("epics", project, request, get_filters_data))
 
     @list_route(methods=["GET"])
     def csv(self, request):
@@ -171,10 +175,8 @@ class EpicViewSet(OCCResourceMixin, VotedResourceMixin, HistoryResourceMixin, Wa
 
         project = get_object_or_error(Project, request.user, epics_csv_uuid=uuid)
         queryset = project.epics.all().order_by('ref')
-        data = services.epics_to_csv(project, queryset)
-        csv_response = HttpResponse(data.getvalue(), content_type='application/csv; charset=utf-8')
-        csv_response['Content-Disposition'] = 'attachment; filename="epics.csv"'
-        return csv_response
+        return csv_snapshots.get_csv_response(request, project, "epics", "epics.csv",
+                                              lambda: services.iter_epics_csv(project, queryset))
 
     @list_route(methods=["POST"])
     def bulk_create(self, request, **kwargs):
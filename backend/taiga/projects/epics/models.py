@@ -6,6 +6,7 @@
 # Copyright (c) 2021-present Kaleidos INC
 
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.contenttypes.fields import GenericRelation
 from django.contrib.postgres.fields import ArrayField
 from django.conf import settings
@@ -18,9 +19,10 @@ from taiga.projects.tagging.models import TaggedMixin
 from taiga.projects.occ import OCCModelMixin
 from taiga.projects.notifications.mixins import WatchedModelMixin
 from taiga.projects.mixins.blocked import BlockedMixin
+from taiga.searches.models import SearchableMixin
 
 
-class Epic(OCCModelMixin, WatchedModelMixin, BlockedMixin, TaggedMixin, models.Model):
+class Epic(OCCModelMixin, WatchedModelMixin, BlockedMixin, TaggedMixin, SearchableMixin, models.Model):
     ref = models.BigIntegerField(db_index=True, null=True, blank=True, default=None,
                                  verbose_name=_("ref"))
     project = models.ForeignKey(
@@ -85,6 +87,9 @@ class Epic(OCCModelMixin, WatchedModelMixin, BlockedMixin, TaggedMixin, models.M
         verbose_name = "epic"
         verbose_name_plural = "epics"
         ordering = ["project", "epics_order", "ref"]
+        indexes = [
+            GinIndex(fields=["search_vector"], name="epics_search_vector_idx"),
+        ]
 
     def __str__(self):
         return "#{0} {1}".format(self.ref, self.subject)
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+from django.apps import AppConfig
+from django.apps import apps
+from django.db.models import signals
+
+
+class HistoryAppConfig(AppConfig):
+    name = "taiga.projects.history"
+    verbose_name = "History"
+
+    def ready(self):
+        from . import signals as handlers
+
+        signals.post_save.connect(handlers.invalidate_snapshot_state,
+                                  sender=apps.get_model("history", "HistoryEntry"),
+                                  dispatch_uid="history_snapshot_state")
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+# Examples:
+# python manage.py backfill_history_snapshot_states
+# python manage.py backfill_history_snapshot_states --project 1 --purge
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from taiga.projects.history import services
+from taiga.projects.history.models import HistoryEntry
+from taiga.projects.history.models import HistorySnapshotState
+
+
+class Command(BaseCommand):
+    help = 'Build the materialized snapshot state of history keys from their history entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project',
+                            action='store',
+                            dest='project',
+                            default=None,
+                            help='Selected project id for snapshot states generation')
+        parser.add_argument('--purge',
+                            action='store_true',
+                            dest='purge',
+                            default=False,
+                            help='Purge existing snapshot states')
+
+    @override_settings(DEBUG=False)
+    def handle(self, *args, **options):
+        states = HistorySnapshotState.objects.all()
+        entries = HistoryEntry.objects.filter(is_snapshot=True).exclude(key__isnull=True)
+
+        if options["project"] is not None:
+            states = states.filter(project_id=options["project"])
+            entries = entries.filter(project_id=options["project"])
+
+        if options["purge"]:
+            states.delete()
+
+        keys = entries.order_by("key").values_list("key", flat=True).distinct()
+        total = keys.count()
+        built = 0
+
+        for count, key in enumerate(keys.iterator()):
+            if services.rebuild_snapshot_state_for_key(key):
+                built += 1
+
+            if (count + 1) % 1000 == 0:
+                self.stdout.write("{}/{} keys processed".format(count + 1, total))
+
+        self.stdout.write("{} snapshot states built".format(built))
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+# Examples:
+# python manage.py check_history_snapshot_states
+# python manage.py check_history_snapshot_states --project 1 --fix
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from taiga.projects.history import services
+from taiga.projects.history.models import HistorySnapshotState
+
+
+class Command(BaseCommand):
+    help = 'Compare the materialized snapshot states against the replay of the history entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project',
+                            action='store',
+                            dest='project',
+                            default=None,
+                            help='Selected project id for snapshot states checking')
+        parser.add_argument('--fix',
+                            action='store_true',
+                            dest='fix',
+                            default=False,
+                            help='Rebuild the inconsistent snapshot states')
+
+    @override_settings(DEBUG=False)
+    def handle(self, *args, **options):
+        states = HistorySnapshotState.objects.all()
+        if options["project"] is not None:
+            states = states.filter(project_id=options["project"])
+
+        keys = states.order_by("key").values_list("key", flat=True)
+        inconsistent = []
+
+        for key in keys.iterator():
+            if not services.check_snapshot_state_for_key(key):
+                inconsistent.append(key)
+                self.stdout.write("Inconsistent snapshot state: {}".format(key))
+
+                if options["fix"]:
+                    services.rebuild_snapshot_state_for_key(key)
+
+        if inconsistent and not options["fix"]:
+            raise CommandError("{} inconsistent snapshot states found".format(len(inconsistent)))
+
+        self.stdout.write("{} snapshot states checked, {} inconsistent".format(keys.count(), len(inconsistent)))
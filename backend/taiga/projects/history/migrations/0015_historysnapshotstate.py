@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+# Generated by Django 3.2.25 on 2026-10-17 17:58
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+import taiga.base.db.models.fields.json
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0067_auto_20201230_1237'),
+        ('history', '0014_json_to_jsonb'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistorySnapshotState',
+            fields=[
+                ('key', models.CharField(editable=False, max_length=255, primary_key=True, serialize=False)),
+                ('snapshot', taiga.base.db.models.fields.json.JSONField(blank=True, default=None, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('partial_diffs', models.PositiveIntegerField(default=0)),
+                ('last_entry_id', models.CharField(blank=True, default=None, max_length=255, null=True)),
+                ('modified_date', models.DateTimeField(auto_now=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='projects.project')),
+            ],
+        ),
+    ]
@@ -81,6 +81,7 @@ class HistoryEntry(models.Model):
     is_snapshot = models.BooleanField(default=False)
 
     _importing = None
+    _snapshot_state_synced = False
     _owner = None
     _prefetched_owner = False
 
@@ -324,3 +325,25 @@ class HistoryEntry(models.Model):
 
     class Meta:
         ordering = ["created_at"]
+
+
+class HistorySnapshotState(models.Model):
+    """
+    Materialized current frozen state of a history key.
+
+    It stores the result of replaying the last complete
+    snapshot and all its partial diffs, so take_snapshot
+    only needs one keyed read instead of the full replay.
+    """
+    key = models.CharField(primary_key=True, max_length=255, editable=False)
+    project = models.ForeignKey("projects.Project", on_delete=models.CASCADE,
+                                related_name="+")
+
+    # Stores the frozen object as rebuilt from the history entries
+    snapshot = JSONField(null=True, blank=True, default=None)
+
+    # Number of partial entries since the last complete snapshot
+    partial_diffs = models.PositiveIntegerField(default=0)
+
+    last_entry_id = models.CharField(max_length=255, null=True, blank=True, default=None)
+    modified_date = models.DateTimeField(auto_now=True)
@@ -20,14 +20,19 @@ This is possible example:
 """
 import logging
 from collections import namedtuple
+from contextlib import contextmanager
 from copy import deepcopy
 from functools import partial
 from functools import wraps
+from zlib import crc32
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.apps import apps
+from django.db import connection
 from django.db import transaction as tx
+from django.db.models import signals
+from django.utils import timezone
 from django_pglocks import advisory_lock
 
 from taiga.mdrender.service import render as mdrender
@@ -79,6 +84,26 @@ _deprecated_fields = {
     "userstories.userstory": frozenset(["assigned_to"]),
 }
 
+# Related objects used by the freeze implementations (select_related and
+# prefetch_related lookups) to freeze many instances at once.
+_freeze_related_map = {
+    "epics.epic": (
+        ("project", "status", "custom_attributes_values"),
+        ("attachments", "project__epiccustomattributes")),
+    "userstories.userstory": (
+        ("project", "status", "swimlane", "custom_attributes_values"),
+        ("role_points", "assigned_users", "attachments", "project__userstorycustomattributes")),
+    "tasks.task": (
+        ("project", "status", "custom_attributes_values"),
+        ("attachments", "generated_user_stories", "project__taskcustomattributes")),
+    "issues.issue": (
+        ("project", "status", "custom_attributes_values"),
+        ("attachments", "generated_user_stories", "project__issuecustomattributes")),
+    "wiki.wikipage": (
+        ("project",),
+        ("attachments",)),
+}
+
 log = logging.getLogger("taiga.history")
 
 
@@ -120,6 +145,31 @@ def get_instance_from_key(key: str) -> object:
         return None
 
 
+@contextmanager
+def _advisory_locks(lock_names: list):
+    """
+    Acquire many advisory locks with one query, using the same lock ids
+    as django_pglocks.advisory_lock and a stable order to avoid deadlocks.
+    """
+    lock_ids = set()
+    for name in lock_names:
+        pos = crc32(name.encode("utf-8"))
+        lock_id = (2**31 - 1) & pos
+        if pos & 2**31:
+            lock_id -= 2**31
+        lock_ids.add(lock_id)
+
+    lock_ids = sorted(lock_ids)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(lock_id) FROM unnest(%s::bigint[]) AS lock_id", [lock_ids])
+
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(lock_id) FROM unnest(%s::bigint[]) AS lock_id", [lock_ids])
+
+
 def register_values_implementation(typename: str, fn=None):
     """
     Register values implementation for specified typename.
@@ -191,6 +241,41 @@ def freeze_model_instance(obj: object) -> FrozenObj:
     return FrozenObj(key, snapshot)
 
 
+def freeze_model_instances_in_bulk(objs: list) -> dict:
+    """
+    Creates new frozen objects from many model instances, reloading
+    them with the prefetches their freeze implementations need.
+
+    Return a dict with the FrozenObj of every instance that still
+    exists on the database indexed by its key.
+    """
+    pks_by_model = {}
+    for obj in objs:
+        pks_by_model.setdefault(obj.__class__, set()).add(obj.pk)
+
+    result = {}
+    for model_cls, pks in pks_by_model.items():
+        typename = get_typename_for_model_class(model_cls)
+        if typename not in _freeze_impl_map:
+            raise RuntimeError("No implementation found for {}".format(typename))
+
+        impl_fn = _freeze_impl_map[typename]
+        select_related, prefetch_related = _freeze_related_map.get(typename, ((), ()))
+        qs = (model_cls.objects.filter(pk__in=pks)
+                               .select_related(*select_related)
+                               .prefetch_related(*prefetch_related))
+
+        for obj in qs:
+            snapshot = impl_fn(obj)
+            assert isinstance(snapshot, dict), \
+                "freeze handlers should return always a dict"
+
+            key = make_key_from_model_object(obj)
+            result[key] = FrozenObj(key, snapshot)
+
+    return result
+
+
 def is_hidden_snapshot(obj: FrozenDiff) -> bool:
     """
     Check if frozen object is considered
@@ -315,7 +400,22 @@ def _rebuild_snapshot_from_diffs(keysnapshot, partials):
     return result
 
 
-def get_last_snapshot_for_key(key: str) -> FrozenObj:
+def _get_max_partial_diffs() -> int:
+    return getattr(settings, "MAX_PARTIAL_DIFFS", 60)
+
+
+def _is_snapshot_state_enabled() -> bool:
+    return getattr(settings, "HISTORY_SNAPSHOT_STATE_ENABLED", True)
+
+
+def _replay_snapshot_for_key(key: str) -> tuple:
+    """
+    Rebuild the current frozen object of a key from its last
+    complete snapshot and all the partial diffs after it.
+
+    Returns a tuple with the frozen object (or None) and the
+    number of partial diffs replayed.
+    """
     entry_model = apps.get_model("history", "HistoryEntry")
 
     # Search last snapshot
@@ -325,7 +425,7 @@ def get_last_snapshot_for_key(key: str) -> FrozenObj:
 
     keysnapshot = qs.first()
     if keysnapshot is None:
-        return None, True
+        return None, 0
 
     # Get all partial snapshots
     entries = tuple(entry_model.objects
@@ -334,12 +434,156 @@ def get_last_snapshot_for_key(key: str) -> FrozenObj:
                     .order_by("created_at"))
 
     snapshot = _rebuild_snapshot_from_diffs(keysnapshot.snapshot, entries)
-    max_partial_diffs = getattr(settings, "MAX_PARTIAL_DIFFS", 60)
+    return FrozenObj(keysnapshot.key, snapshot), len(entries)
+
+
+def get_last_snapshot_for_key(key: str) -> FrozenObj:
+    fobj, partial_diffs = _replay_snapshot_for_key(key)
+    if fobj is None:
+        return None, True
+
+    return fobj, partial_diffs >= _get_max_partial_diffs()
+
+
+def _get_snapshot_state_for_key(key: str) -> tuple:
+    """
+    Get the current frozen object of a key and its number of partial
+    diffs, reading the materialized state if it exists and falling back
+    to the replay of the history entries otherwise.
+    """
+    if _is_snapshot_state_enabled():
+        state_model = apps.get_model("history", "HistorySnapshotState")
+        state = state_model.objects.filter(key=key).first()
+        if state is not None:
+            return FrozenObj(key, state.snapshot), state.partial_diffs
+
+    return _replay_snapshot_for_key(key)
+
+
+def _store_snapshot_state(key: str, project_id: int, snapshot: dict,
+                          partial_diffs: int, last_entry_id: str=None):
+    state_model = apps.get_model("history", "HistorySnapshotState")
+    values = {
+        "project_id": project_id,
+        "snapshot": snapshot,
+        "partial_diffs": partial_diffs,
+        "last_entry_id": last_entry_id,
+        "modified_date": timezone.now(),
+    }
+
+    updated = state_model.objects.filter(key=key).update(**values)
+    if not updated:
+        state_model.objects.update_or_create(key=key, defaults=values)
+
+
+def _next_snapshot_state(entry, last_fobj: FrozenObj, partial_diffs: int) -> tuple:
+    """
+    Apply a new history entry over the previous state of its key,
+    the same way the replay does.
+    """
+    if entry.is_snapshot:
+        return entry.snapshot, 0
+
+    return _rebuild_snapshot_from_diffs(last_fobj.snapshot, [entry]), partial_diffs + 1
+
+
+def _update_snapshot_state(entry, last_fobj: FrozenObj, partial_diffs: int):
+    snapshot, partial_diffs = _next_snapshot_state(entry, last_fobj, partial_diffs)
+    _store_snapshot_state(entry.key, entry.project_id, snapshot, partial_diffs,
+                          last_entry_id=entry.id)
+
+
+def _get_snapshot_states_for_keys(keys) -> dict:
+    """
+    Bulk version of _get_snapshot_state_for_key. The values are tuples
+    of frozen object, number of partial diffs and a flag that tells if
+    the key has materialized state.
+    """
+    result = {}
+    if _is_snapshot_state_enabled():
+        state_model = apps.get_model("history", "HistorySnapshotState")
+        for state in state_model.objects.filter(key__in=keys):
+            result[state.key] = (FrozenObj(state.key, state.snapshot), state.partial_diffs, True)
+
+    for key in keys:
+        if key not in result:
+            fobj, partial_diffs = _replay_snapshot_for_key(key)
+            result[key] = (fobj, partial_diffs, False)
+
+    return result
+
+
+def _update_snapshot_states_in_bulk(entries: list, last_states: dict):
+    state_model = apps.get_model("history", "HistorySnapshotState")
+    now = timezone.now()
+
+    to_update, to_create = [], []
+    for entry in entries:
+        last_fobj, partial_diffs, has_state = last_states[entry.key]
+        snapshot, partial_diffs = _next_snapshot_state(entry, last_fobj, partial_diffs)
+        state = state_model(key=entry.key, project_id=entry.project_id, snapshot=snapshot,
+                            partial_diffs=partial_diffs, last_entry_id=entry.id, modified_date=now)
+        (to_update if has_state else to_create).append(state)
+
+    if to_update:
+        state_model.objects.bulk_update(to_update, ["project", "snapshot", "partial_diffs",
+                                                    "last_entry_id", "modified_date"])
+    if to_create:
+        state_model.objects.bulk_create(to_create)
+
+
+def invalidate_snapshot_state_for_key(key: str):
+    state_model = apps.get_model("history", "HistorySnapshotState")
+    state_model.objects.filter(key=key).delete()
 
-    if len(entries) >= max_partial_diffs:
-        return FrozenObj(keysnapshot.key, snapshot), True
 
-    return FrozenObj(keysnapshot.key, snapshot), False
+def invalidate_snapshot_state_for_keys(keys):
+    """
+    Bulk version of invalidate_snapshot_state_for_key, for the entries
+    created without their signals (bulk_create).
+    """
+    state_model = apps.get_model("history", "HistorySnapshotState")
+    state_model.objects.filter(key__in=keys).delete()
+
+
+def rebuild_snapshot_state_for_key(key: str) -> bool:
+    """
+    Recompute the materialized state of a key from the replay of its
+    history entries. Return False if the key has no complete snapshot.
+    """
+    entry_model = apps.get_model("history", "HistoryEntry")
+
+    with advisory_lock("history-"+key):
+        fobj, partial_diffs = _replay_snapshot_for_key(key)
+        if fobj is None:
+            invalidate_snapshot_state_for_key(key)
+            return False
+
+        last_entry = (entry_model.objects.filter(key=key)
+                                         .only("id", "project_id")
+                                         .order_by("-created_at")
+                                         .first())
+        _store_snapshot_state(key, last_entry.project_id, fobj.snapshot, partial_diffs,
+                              last_entry_id=last_entry.id)
+        return True
+
+
+def check_snapshot_state_for_key(key: str) -> bool:
+    """
+    Compare the materialized state of a key against the replay of
+    its history entries. Keys without materialized state are
+    considered consistent because they are rebuilt lazily.
+    """
+    state_model = apps.get_model("history", "HistorySnapshotState")
+    state = state_model.objects.filter(key=key).first()
+    if state is None:
+        return True
+
+    fobj, partial_diffs = _replay_snapshot_for_key(key)
+    if fobj is None:
+        return False
+
+    return state.snapshot == fobj.snapshot and state.partial_diffs == partial_diffs
 
 
 # Public api
@@ -364,6 +608,74 @@ def get_modified_fields(obj: object, last_modifications):
     return modified_fields
 
 
+def _make_history_entry(obj: object, typename: str, new_fobj: FrozenObj, last_fobj: FrozenObj,
+                        need_real_snapshot: bool, *, comment: str="", comment_html: str=None,
+                        user=None, delete: bool=False):
+    """
+    Build (without saving) the history entry of the change between the last
+    frozen object of a key and the new one. Return None if there is nothing
+    to store.
+    """
+    # migrate diff to latest schema
+    old_fobj = last_fobj
+    if old_fobj:
+        old_fobj = migrate_to_last_version(typename, old_fobj)
+
+    entry_model = apps.get_model("history", "HistoryEntry")
+    user_id = None if user is None else user.id
+    user_name = "" if user is None else user.get_full_name()
+
+    # Determine history type
+    if delete:
+        entry_type = HistoryType.delete
+        need_real_snapshot = True
+    elif new_fobj and not old_fobj:
+        entry_type = HistoryType.create
+    elif new_fobj and old_fobj:
+        entry_type = HistoryType.change
+    else:
+        raise RuntimeError("Unexpected condition")
+
+    excluded_fields = get_excluded_fields(typename)
+
+    fdiff = make_diff(old_fobj, new_fobj, excluded_fields)
+
+    # If diff and comment are empty, do
+    # not create empty history entry
+    if (not fdiff.diff and
+            not comment and old_fobj is not None and
+            entry_type != HistoryType.delete):
+        return None
+
+    fvals = make_diff_values(typename, fdiff)
+
+    if len(comment) > 0:
+        is_hidden = False
+    else:
+        is_hidden = is_hidden_snapshot(fdiff)
+
+    if comment_html is None:
+        comment_html = mdrender(obj.project, comment)
+
+    kwargs = {
+        "user": {"pk": user_id, "name": user_name},
+        "project_id": getattr(obj, 'project_id', getattr(obj, 'id', None)),
+        "key": fdiff.key,
+        "type": entry_type,
+        "snapshot": fdiff.snapshot if need_real_snapshot else None,
+        "diff": fdiff.diff,
+        "values": fvals,
+        "comment": comment,
+        "comment_html": comment_html,
+        "is_hidden": is_hidden,
+        "is_snapshot": need_real_snapshot,
+    }
+
+    entry = entry_model(**kwargs)
+    entry._snapshot_state_synced = True
+    return entry
+
+
 @tx.atomic
 def take_snapshot(obj: object, *, comment: str="", user=None,
                   delete: bool=False):
@@ -380,60 +692,80 @@ def take_snapshot(obj: object, *, comment: str="", user=None,
         typename = get_typename_for_model_class(obj.__class__)
 
         new_fobj = freeze_model_instance(obj)
-        old_fobj, need_real_snapshot = get_last_snapshot_for_key(key)
+        last_fobj, partial_diffs = _get_snapshot_state_for_key(key)
+        need_real_snapshot = last_fobj is None or partial_diffs >= _get_max_partial_diffs()
 
-        # migrate diff to latest schema
-        if old_fobj:
-            old_fobj = migrate_to_last_version(typename, old_fobj)
+        entry = _make_history_entry(obj, typename, new_fobj, last_fobj, need_real_snapshot,
+                                    comment=comment, user=user, delete=delete)
+        if entry is None:
+            return None
+
+        entry.save(force_insert=True)
+
+        if _is_snapshot_state_enabled():
+            _update_snapshot_state(entry, last_fobj, partial_diffs)
+
+        return entry
+
+
+@tx.atomic
+def take_snapshots_in_bulk(objs: list, *, user=None):
+    """
+    Same as take_snapshot but for many model instances at once.
+
+    The instances are frozen with shared prefetches, their last
+    states are read in one query and all the new history entries
+    are written with a single bulk_create. Deleted instances are
+    ignored.
+    """
+    objs = [obj for obj in objs if obj is not None]
+    if not objs:
+        return []
+
+    keys = sorted({make_key_from_model_object(obj) for obj in objs})
+    with _advisory_locks(["history-"+key for key in keys]):
+        new_fobjs = freeze_model_instances_in_bulk(objs)
+        last_states = _get_snapshot_states_for_keys(list(new_fobjs.keys()))
+        max_partial_diffs = _get_max_partial_diffs()
+
+        entries = []
+        comment_html_by_project = {}
+        for obj in objs:
+            key = make_key_from_model_object(obj)
+            new_fobj = new_fobjs.pop(key, None)
+            if new_fobj is None:
+                # Deleted or duplicated instance
+                continue
+
+            typename = get_typename_for_model_class(obj.__class__)
+            last_fobj, partial_diffs, _ = last_states[key]
+            need_real_snapshot = last_fobj is None or partial_diffs >= max_partial_diffs
+
+            project_id = getattr(obj, 'project_id', getattr(obj, 'id', None))
+            if project_id not in comment_html_by_project:
+                comment_html_by_project[project_id] = mdrender(obj.project, "")
+
+            entry = _make_history_entry(obj, typename, new_fobj, last_fobj, need_real_snapshot,
+                                        comment_html=comment_html_by_project[project_id], user=user)
+            if entry is not None:
+                entries.append(entry)
+
+        if not entries:
+            return []
 
         entry_model = apps.get_model("history", "HistoryEntry")
-        user_id = None if user is None else user.id
-        user_name = "" if user is None else user.get_full_name()
-
-        # Determine history type
-        if delete:
-            entry_type = HistoryType.delete
-            need_real_snapshot = True
-        elif new_fobj and not old_fobj:
-            entry_type = HistoryType.create
-        elif new_fobj and old_fobj:
-            entry_type = HistoryType.change
-        else:
-            raise RuntimeError("Unexpected condition")
-
-        excluded_fields = get_excluded_fields(typename)
-
-        fdiff = make_diff(old_fobj, new_fobj, excluded_fields)
-
-        # If diff and comment are empty, do
-        # not create empty history entry
-        if (not fdiff.diff and
-                not comment and old_fobj is not None and
-                entry_type != HistoryType.delete):
-            return None
+        entry_model.objects.bulk_create(entries)
+
+        if _is_snapshot_state_enabled():
+            _update_snapshot_states_in_bulk(entries, last_states)
+
+        # bulk_create doesn't send signals but timeline and webhooks
+        # depend on them to process the new entries.
+        for entry in entries:
+            signals.post_save.send(sender=entry_model, instance=entry, created=True,
+                                   update_fields=None, raw=False, using=entry._state.db)
 
-        fvals = make_diff_values(typename, fdiff)
-
-        if len(comment) > 0:
-            is_hidden = False
-        else:
-            is_hidden = is_hidden_snapshot(fdiff)
-
-        kwargs = {
-            "user": {"pk": user_id, "name": user_name},
-            "project_id": getattr(obj, 'project_id', getattr(obj, 'id', None)),
-            "key": key,
-            "type": entry_type,
-            "snapshot": fdiff.snapshot if need_real_snapshot else None,
-            "diff": fdiff.diff,
-            "values": fvals,
-            "comment": comment,
-            "comment_html": mdrender(obj.project, comment),
-            "is_hidden": is_hidden,
-            "is_snapshot": need_real_snapshot,
-        }
-
-        return entry_model.objects.create(**kwargs)
+        return entries
 
 
 # High level query api
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+from . import services
+
+
+def invalidate_snapshot_state(sender, instance, created, **kwargs):
+    # Entries created outside take_snapshot (importers, promotions...) can
+    # be out of order, so the materialized state is dropped and it will
+    # be rebuilt from the history entries on the next snapshot.
+    if not created or instance._snapshot_state_synced or not instance.key:
+        return
+
+    services.invalidate_snapshot_state_for_key(instance.key)
@@ -7,7 +7,6 @@
 
 #
 from django.utils.translation import gettext as _
-from django.http import HttpResponse
 
 from taiga.base import filters
 from taiga.base import exceptions as exc
@@ -26,6 +25,8 @@ from taiga.projects.notifications.mixins import AssignedToSignalMixin
 from taiga.projects.notifications.mixins import WatchedResourceMixin
 from taiga.projects.notifications.mixins import WatchersViewSetMixin
 from taiga.projects.occ import OCCResourceMixin
+from taiga.projects.services import csv_snapshots
+from taiga.projects.services import facets
 from taiga.projects.tagging.api import TaggedResourceMixin
 from taiga.projects.votes.mixins.viewsets import VotedResourceMixin, VotersViewSetMixin
 
@@ -184,28 +185,31 @@ class IssueViewSet(AssignedToSignalMixin, OCCResourceMixin, VotedResourceMixin,
         project_id = request.QUERY_PARAMS.get("project", None)
         project = get_object_or_error(Project, request.user, id=project_id)
 
-        filter_backends = self.get_filter_backends()
-        types_filter_backends = (f for f in filter_backends if f != filters.IssueTypesFilter)
-        statuses_filter_backends = (f for f in filter_backends if f != filters.StatusesFilter)
-        assigned_to_filter_backends = (f for f in filter_backends if f != filters.AssignedToFilter)
-        owners_filter_backends = (f for f in filter_backends if f != filters.OwnersFilter)
-        priorities_filter_backends = (f for f in filter_backends if f != filters.PrioritiesFilter)
-        severities_filter_backends = (f for f in filter_backends if f != filters.SeveritiesFilter)
-        roles_filter_backends = (f for f in filter_backends if f != filters.RoleFilter)
-        tags_filter_backends = (f for f in filter_backends if f != filters.TagsFilter)
-
-        queryset = self.get_queryset()
-        querysets = {
-            "types": self.filter_queryset(queryset, filter_backends=types_filter_backends),
-            "statuses": self.filter_queryset(queryset, filter_backends=statuses_filter_backends),
-            "assigned_to": self.filter_queryset(queryset, filter_backends=assigned_to_filter_backends),
-            "owners": self.filter_queryset(queryset, filter_backends=owners_filter_backends),
-            "priorities": self.filter_queryset(queryset, filter_backends=priorities_filter_backends),
-            "severities": self.filter_queryset(queryset, filter_backends=severities_filter_backends),
-            "tags": self.filter_queryset(queryset, filter_backends=tags_filter_backends),
-            "roles": self.filter_queryset(queryset, filter_backends=roles_filter_backends),
-        }
-        return response.Ok(services.get_issues_filters_data(project, querysets))
+        def get_filters_data():
+            filter_backends = self.get_filter_backends()
+            types_filter_backends = (f for f in filter_backends if f != filters.IssueTypesFilter)
+            statuses_filter_backends = (f for f in filter_backends if f != filters.StatusesFilter)
+            assigned_to_filter_backends = (f for f in filter_backends if f != filters.AssignedToFilter)
+            owners_filter_backends = (f for f in filter_backends if f != filters.OwnersFilter)
+            priorities_filter_backends = (f for f in filter_backends if f != filters.PrioritiesFilter)
+            severities_filter_backends = (f for f in filter_backends if f != filters.SeveritiesFilter)
+            roles_filter_backends = (f for f in filter_backends if f != filters.RoleFilter)
+            tags_filter_backends = (f for f in filter_backends if f != filters.TagsFilter)
+
+            queryset = self.get_queryset()
+            querysets = {
+                "types": self.filter_queryset(queryset, filter_backends=types_filter_backends),
+                "statuses": self.filter_queryset(queryset, filter_backends=statuses_filter_backends),
+                "assigned_to": self.filter_queryset(queryset, filter_backends=assigned_to_filter_backends),
+                "owners": self.filter_queryset(queryset, filter_backends=owners_filter_backends),
+                "priorities": self.filter_queryset(queryset, filter_backends=priorities_filter_backends),
+                "severities": self.filter_queryset(queryset, filter_backends=severities_filter_backends),
+                "tags": self.filter_queryset(queryset, filter_backends=tags_filter_backends),
+                "roles": self.filter_queryset(queryset, filter_backends=roles_filter_backends),
+            }
+            return services.get_issues_filters_data(project, querysets)
+
+        return response.Ok(facets.get_cached_filters_data("issues", project, request, get_filters_data))
 
     @list_route(methods=["GET"])
     def csv(self, request):
@@ -215,10 +219,8 @@ class IssueViewSet(AssignedToSignalMixin, OCCResourceMixin, VotedResourceMixin,
 
         project = get_object_or_error(Project, request.user, issues_csv_uuid=uuid)
         queryset = project.issues.all().order_by('ref')
-        data = services.issues_to_csv(project, queryset)
-        csv_response = HttpResponse(data.getvalue(), content_type='application/csv; charset=utf-8')
-        csv_response['Content-Disposition'] = 'attachment; filename="issues.csv"'
-        return csv_response
+        return csv_snapshots.get_csv_response(request, project, "issues", "issues.csv",
+                                              lambda: services.iter_issues_csv(project, queryset))
 
     @list_route(methods=["POST"])
     def bulk_create(self, request, **kwargs):
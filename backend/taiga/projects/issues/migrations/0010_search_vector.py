@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+# Generated by Django 3.2.25 on 2026-10-17 19:46
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+CREATE_TRIGGER = """
+    CREATE TRIGGER issues_issue_search_vector_update
+            BEFORE INSERT OR UPDATE OF subject, ref, tags, description
+                ON issues_issue
+          FOR EACH ROW
+           EXECUTE PROCEDURE items_search_vector_update();
+"""
+
+DROP_TRIGGER = """
+    DROP TRIGGER IF EXISTS issues_issue_search_vector_update ON issues_issue;
+"""
+
+# The vectors of the existing rows are computed (in batches, without locking
+# the tables) by `python manage.py update_search_vectors --only-missing`.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0069_search_vector_functions'),
+        ('issues', '0009_auto_20200615_0811'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issue',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True, serialize=False, verbose_name='search vector'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, reverse_sql=DROP_TRIGGER),
+        migrations.AddIndex(
+            model_name='issue',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='issues_search_vector_idx'),
+        ),
+    ]
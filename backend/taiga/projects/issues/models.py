@@ -6,6 +6,7 @@
 # Copyright (c) 2021-present Kaleidos INC
 
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.contenttypes.fields import GenericRelation
 from django.contrib.postgres.fields import ArrayField
 from django.conf import settings
@@ -18,9 +19,10 @@ from taiga.projects.occ import OCCModelMixin
 from taiga.projects.notifications.mixins import WatchedModelMixin
 from taiga.projects.mixins.blocked import BlockedMixin
 from taiga.projects.tagging.models import TaggedMixin
+from taiga.searches.models import SearchableMixin
 
 
-class Issue(OCCModelMixin, WatchedModelMixin, BlockedMixin, TaggedMixin, DueDateMixin, models.Model):
+class Issue(OCCModelMixin, WatchedModelMixin, BlockedMixin, TaggedMixin, DueDateMixin, SearchableMixin, models.Model):
     ref = models.BigIntegerField(db_index=True, null=True, blank=True, default=None,
                                  verbose_name=_("ref"))
     owner = models.ForeignKey(
@@ -109,6 +111,9 @@ class Issue(OCCModelMixin, WatchedModelMixin, BlockedMixin, TaggedMixin, DueDate
         verbose_name = "issue"
         verbose_name_plural = "issues"
         ordering = ["project", "-id"]
+        indexes = [
+            GinIndex(fields=["search_vector"], name="issues_search_vector_idx"),
+        ]
 
     def save(self, *args, **kwargs):
         if not self._importing or not self.modified_date:
@@ -10,9 +10,16 @@ from django.db.transaction import atomic
 from django.apps import apps
 from django.contrib.auth import get_user_model
 
+from taiga.projects.services.totals import bump_project_totals
+
 from .models import Like
 
 
+def _is_project_like(like):
+    # Only the likes of the project itself are counted as fans of the project
+    return like.content_type.model_class() == apps.get_model("projects", "Project")
+
+
 def add_like(obj, user):
     """Add a like to an object.
 
@@ -25,8 +32,8 @@ def add_like(obj, user):
     obj_type = apps.get_model("contenttypes", "ContentType").objects.get_for_model(obj)
     with atomic():
         like, created = Like.objects.get_or_create(content_type=obj_type, object_id=obj.id, user=user)
-        if like.project is not None:
-            like.project.refresh_totals()
+        if created and _is_project_like(like):
+            bump_project_totals(obj, fans=1, created_datetime=like.created_date)
 
     return like
 
@@ -47,11 +54,10 @@ def remove_like(obj, user):
             return
 
         like = qs.first()
-        project = like.project
         qs.delete()
 
-        if project is not None:
-            project.refresh_totals()
+        if _is_project_like(like):
+            bump_project_totals(obj, fans=-1, created_datetime=like.created_date)
 
 
 def get_fans(obj):
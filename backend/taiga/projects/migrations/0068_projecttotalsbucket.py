@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+# Generated by Django 3.2.25 on 2026-10-17 18:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0067_auto_20201230_1237'),
+        ('likes', '0002_auto_20151130_2230'),
+        ('timeline', '0009_timeline_fanout_on_read'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectTotalsBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='day')),
+                ('fans', models.IntegerField(default=0, verbose_name='fans')),
+                ('activity', models.IntegerField(default=0, verbose_name='activity')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='totals_buckets', to='projects.project')),
+            ],
+            options={
+                'verbose_name': 'project totals bucket',
+                'verbose_name_plural': 'project totals buckets',
+                'unique_together': {('project', 'day')},
+            },
+        ),
+        migrations.RunSQL(
+            """
+            INSERT INTO projects_projecttotalsbucket (project_id, day, fans, activity)
+                 SELECT events.project_id, events.day, sum(events.fans), sum(events.activity)
+                   FROM (SELECT likes_like.object_id AS project_id,
+                                (likes_like.created_date AT TIME ZONE 'UTC')::date AS day,
+                                1 AS fans, 0 AS activity
+                           FROM likes_like
+                     INNER JOIN django_content_type
+                             ON django_content_type.id = likes_like.content_type_id
+                            AND django_content_type.app_label = 'projects'
+                            AND django_content_type.model = 'project'
+                          WHERE likes_like.created_date >= now() - interval '1 year'
+                      UNION ALL
+                         SELECT timeline_timeline.project_id,
+                                (timeline_timeline.created AT TIME ZONE 'UTC')::date AS day,
+                                0 AS fans, 1 AS activity
+                           FROM timeline_timeline
+                          WHERE timeline_timeline.namespace = 'project:' || timeline_timeline.project_id
+                            AND timeline_timeline.created >= now() - interval '1 year') AS events
+             INNER JOIN projects_project ON projects_project.id = events.project_id
+               GROUP BY events.project_id, events.day;
+            """,
+            reverse_sql=migrations.RunSQL.noop
+        ),
+    ]
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+from django.db import migrations
+
+
+# NOTE: These functions are used by the triggers that maintain the
+#       `search_vector` column of epics, user stories, tasks, issues and
+#       wiki pages (see taiga.searches.models.SearchableMixin)
+CREATE_ITEMS_SEARCH_VECTOR_FUNCTION = """
+    CREATE OR REPLACE FUNCTION items_search_vector_update()
+                       RETURNS trigger
+                            AS $items_search_vector_update$
+                         BEGIN
+                               NEW.search_vector :=
+                                   setweight(to_tsvector('simple',
+                                                         coalesce(NEW.subject, '') || ' ' ||
+                                                         coalesce(NEW.ref::text, '')), 'A') ||
+                                   setweight(to_tsvector('simple',
+                                                         coalesce(inmutable_array_to_string(NEW.tags), '')), 'B') ||
+                                   setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'C');
+                               RETURN NEW;
+                           END; $items_search_vector_update$
+                      LANGUAGE plpgsql;
+"""
+
+DROP_ITEMS_SEARCH_VECTOR_FUNCTION = """
+    DROP FUNCTION IF EXISTS items_search_vector_update() CASCADE;
+"""
+
+CREATE_WIKI_PAGES_SEARCH_VECTOR_FUNCTION = """
+    CREATE OR REPLACE FUNCTION wiki_pages_search_vector_update()
+                       RETURNS trigger
+                            AS $wiki_pages_search_vector_update$
+                         BEGIN
+                               NEW.search_vector :=
+                                   setweight(to_tsvector('simple', coalesce(NEW.slug, '')), 'A') ||
+                                   setweight(to_tsvector('simple', coalesce(NEW.content, '')), 'B');
+                               RETURN NEW;
+                           END; $wiki_pages_search_vector_update$
+                      LANGUAGE plpgsql;
+"""
+
+DROP_WIKI_PAGES_SEARCH_VECTOR_FUNCTION = """
+    DROP FUNCTION IF EXISTS wiki_pages_search_vector_update() CASCADE;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0068_projecttotalsbucket'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_ITEMS_SEARCH_VECTOR_FUNCTION,
+                          reverse_sql=DROP_ITEMS_SEARCH_VECTOR_FUNCTION),
+        migrations.RunSQL(CREATE_WIKI_PAGES_SEARCH_VECTOR_FUNCTION,
+                          reverse_sql=DROP_WIKI_PAGES_SEARCH_VECTOR_FUNCTION),
+    ]
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+from django.db import migrations
+
+
+# NOTE: Indexes used by the typeahead search (see taiga.searches.services.typeahead).
+#       The refs are matched by prefix, so a btree index with text_pattern_ops is
+#       enough. The subjects are matched by substring, which can only use an index
+#       if the pg_trgm extension is available in the server.
+TABLES = ("epics_epic", "userstories_userstory", "tasks_task", "issues_issue")
+
+
+def create_typeahead_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS {table}_ref_prefix_idx
+                                        ON {table} (project_id, (ref::text) text_pattern_ops)
+            """.format(table=table))
+
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table in TABLES:
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS {table}_subject_trgm_idx
+                                        ON {table} USING gin (lower(subject) gin_trgm_ops)
+            """.format(table=table))
+
+
+def drop_typeahead_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute("DROP INDEX IF EXISTS {table}_ref_prefix_idx".format(table=table))
+            cursor.execute("DROP INDEX IF EXISTS {table}_subject_trgm_idx".format(table=table))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0069_search_vector_functions'),
+        ('epics', '0007_search_vector'),
+        ('userstories', '0022_search_vector'),
+        ('tasks', '0014_search_vector'),
+        ('issues', '0010_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_typeahead_indexes, drop_typeahead_indexes),
+    ]
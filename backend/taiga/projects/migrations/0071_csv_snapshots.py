@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0070_typeahead_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectCsvSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=20, verbose_name='entity')),
+                ('modified_date', models.DateTimeField(verbose_name='modified date')),
+                ('file_name', models.CharField(blank=True, default='', max_length=500, verbose_name='file name')),
+                ('generated_date', models.DateTimeField(blank=True, null=True, verbose_name='generated date')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='csv_snapshots', to='projects.project')),
+            ],
+            options={
+                'verbose_name': 'project csv snapshot',
+                'verbose_name_plural': 'project csv snapshots',
+                'unique_together': {('project', 'entity')},
+            },
+        ),
+    ]
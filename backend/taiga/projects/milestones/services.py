@@ -7,8 +7,10 @@
 
 from taiga.base.utils import db
 from taiga.events import events
-from taiga.projects.history.services import take_snapshot
+from taiga.projects.history.services import take_snapshots_in_bulk
 from taiga.projects.services import apply_order_updates
+from taiga.projects.services import csv_snapshots
+from taiga.projects.services import facets
 from taiga.projects.issues.models import Issue
 from taiga.projects.tasks.models import Task
 from taiga.projects.userstories.models import UserStory
@@ -82,17 +84,15 @@ def update_userstories_milestone_in_bulk(bulk_data: list, milestone: object):
     Task.objects.filter(
         user_story_id__in=[e["us_id"] for e in bulk_data]).update(
         milestone=milestone)
+    facets.bump_filters_data_version(milestone.project_id)
+    csv_snapshots.bump_csv_watermarks(milestone.project_id)
 
     return us_orders
 
 
 def snapshot_userstories_in_bulk(bulk_data, user):
-    for us_data in bulk_data:
-        try:
-            us = UserStory.objects.get(pk=us_data['us_id'])
-            take_snapshot(us, user=user)
-        except UserStory.DoesNotExist:
-            pass
+    ids = [us_data['us_id'] for us_data in bulk_data]
+    take_snapshots_in_bulk(UserStory.objects.filter(pk__in=ids), user=user)
 
 
 def update_tasks_milestone_in_bulk(bulk_data: list, milestone: object):
@@ -130,17 +130,15 @@ def update_tasks_milestone_in_bulk(bulk_data: list, milestone: object):
 
     db.update_in_bulk(task_instance_list, task_values)
     db.update_attr_in_bulk_for_ids(task_orders, "taskboard_order", Task)
+    facets.bump_filters_data_version(milestone.project_id)
+    csv_snapshots.bump_csv_watermarks(milestone.project_id)
 
     return task_milestones
 
 
 def snapshot_tasks_in_bulk(bulk_data, user):
-    for task_data in bulk_data:
-        try:
-            task = Task.objects.get(pk=task_data['task_id'])
-            take_snapshot(task, user=user)
-        except Task.DoesNotExist:
-            pass
+    ids = [task_data['task_id'] for task_data in bulk_data]
+    take_snapshots_in_bulk(Task.objects.filter(pk__in=ids), user=user)
 
 
 def update_issues_milestone_in_bulk(bulk_data: list, milestone: object):
@@ -164,14 +162,12 @@ def update_issues_milestone_in_bulk(bulk_data: list, milestone: object):
         issues_values.append({'milestone_id': milestone.id})
 
     db.update_in_bulk(issues_instance_list, issues_values)
+    facets.bump_filters_data_version(milestone.project_id)
+    csv_snapshots.bump_csv_watermarks(milestone.project_id)
 
     return issue_milestones
 
 
 def snapshot_issues_in_bulk(bulk_data, user):
-    for issue_data in bulk_data:
-        try:
-            issue = Issue.objects.get(pk=issue_data['issue_id'])
-            take_snapshot(issue, user=user)
-        except Issue.DoesNotExist:
-            pass
+    ids = [issue_data['issue_id'] for issue_data in bulk_data]
+    take_snapshots_in_bulk(Issue.objects.filter(pk__in=ids), user=user)
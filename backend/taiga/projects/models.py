@@ -5,6 +5,8 @@
 #
 # Copyright (c) 2021-present Kaleidos INC
 
+import datetime
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.postgres.fields import ArrayField
@@ -43,8 +45,6 @@ from taiga.timeline.service import build_project_namespace
 
 from . import choices
 
-from dateutil.relativedelta import relativedelta
-
 
 def get_project_logo_file_path(instance, filename):
     return get_file_path(instance, filename, "project")
@@ -329,38 +329,48 @@ class Project(ProjectDefaults, TaggedMixin, TagsColorsMixin, models.Model):
             super().save(*args, **kwargs)
 
     def refresh_totals(self, save=True):
-        now = timezone.now()
-        self.totals_updated_datetime = now
-
-        Like = apps.get_model("likes", "Like")
-        content_type = apps.get_model("contenttypes", "ContentType").objects.get_for_model(Project)
-        qs = Like.objects.filter(content_type=content_type, object_id=self.id)
+        """
+        Recount all the totals of the project from the likes and the timeline.
 
-        self.total_fans = qs.count()
+        The totals are kept up to date incrementally (see
+        `taiga.projects.services.totals`), this full recount is only needed
+        after bulk operations like imports or timeline rebuilds.
 
-        qs_week = qs.filter(created_date__gte=now - relativedelta(weeks=1))
-        self.total_fans_last_week = qs_week.count()
+        Like the incremental totals, the week/month/year windows count whole
+        (UTC) days: they start at midnight of the day of `now - window`, so
+        they can include up to one day more than `now - window`.
+        """
+        from taiga.projects.services.totals import get_totals_windows_start_days
+        from taiga.projects.services.totals import rebuild_project_totals_buckets
 
-        qs_month = qs.filter(created_date__gte=now - relativedelta(months=1))
-        self.total_fans_last_month = qs_month.count()
+        self.totals_updated_datetime = timezone.now()
+        windows = {window: datetime.datetime.combine(start_day, datetime.time.min, tzinfo=timezone.utc)
+                   for window, start_day in get_totals_windows_start_days(self.totals_updated_datetime).items()}
 
-        qs_year = qs.filter(created_date__gte=now - relativedelta(years=1))
-        self.total_fans_last_year = qs_year.count()
+        Like = apps.get_model("likes", "Like")
+        content_type = apps.get_model("contenttypes", "ContentType").objects.get_for_model(Project)
+        qs = Like.objects.filter(content_type=content_type, object_id=self.id)
+        totals = qs.aggregate(total=models.Count("id"), **{
+            "last_{}".format(window): models.Count("id", filter=Q(created_date__gte=start))
+            for window, start in windows.items()
+        })
+        self.total_fans = totals["total"]
+        self.total_fans_last_week = totals["last_week"]
+        self.total_fans_last_month = totals["last_month"]
+        self.total_fans_last_year = totals["last_year"]
 
         tl_model = apps.get_model("timeline", "Timeline")
         namespace = build_project_namespace(self)
 
         qs = tl_model.objects.filter(namespace=namespace)
-        self.total_activity = qs.count()
-
-        qs_week = qs.filter(created__gte=now - relativedelta(weeks=1))
-        self.total_activity_last_week = qs_week.count()
-
-        qs_month = qs.filter(created__gte=now - relativedelta(months=1))
-        self.total_activity_last_month = qs_month.count()
-
-        qs_year = qs.filter(created__gte=now - relativedelta(years=1))
-        self.total_activity_last_year = qs_year.count()
+        totals = qs.aggregate(total=models.Count("id"), **{
+            "last_{}".format(window): models.Count("id", filter=Q(created__gte=start))
+            for window, start in windows.items()
+        })
+        self.total_activity = totals["total"]
+        self.total_activity_last_week = totals["last_week"]
+        self.total_activity_last_month = totals["last_month"]
+        self.total_activity_last_year = totals["last_year"]
 
         if save:
             self.save(update_fields=[
@@ -374,6 +384,7 @@ class Project(ProjectDefaults, TaggedMixin, TagsColorsMixin, models.Model):
                 'total_activity_last_month',
                 'total_activity_last_year',
             ])
+            rebuild_project_totals_buckets(self)
 
     @cached_property
     def cached_user_stories(self):
@@ -532,6 +543,50 @@ class Project(ProjectDefaults, TaggedMixin, TagsColorsMixin, models.Model):
             connect_memberships_signals()
 
 
+class ProjectTotalsBucket(models.Model):
+    # Per-day fans and activity of a project, used to compute
+    # the week/month/year totals without counting likes and
+    # timeline entries.
+    project = models.ForeignKey(
+        "Project",
+        null=False,
+        blank=False,
+        related_name="totals_buckets",
+        on_delete=models.CASCADE,
+    )
+    day = models.DateField(null=False, blank=False, verbose_name=_("day"))
+    fans = models.IntegerField(null=False, blank=False, default=0, verbose_name=_("fans"))
+    activity = models.IntegerField(null=False, blank=False, default=0, verbose_name=_("activity"))
+
+    class Meta:
+        verbose_name = "project totals bucket"
+        verbose_name_plural = "project totals buckets"
+        unique_together = ("project", "day")
+
+
+class ProjectCsvSnapshot(models.Model):
+    # The last modification (watermark) of the data of the CSV
+    # export of an entity (epics, user stories...) of a project and
+    # the last CSV generated, stored in the default storage.
+    project = models.ForeignKey(
+        "Project",
+        null=False,
+        blank=False,
+        related_name="csv_snapshots",
+        on_delete=models.CASCADE,
+    )
+    entity = models.CharField(max_length=20, null=False, blank=False, verbose_name=_("entity"))
+    modified_date = models.DateTimeField(null=False, blank=False, verbose_name=_("modified date"))
+    file_name = models.CharField(max_length=500, null=False, blank=True, default="",
+                                 verbose_name=_("file name"))
+    generated_date = models.DateTimeField(null=True, blank=True, verbose_name=_("generated date"))
+
+    class Meta:
+        verbose_name = "project csv snapshot"
+        verbose_name_plural = "project csv snapshots"
+        unique_together = ("project", "entity")
+
+
 class ProjectModulesConfig(models.Model):
     project = models.OneToOneField(
         "Project",
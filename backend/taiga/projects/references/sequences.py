@@ -48,6 +48,12 @@ def next_value(seqname):
         result = cursor.fetchone()
         return result[0]
 
+def next_values(seqname, count):
+    sql = "SELECT nextval(%s) FROM generate_series(1, %s);"
+    with closing(connection.cursor()) as cursor:
+        cursor.execute(sql, [seqname, count])
+        return [row[0] for row in cursor.fetchall()]
+
 def set_max(seqname, new_value):
     sql = "SELECT setval(%s, GREATEST(nextval(%s), %s));"
     with closing(connection.cursor()) as cursor:
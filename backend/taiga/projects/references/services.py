@@ -16,3 +16,14 @@ def get_instance_by_ref(project_id, obj_ref):
         instance = None
 
     return instance
+
+
+def get_instances_by_refs(project_id, refs):
+    """
+    Return a dict with the reference instances of the `refs` of a project,
+    with their content objects already loaded (one query per content type).
+    """
+    model_cls = apps.get_model("references", "Reference")
+    qs = model_cls.objects.filter(project_id=project_id, ref__in=refs)
+    qs = qs.select_related("content_type").prefetch_related("content_object")
+    return {instance.ref: instance for instance in qs}
@@ -54,5 +54,9 @@ from .stats import get_stats_for_project_issues
 from .stats import get_stats_for_project
 from .stats import get_member_stats_for_project
 
+from .totals import bump_project_totals
+from .totals import rebuild_project_totals_buckets
+from .totals import refresh_projects_totals_windows
+
 from .transfer import request_project_transfer, start_project_transfer
 from .transfer import accept_project_transfer, reject_project_transfer
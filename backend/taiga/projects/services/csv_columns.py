@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+from collections import defaultdict
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, F
+
+from taiga.base.utils import iterators
+
+
+#####################################################################
+# Columns of the CSV exports (of epics, user stories, tasks and issues)
+#####################################################################
+#
+# The items of a CSV export are loaded in batches, and every derived
+# column of a batch (the attachments counters, the refs of the related
+# items, the custom attributes values...) is computed with a single query
+# for all the items of the batch. So the number of queries of an export
+# only depends on the number of batches, never on the related data of
+# every item.
+#
+# A column is a function that receives a list of item ids and returns a
+# dict (with a default value) of the values of the column by item id.
+
+COLUMN_KEY = "csv_column_key"
+
+
+def iter_items_with_columns(queryset, columns, batch_size=500):
+    """
+    Iterate the items of a queryset with the values of their columns.
+
+    :param columns: A dict of column (function) by name.
+
+    :return: An iterator of (item, dict of the column values by name) tuples.
+    """
+    for batch in iterators.iter_queryset_batches(queryset, batch_size):
+        ids = [item.id for item in batch]
+        values = {name: get_column(ids) for name, get_column in columns.items()}
+
+        for item in batch:
+            yield item, {name: column[item.id] for name, column in values.items()}
+
+
+def attachments_count(model):
+    """
+    Column with the number of attachments of every item.
+    """
+    attachment_model = apps.get_model("attachments", "Attachment")
+
+    def get_column(ids):
+        content_type = ContentType.objects.get_for_model(model)
+        rows = (attachment_model.objects.filter(content_type=content_type, object_id__in=ids)
+                                        .values_list("object_id")
+                                        .annotate(count=Count("id"))
+                                        .order_by())
+        return defaultdict(int, rows)
+
+    return get_column
+
+
+def custom_attributes_values(model):
+    """
+    Column with the custom attributes values (a dict by custom attribute
+    id) of every item.
+    """
+    related = model._meta.get_field("custom_attributes_values")
+    key = related.field.attname
+
+    def get_column(ids):
+        rows = (related.related_model.objects.filter(**{"{}__in".format(key): ids})
+                                             .values_list(key, "attributes_values"))
+        return defaultdict(dict, rows)
+
+    return get_column
+
+
+def related(queryset, key, *fields):
+    """
+    Column with the list of the related objects of every item, in the
+    order of the queryset. `key` is the lookup from the related objects to
+    the id of the item. If some `fields` are given the list has their
+    values (or tuples of them) instead of the objects.
+    """
+    def get_column(ids):
+        related_queryset = queryset.filter(**{"{}__in".format(key): ids})
+        column = defaultdict(list)
+
+        if not fields:
+            for obj in related_queryset.annotate(**{COLUMN_KEY: F(key)}):
+                column[getattr(obj, COLUMN_KEY)].append(obj)
+        elif len(fields) == 1:
+            for item_id, value in related_queryset.values_list(key, *fields):
+                column[item_id].append(value)
+        else:
+            for item_id, *values in related_queryset.values_list(key, *fields):
+                column[item_id].append(tuple(values))
+
+        return column
+
+    return get_column
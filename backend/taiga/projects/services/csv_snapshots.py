@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+import tempfile
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+#####################################################################
+# CSV snapshots (of epics, user stories, tasks and issues)
+#####################################################################
+#
+# Every CSV export of a project has a watermark, the last time the data
+# of the export changed, that is moved by the signals of all the models
+# with data in it. The watermark is used as the ETag and the Last-Modified
+# of the CSV responses, and the last generated CSV is stored in the default
+# storage and served from there until the watermark moves.
+
+CSV_ENTITIES = ("epics", "userstories", "tasks", "issues")
+
+CSV_CONTENT_TYPE = "application/csv; charset=utf-8"
+
+# The CSV exports with data of every model (with a project)
+CSV_ENTITIES_BY_MODEL = {
+    "epics.Epic": ("epics", "userstories"),
+    "userstories.UserStory": ("userstories", "tasks", "epics"),
+    "tasks.Task": ("tasks", "userstories"),
+    "issues.Issue": ("issues", "userstories"),
+    "projects.EpicStatus": ("epics",),
+    "projects.UserStoryStatus": ("userstories",),
+    "projects.Points": ("userstories",),
+    "projects.Swimlane": ("userstories",),
+    "projects.TaskStatus": ("tasks",),
+    "projects.IssueStatus": ("issues",),
+    "projects.IssueType": ("issues",),
+    "projects.Priority": ("issues",),
+    "projects.Severity": ("issues",),
+    "milestones.Milestone": ("userstories", "tasks", "issues"),
+    "users.Role": ("userstories",),
+    "custom_attributes.EpicCustomAttribute": ("epics",),
+    "custom_attributes.UserStoryCustomAttribute": ("userstories",),
+    "custom_attributes.TaskCustomAttribute": ("tasks",),
+    "custom_attributes.IssueCustomAttribute": ("issues",),
+}
+
+# The CSV exports with data of every model related to an item (and the
+# field of the item)
+CSV_ENTITIES_BY_ITEM_RELATED_MODEL = {
+    "epics.RelatedUserStory": ("epic", ("epics", "userstories")),
+    "userstories.RolePoints": ("user_story", ("userstories",)),
+    "custom_attributes.EpicCustomAttributesValues": ("epic", ("epics",)),
+    "custom_attributes.UserStoryCustomAttributesValues": ("user_story", ("userstories",)),
+    "custom_attributes.TaskCustomAttributesValues": ("task", ("tasks",)),
+    "custom_attributes.IssueCustomAttributesValues": ("issue", ("issues",)),
+}
+
+# The models related to an item with a generic foreign key and the CSV
+# export of every item content type
+CSV_GENERIC_MODELS = ("attachments.Attachment", "notifications.Watched", "votes.Vote")
+
+CSV_ENTITY_BY_CONTENT_TYPE = {
+    ("epics", "epic"): "epics",
+    ("userstories", "userstory"): "userstories",
+    ("tasks", "task"): "tasks",
+    ("issues", "issue"): "issues",
+}
+
+CSV_WATERMARK_MODELS = (tuple(CSV_ENTITIES_BY_MODEL) + tuple(CSV_ENTITIES_BY_ITEM_RELATED_MODEL) +
+                        CSV_GENERIC_MODELS)
+
+
+#####################################################################
+# Watermarks
+#####################################################################
+
+def bump_csv_watermarks(project_id, entities=CSV_ENTITIES):
+    """
+    Move the watermarks of the CSV exports of a project. Only the exports
+    already requested have a watermark, the rest get one when they are.
+
+    They are moved once the current transaction is committed, so the writes
+    of a project don't wait for each other on the rows of its snapshots.
+    """
+    transaction.on_commit(lambda: _bump_csv_watermarks(project_id, entities))
+
+
+def _bump_csv_watermarks(project_id, entities):
+    snapshot_model = apps.get_model("projects", "ProjectCsvSnapshot")
+    (snapshot_model.objects.filter(project_id=project_id, entity__in=entities)
+                           .update(modified_date=timezone.now()))
+
+
+def get_csv_entities_of_instance(instance):
+    """
+    Return the project and the CSV exports with data of a model instance
+    (None and an empty tuple if it has none).
+    """
+    label = instance._meta.label
+
+    try:
+        if label in CSV_ENTITIES_BY_MODEL:
+            return instance.project_id, CSV_ENTITIES_BY_MODEL[label]
+
+        if label in CSV_ENTITIES_BY_ITEM_RELATED_MODEL:
+            field_name, entities = CSV_ENTITIES_BY_ITEM_RELATED_MODEL[label]
+            return getattr(instance, field_name).project_id, entities
+
+        if label in CSV_GENERIC_MODELS:
+            content_type = ContentType.objects.get_for_id(instance.content_type_id)
+            entity = CSV_ENTITY_BY_CONTENT_TYPE.get((content_type.app_label, content_type.model))
+            if entity is not None:
+                project_id = getattr(instance, "project_id", None)
+                if project_id is None:
+                    project_id = instance.content_object.project_id
+                return project_id, (entity,)
+    except (AttributeError, ObjectDoesNotExist):
+        # The item is already deleted
+        pass
+
+    return None, ()
+
+
+#####################################################################
+# Snapshots
+#####################################################################
+
+def get_csv_snapshot(project, entity):
+    snapshot_model = apps.get_model("projects", "ProjectCsvSnapshot")
+    snapshot, _ = snapshot_model.objects.get_or_create(project=project, entity=entity,
+                                                       defaults={"modified_date": timezone.now()})
+    return snapshot
+
+
+def _generate_csv_snapshot(snapshot, iter_csv):
+    csv_file = tempfile.TemporaryFile()
+    for chunk in iter_csv():
+        csv_file.write(chunk.encode("utf-8"))
+
+    file_name = "exports/{}/{}-{}.csv".format(snapshot.project_id, snapshot.entity, uuid.uuid4().hex)
+    file_name = default_storage.save(file_name, File(csv_file))
+
+    # Only one of the concurrent generations of a snapshot is stored, the
+    # others are just served.
+    snapshot_model = apps.get_model("projects", "ProjectCsvSnapshot")
+    updated = (snapshot_model.objects.filter(id=snapshot.id, file_name=snapshot.file_name)
+                                     .update(file_name=file_name, generated_date=snapshot.modified_date))
+    if updated:
+        if snapshot.file_name:
+            default_storage.delete(snapshot.file_name)
+    else:
+        default_storage.delete(file_name)
+
+    csv_file.seek(0)
+    return csv_file
+
+
+def open_csv_snapshot(snapshot, iter_csv):
+    """
+    Return the file of the stored CSV of a snapshot, generating (and
+    storing) it with `iter_csv` if it was generated before its watermark.
+    """
+    if snapshot.file_name and snapshot.generated_date == snapshot.modified_date:
+        try:
+            return default_storage.open(snapshot.file_name, "rb")
+        except OSError:
+            pass
+
+    return _generate_csv_snapshot(snapshot, iter_csv)
+
+
+def get_csv_response(request, project, entity, filename, iter_csv):
+    """
+    Return the response of a CSV export of a project: a 304 if the client
+    already has it, or its stored snapshot (generated with `iter_csv` when
+    its data has changed).
+    """
+    snapshot = get_csv_snapshot(project, entity)
+    etag = '"{}-{}-{}"'.format(project.id, entity, int(snapshot.modified_date.timestamp() * 1000000))
+    last_modified = int(snapshot.modified_date.timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        if getattr(settings, "CSV_SNAPSHOTS_ENABLED", True):
+            response = FileResponse(open_csv_snapshot(snapshot, iter_csv), content_type=CSV_CONTENT_TYPE)
+        else:
+            response = StreamingHttpResponse(iter_csv(), content_type=CSV_CONTENT_TYPE)
+        response["Content-Disposition"] = 'attachment; filename="{}"'.format(filename)
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+import hashlib
+import uuid
+from collections import namedtuple
+from contextlib import closing
+from operator import itemgetter
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, transaction
+from django.utils import translation
+from django.utils.translation import gettext as _
+
+from taiga.base.utils import json
+from taiga.permissions.services import get_user_memberships_cache, get_user_project_permissions
+from taiga.users.gravatar import get_gravatar_id
+from taiga.users.services import get_big_photo_url, get_photo_url
+
+
+#####################################################################
+# Facets (counters of the filters_data of epics, user stories, tasks
+# and issues)
+#####################################################################
+#
+# Every facet counts the items of its own queryset (the filtered items
+# without the filter of the facet itself) grouped by a column. Instead of
+# scanning the items once per facet, all the rows of the project are read
+# once into a materialized CTE with the key and the "is in the queryset"
+# flag of every facet, and all the counters are computed from it.
+
+FACET_VALUE = "value"  # the key is a column of the item
+FACET_TAGS = "tags"    # the key is an array of tags, every tag is counted
+FACET_ROLES = "roles"  # the key is an array of users, the roles of their memberships are counted
+
+Facet = namedtuple("Facet", ["queryset", "column", "kind"])
+
+
+def _get_where(queryset):
+    compiler = connection.ops.compiler(queryset.query.compiler)(
+        queryset.query, connection, None
+    )
+    try:
+        where, where_params = queryset.query.where.as_sql(compiler, connection)
+    except EmptyResultSet:
+        return "FALSE", []
+    return where or "TRUE", list(where_params)
+
+
+def count_facets(project, model, facets, joins=""):
+    """
+    Count the items of a project for every facet with a single scan of them.
+
+    :param facets: A dict of `Facet` by name.
+    :param joins: The joins of the model table needed by the querysets of the facets.
+
+    :return: A dict with the counters (a dict of count by key) of every facet.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+
+    columns = []
+    counters = []
+    params = []
+    counters_params = []
+    kinds = []
+    for index, facet in enumerate(facets.values()):
+        where, where_params = _get_where(facet.queryset)
+        columns.append('{column} "key_{index}", ({where}) "in_{index}"'.format(
+            column=facet.column, where=where, index=index))
+        params += where_params
+        kinds.append(facet.kind)
+
+        if facet.kind == FACET_TAGS:
+            counters.append("""
+                SELECT {index}, "tag", COUNT(DISTINCT "item_id")
+                  FROM "facet_items", UNNEST("key_{index}") "tag"
+                 WHERE "in_{index}"
+              GROUP BY "tag"
+            """.format(index=index))
+        elif facet.kind == FACET_ROLES:
+            counters.append("""
+                SELECT {index}, "projects_membership"."role_id"::text, COUNT(DISTINCT "item_id")
+                  FROM "facet_items"
+            INNER JOIN "projects_membership"
+                    ON "projects_membership"."user_id" = ANY("key_{index}")
+                   AND "projects_membership"."project_id" = %s
+                 WHERE "in_{index}"
+              GROUP BY "projects_membership"."role_id"
+            """.format(index=index))
+            counters_params.append(project.id)
+        else:
+            counters.append("""
+                SELECT {index}, "key_{index}"::text, COUNT(DISTINCT "item_id")
+                  FROM "facet_items"
+                 WHERE "in_{index}"
+              GROUP BY "key_{index}"
+            """.format(index=index))
+
+    sql = """
+        WITH "facet_items" AS MATERIALIZED (
+            SELECT {table}."id" "item_id",
+                   {columns}
+              FROM {table}
+        INNER JOIN "projects_project"
+                ON ({table}."project_id" = "projects_project"."id")
+                   {joins}
+             WHERE {table}."project_id" = %s
+        )
+        {counters}
+    """.format(table=table, columns=",\n".join(columns), joins=joins,
+               counters="\nUNION ALL\n".join(counters))
+
+    with closing(connection.cursor()) as cursor:
+        cursor.execute(sql, params + [project.id] + counters_params)
+        rows = cursor.fetchall()
+
+    result = [{} for facet in facets]
+    for index, key, count in rows:
+        if key is not None and kinds[index] != FACET_TAGS:
+            key = int(key)
+        result[index][key] = count
+    return dict(zip(facets.keys(), result))
+
+
+#####################################################################
+# Facets data
+#####################################################################
+
+def get_choices_facet_data(project, model, counters):
+    """
+    Facet of a project attribute with name and color (statuses, types,
+    priorities, severities...)
+    """
+    rows = model.objects.filter(project_id=project.id).values_list("id", "name", "color", "order")
+
+    result = []
+    for id, name, color, order in rows:
+        result.append(
+            {
+                "id": id,
+                "name": _(name),
+                "color": color,
+                "order": order,
+                "count": counters.get(id, 0),
+            }
+        )
+    return sorted(result, key=itemgetter("order"))
+
+
+def _get_user_facet_data(id, full_name, username, photo, email, count, with_photos):
+    data = {
+        "id": id,
+        "full_name": full_name or username or "",
+        "count": count,
+    }
+    if with_photos:
+        data.update({
+            "photo": get_photo_url(photo),
+            "big_photo": get_big_photo_url(photo),
+            "gravatar_id": get_gravatar_id(email) if email else None,
+        })
+    return data
+
+
+def _get_members(project):
+    membership_model = apps.get_model("projects", "Membership")
+    return (membership_model.objects.filter(project_id=project.id, user_id__isnull=False)
+                                    .values_list("user_id", "user__full_name", "user__username",
+                                                 "user__photo", "user__email"))
+
+
+def get_assigned_users_facet_data(project, counters, with_photos=False):
+    """
+    Facet of the members of a project (with the counter of the unassigned
+    items)
+    """
+    result = []
+    for id, full_name, username, photo, email in _get_members(project):
+        result.append(_get_user_facet_data(id, full_name, username, photo, email,
+                                           counters.get(id, 0), with_photos))
+
+    result.append(_get_user_facet_data(None, None, None, None, None, counters.get(None, 0), with_photos))
+    return sorted(result, key=itemgetter("full_name"))
+
+
+def get_owners_facet_data(project, counters, with_photos=False):
+    """
+    Facet of the members and the system users that own some item.
+    """
+    result = []
+    for id, full_name, username, photo, email in _get_members(project):
+        if counters.get(id, 0) > 0:
+            result.append(_get_user_facet_data(id, full_name, username, photo, email,
+                                               counters[id], with_photos))
+
+    user_model = apps.get_model("users", "User")
+    system_users = user_model.objects.filter(is_system=True).values_list("id", "full_name", "username")
+    members_ids = {user["id"] for user in result}
+    for id, full_name, username in system_users:
+        if id not in members_ids and counters.get(id, 0) > 0:
+            result.append(_get_user_facet_data(id, full_name, username, None, None,
+                                               counters[id], with_photos))
+
+    return sorted(result, key=itemgetter("full_name"))
+
+
+def get_tags_facet_data(project, counters):
+    """
+    Facet of the tags (with color) of a project.
+    """
+    result = []
+    for name, color in project.tags_colors or []:
+        result.append(
+            {
+                "name": name,
+                "color": color,
+                "count": counters.get(name, 0),
+            }
+        )
+    return sorted(result, key=itemgetter("name"))
+
+
+def get_roles_facet_data(project, counters):
+    """
+    Facet of the roles of a project.
+    """
+    role_model = apps.get_model("users", "Role")
+    rows = role_model.objects.filter(project_id=project.id).values_list("id", "name", "order")
+
+    result = []
+    for id, name, order in rows:
+        result.append(
+            {
+                "id": id,
+                "name": _(name),
+                "color": None,
+                "order": order,
+                "count": counters.get(id, 0),
+            }
+        )
+    return sorted(result, key=itemgetter("order"))
+
+
+#####################################################################
+# Filters data cache
+#####################################################################
+#
+# The filters data of a project is shared by all the users that request it
+# with the same params and the same permissions, for a few seconds (see
+# FILTERS_DATA_CACHE_TIMEOUT). Any change in the items or the attributes of
+# a project bumps its version, so the cached data is never reused after it.
+
+def _get_filters_data_version_key(project_id):
+    return "filters-data-version:{}".format(project_id)
+
+
+def _get_filters_data_version(project_id):
+    key = _get_filters_data_version_key(project_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(key, version, None)
+    return version
+
+
+def _bump_filters_data_version(project_id):
+    cache.set(_get_filters_data_version_key(project_id), uuid.uuid4().hex, None)
+
+
+def bump_filters_data_version(project_id):
+    _bump_filters_data_version(project_id)
+    # Other requests could cache the old data until the current transaction
+    # is committed.
+    transaction.on_commit(lambda: _bump_filters_data_version(project_id))
+
+
+def get_filters_data_cache_key(namespace, project, request):
+    """
+    The fingerprint of a filters_data request: the project (and its version),
+    the normalized query params, the language and the permissions of the
+    user in the project.
+    """
+    user = request.user
+    params = sorted((key, sorted(values)) for key, values in request.QUERY_PARAMS.lists())
+    fingerprint = json.dumps([
+        params,
+        translation.get_language(),
+        user.is_authenticated and user.is_superuser,
+        user.is_authenticated and project.id in get_user_memberships_cache(user),
+        sorted(get_user_project_permissions(user, project)),
+    ])
+    return "filters-data:{}:{}:{}:{}".format(namespace, project.id, _get_filters_data_version(project.id),
+                                             hashlib.sha1(fingerprint.encode("utf-8")).hexdigest())
+
+
+def get_cached_filters_data(namespace, project, request, get_filters_data):
+    """
+    Return the filters data of the request from the cache, calling
+    `get_filters_data` to compute it if it isn't there.
+    """
+    timeout = getattr(settings, "FILTERS_DATA_CACHE_TIMEOUT", 60)
+    if not timeout:
+        return get_filters_data()
+
+    key = get_filters_data_cache_key(namespace, project, request)
+    data = cache.get(key)
+    if data is None:
+        data = get_filters_data()
+        cache.set(key, data, timeout)
+    return data
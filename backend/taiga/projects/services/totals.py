@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+from django.apps import apps
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from dateutil.relativedelta import relativedelta
+
+from taiga.celery import app
+from taiga.timeline.service import build_project_namespace
+
+
+#####################################################################
+# Project totals (fans and activity)
+#####################################################################
+#
+# The totals of a project are maintained incrementally: every new fan or
+# activity bumps the global counters, the counters of the windows that
+# contain the event and a per-day bucket. The week/month/year windows are
+# recomputed from the buckets by a periodic task, so they decay even when
+# the project has no new activity.
+
+TOTALS_WINDOWS = (
+    ("week", relativedelta(weeks=1)),
+    ("month", relativedelta(months=1)),
+    ("year", relativedelta(years=1)),
+)
+
+
+def get_bucket_day(dt):
+    if timezone.is_aware(dt):
+        dt = timezone.localtime(dt, timezone.utc)
+    return dt.date()
+
+
+def get_totals_windows_start_days(now=None):
+    now = now or timezone.now()
+    return {name: get_bucket_day(now - delta) for name, delta in TOTALS_WINDOWS}
+
+
+def bump_project_totals(project, *, fans=0, activity=0, created_datetime=None):
+    """
+    Add `fans` and `activity` (can be negative) to the totals of a project
+    at `created_datetime` (now by default).
+    """
+    if not fans and not activity:
+        return
+
+    now = timezone.now()
+    day = get_bucket_day(created_datetime or now)
+
+    bucket_table = apps.get_model("projects", "ProjectTotalsBucket")._meta.db_table
+    sql = """
+        INSERT INTO {table} (project_id, day, fans, activity)
+             VALUES (%s, %s, %s, %s)
+        ON CONFLICT (project_id, day)
+          DO UPDATE SET fans = {table}.fans + EXCLUDED.fans,
+                        activity = {table}.activity + EXCLUDED.activity
+    """.format(table=bucket_table)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [project.id, day, fans, activity])
+
+    values = {"totals_updated_datetime": now}
+    counters = [(name, value) for name, value in (("fans", fans), ("activity", activity)) if value]
+    for counter, value in counters:
+        field_name = "total_{}".format(counter)
+        values[field_name] = Greatest(F(field_name) + value, 0)
+
+    for window, start_day in get_totals_windows_start_days(now).items():
+        if day < start_day:
+            continue
+
+        for counter, value in counters:
+            field_name = "total_{}_last_{}".format(counter, window)
+            values[field_name] = Greatest(F(field_name) + value, 0)
+
+    apps.get_model("projects", "Project").objects.filter(id=project.id).update(**values)
+
+
+def rebuild_project_totals_buckets(project):
+    """
+    Rebuild the per-day buckets of the last year of a project from the likes
+    and the timeline.
+    """
+    bucket_table = apps.get_model("projects", "ProjectTotalsBucket")._meta.db_table
+    content_type = apps.get_model("contenttypes", "ContentType").objects.get_for_model(project)
+    since = get_totals_windows_start_days()["year"]
+
+    sql = """
+        DELETE FROM {table} WHERE project_id = %(project_id)s;
+
+        INSERT INTO {table} (project_id, day, fans, activity)
+             SELECT %(project_id)s, day, sum(fans), sum(activity)
+               FROM (SELECT (created_date AT TIME ZONE 'UTC')::date AS day, 1 AS fans, 0 AS activity
+                       FROM likes_like
+                      WHERE content_type_id = %(content_type_id)s
+                        AND object_id = %(project_id)s
+                        AND created_date >= %(since)s
+                  UNION ALL
+                     SELECT (created AT TIME ZONE 'UTC')::date AS day, 0 AS fans, 1 AS activity
+                       FROM timeline_timeline
+                      WHERE namespace = %(namespace)s
+                        AND created >= %(since)s) events
+           GROUP BY day;
+    """.format(table=bucket_table)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {
+            "project_id": project.id,
+            "content_type_id": content_type.id,
+            "namespace": build_project_namespace(project),
+            "since": since,
+        })
+
+
+@app.task
+def refresh_projects_totals_windows(project_ids=None):
+    """
+    Recompute the week/month/year totals of the projects from their per-day
+    buckets and drop the buckets older than a year. It runs periodically
+    (see PROJECTS_TOTALS_REFRESH_PERIODICITY).
+    """
+    bucket_table = apps.get_model("projects", "ProjectTotalsBucket")._meta.db_table
+    project_table = apps.get_model("projects", "Project")._meta.db_table
+    params = get_totals_windows_start_days()
+
+    project_filter = ""
+    if project_ids is not None:
+        project_filter = "AND p.id = ANY(%(project_ids)s)"
+        params["project_ids"] = list(project_ids)
+
+    sql = """
+        UPDATE {project_table} AS project
+           SET total_fans_last_week = totals.fans_last_week,
+               total_fans_last_month = totals.fans_last_month,
+               total_fans_last_year = totals.fans_last_year,
+               total_activity_last_week = totals.activity_last_week,
+               total_activity_last_month = totals.activity_last_month,
+               total_activity_last_year = totals.activity_last_year
+          FROM (SELECT p.id,
+                       greatest(coalesce(sum(b.fans) FILTER (WHERE b.day >= %(week)s), 0), 0) AS fans_last_week,
+                       greatest(coalesce(sum(b.fans) FILTER (WHERE b.day >= %(month)s), 0), 0) AS fans_last_month,
+                       greatest(coalesce(sum(b.fans), 0), 0) AS fans_last_year,
+                       greatest(coalesce(sum(b.activity) FILTER (WHERE b.day >= %(week)s), 0), 0)
+                           AS activity_last_week,
+                       greatest(coalesce(sum(b.activity) FILTER (WHERE b.day >= %(month)s), 0), 0)
+                           AS activity_last_month,
+                       greatest(coalesce(sum(b.activity), 0), 0) AS activity_last_year
+                  FROM {project_table} AS p
+             LEFT JOIN {bucket_table} AS b
+                    ON b.project_id = p.id
+                   AND b.day >= %(year)s
+                 WHERE (b.project_id IS NOT NULL
+                        OR p.total_fans_last_year > 0
+                        OR p.total_activity_last_year > 0)
+                       {project_filter}
+              GROUP BY p.id) AS totals
+         WHERE project.id = totals.id;
+
+        DELETE FROM {bucket_table} WHERE day < %(year)s;
+    """.format(project_table=project_table, bucket_table=bucket_table, project_filter=project_filter)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
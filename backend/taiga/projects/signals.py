@@ -7,9 +7,13 @@
 
 from django.apps import apps
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.db.models import F
 from django.dispatch import Signal
 
+from taiga.permissions.services import invalidate_user_memberships_cache
+from taiga.projects.services.csv_snapshots import bump_csv_watermarks, get_csv_entities_of_instance
+from taiga.projects.services.facets import bump_filters_data_version
 from taiga.projects.notifications.services import create_notify_policy_if_not_exists
 
 
@@ -37,6 +41,75 @@ def membership_post_save(sender, instance, using, **kwargs):
         .update(user_order=0)
 
 
+## Permissions
+
+def membership_invalidate_permissions_cache(sender, instance, **kwargs):
+    invalidate_user_memberships_cache([instance.user_id])
+
+
+def role_invalidate_permissions_cache(sender, instance, created=False, **kwargs):
+    # a new role has no members yet
+    if created:
+        return
+
+    invalidate_user_memberships_cache(instance.memberships.values_list("user_id", flat=True))
+
+
+def project_invalidate_permissions_cache(sender, instance, **kwargs):
+    invalidate_user_memberships_cache(instance.memberships.values_list("user_id", flat=True))
+
+
+## Filters data cache
+
+def bump_filters_data_version_of_project(sender, instance, **kwargs):
+    bump_filters_data_version(instance.id)
+
+
+def bump_filters_data_version_of_related_project(sender, instance, **kwargs):
+    bump_filters_data_version(instance.project_id)
+
+
+def bump_filters_data_version_of_related_userstory(sender, instance, **kwargs):
+    bump_filters_data_version(instance.epic.project_id)
+
+
+def bump_filters_data_version_of_userstory_assigned_users(sender, instance, reverse, pk_set, **kwargs):
+    if not reverse:
+        bump_filters_data_version(instance.project_id)
+        return
+
+    project_ids = (apps.get_model("userstories", "UserStory").objects.filter(id__in=pk_set or [])
+                                                                     .values_list("project_id", flat=True)
+                                                                     .distinct())
+    for project_id in project_ids:
+        bump_filters_data_version(project_id)
+
+
+## CSV snapshots
+
+def bump_csv_watermarks_of_related_project(sender, instance, **kwargs):
+    project_id, entities = get_csv_entities_of_instance(instance)
+    if project_id is not None:
+        bump_csv_watermarks(project_id, entities)
+
+
+def bump_csv_watermarks_of_userstory_assigned_users(sender, instance, reverse, pk_set, **kwargs):
+    if not reverse:
+        bump_csv_watermarks(instance.project_id, ("userstories",))
+        return
+
+    project_ids = (apps.get_model("userstories", "UserStory").objects.filter(id__in=pk_set or [])
+                                                                     .values_list("project_id", flat=True)
+                                                                     .distinct())
+    for project_id in project_ids:
+        bump_csv_watermarks(project_id, ("userstories",))
+
+
+def delete_csv_snapshot_file(sender, instance, **kwargs):
+    if instance.file_name:
+        default_storage.delete(instance.file_name)
+
+
 ## project attributes
 def project_post_save(sender, instance, created, **kwargs):
     """
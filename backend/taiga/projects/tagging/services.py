@@ -7,6 +7,8 @@
 
 from django.db import connection
 
+from taiga.projects.services.csv_snapshots import bump_csv_watermarks
+
 
 def tag_exist_for_project_elements(project, tag):
     return tag in dict(project.tags_colors).keys()
@@ -50,6 +52,9 @@ def edit_tag(project, from_tag, to_tag, color):
     project.tags_colors = list(tags_colors.items())
     project.save(update_fields=["tags_colors"])
 
+    # The items are updated without their signals
+    bump_csv_watermarks(project.id)
+
 
 def rename_tag(project, from_tag, to_tag, **kwargs):
     # Kwargs can have a color parameter
@@ -85,6 +90,9 @@ def rename_tag(project, from_tag, to_tag, **kwargs):
     project.tags_colors = list(tags_colors.items())
     project.save(update_fields=["tags_colors"])
 
+    # The items are updated without their signals
+    bump_csv_watermarks(project.id)
+
 
 def delete_tag(project, tag):
     sql = """
@@ -112,6 +120,9 @@ def delete_tag(project, tag):
     project.tags_colors = list(tags_colors.items())
     project.save(update_fields=["tags_colors"])
 
+    # The items are updated without their signals
+    bump_csv_watermarks(project.id)
+
 
 def mix_tags(project, from_tags, to_tag):
     color = dict(project.tags_colors)[to_tag]
@@ -5,7 +5,6 @@
 #
 # Copyright (c) 2021-present Kaleidos INC
 
-from django.http import HttpResponse
 from django.utils.translation import gettext as _
 
 from taiga.base.api.utils import get_object_or_error
@@ -24,6 +23,8 @@ from taiga.projects.notifications.mixins import AssignedToSignalMixin
 from taiga.projects.notifications.mixins import WatchedResourceMixin
 from taiga.projects.notifications.mixins import WatchersViewSetMixin
 from taiga.projects.occ import OCCResourceMixin
+from taiga.projects.services import csv_snapshots
+from taiga.projects.services import facets
 from taiga.projects.tagging.api import TaggedResourceMixin
 from taiga.projects.userstories.models import UserStory
 
@@ -211,22 +212,25 @@ class TaskViewSet(AssignedToSignalMixin, OCCResourceMixin, VotedResourceMixin,
         project_id = request.QUERY_PARAMS.get("project", None)
         project = get_object_or_error(Project, request.user, id=project_id)
 
-        filter_backends = self.get_filter_backends()
-        statuses_filter_backends = (f for f in filter_backends if f != filters.StatusesFilter)
-        assigned_to_filter_backends = (f for f in filter_backends if f != filters.AssignedToFilter)
-        owners_filter_backends = (f for f in filter_backends if f != filters.OwnersFilter)
-        roles_filter_backends = (f for f in filter_backends if f != filters.RoleFilter)
-        tags_filter_backends = (f for f in filter_backends if f != filters.TagsFilter)
-
-        queryset = self.get_queryset()
-        querysets = {
-            "statuses": self.filter_queryset(queryset, filter_backends=statuses_filter_backends),
-            "assigned_to": self.filter_queryset(queryset, filter_backends=assigned_to_filter_backends),
-            "owners": self.filter_queryset(queryset, filter_backends=owners_filter_backends),
-            "tags": self.filter_queryset(queryset, filter_backends=tags_filter_backends),
-            "roles": self.filter_queryset(queryset, filter_backends=roles_filter_backends),
-        }
-        return response.Ok(services.get_tasks_filters_data(project, querysets))
+        def get_filters_data():
+            filter_backends = self.get_filter_backends()
+            statuses_filter_backends = (f for f in filter_backends if f != filters.StatusesFilter)
+            assigned_to_filter_backends = (f for f in filter_backends if f != filters.AssignedToFilter)
+            owners_filter_backends = (f for f in filter_backends if f != filters.OwnersFilter)
+            roles_filter_backends = (f for f in filter_backends if f != filters.RoleFilter)
+            tags_filter_backends = (f for f in filter_backends if f != filters.TagsFilter)
+
+            queryset = self.get_queryset()
+            querysets = {
+                "statuses": self.filter_queryset(queryset, filter_backends=statuses_filter_backends),
+                "assigned_to": self.filter_queryset(queryset, filter_backends=assigned_to_filter_backends),
+                "owners": self.filter_queryset(queryset, filter_backends=owners_filter_backends),
+                "tags": self.filter_queryset(queryset, filter_backends=tags_filter_backends),
+                "roles": self.filter_queryset(queryset, filter_backends=roles_filter_backends),
+            }
+            return services.get_tasks_filters_data(project, querysets)
+
+        return response.Ok(facets.get_cached_filters_data("tasks", project, request, get_filters_data))
 
     @list_route(methods=["GET"])
     def csv(self, request):
@@ -236,10 +240,8 @@ class TaskViewSet(AssignedToSignalMixin, OCCResourceMixin, VotedResourceMixin,
 
         project = get_object_or_error(Project, request.user, tasks_csv_uuid=uuid)
         queryset = project.tasks.all().order_by('ref')
-        data = services.tasks_to_csv(project, queryset)
-        csv_response = HttpResponse(data.getvalue(), content_type='application/csv; charset=utf-8')
-        csv_response['Content-Disposition'] = 'attachment; filename="tasks.csv"'
-        return csv_response
+        return csv_snapshots.get_csv_response(request, project, "tasks", "tasks.csv",
+                                              lambda: services.iter_tasks_csv(project, queryset))
 
     @list_route(methods=["POST"])
     def bulk_create(self, request, **kwargs):
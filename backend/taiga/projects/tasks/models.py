@@ -6,6 +6,7 @@
 # Copyright (c) 2021-present Kaleidos INC
 
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.contenttypes.fields import GenericRelation
 from django.contrib.postgres.fields import ArrayField
 from django.conf import settings
@@ -18,9 +19,10 @@ from taiga.projects.occ import OCCModelMixin
 from taiga.projects.notifications.mixins import WatchedModelMixin
 from taiga.projects.mixins.blocked import BlockedMixin
 from taiga.projects.tagging.models import TaggedMixin
+from taiga.searches.models import SearchableMixin
 
 
-class Task(OCCModelMixin, WatchedModelMixin, BlockedMixin, TaggedMixin, DueDateMixin, models.Model):
+class Task(OCCModelMixin, WatchedModelMixin, BlockedMixin, TaggedMixin, DueDateMixin, SearchableMixin, models.Model):
     user_story = models.ForeignKey(
         "userstories.UserStory",
         null=True,
@@ -102,6 +104,9 @@ class Task(OCCModelMixin, WatchedModelMixin, BlockedMixin, TaggedMixin, DueDateM
         verbose_name_plural = "tasks"
         ordering = ["project", "created_date", "ref"]
         # unique_together = ("ref", "project")
+        indexes = [
+            GinIndex(fields=["search_vector"], name="tasks_search_vector_idx"),
+        ]
 
     def save(self, *args, **kwargs):
         if not self._importing or not self.modified_date:
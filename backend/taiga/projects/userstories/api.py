@@ -10,7 +10,6 @@ from django.db import transaction
 from django.db.models import Max
 
 from django.utils.translation import gettext as _
-from django.http import HttpResponse
 
 from taiga.base import filters as base_filters
 from taiga.base import exceptions as exc
@@ -33,6 +32,8 @@ from taiga.projects.notifications.mixins import AssignedUsersSignalMixin
 from taiga.projects.notifications.mixins import WatchedResourceMixin
 from taiga.projects.notifications.mixins import WatchersViewSetMixin
 from taiga.projects.occ import OCCResourceMixin
+from taiga.projects.services import csv_snapshots
+from taiga.projects.services import facets
 from taiga.projects.tagging.api import TaggedResourceMixin
 from taiga.projects.votes.mixins.viewsets import VotedResourceMixin
 from taiga.projects.votes.mixins.viewsets import VotersViewSetMixin
@@ -344,29 +345,31 @@ class UserStoryViewSet(AssignedUsersSignalMixin, OCCResourceMixin,
         project_id = request.QUERY_PARAMS.get("project", None)
         project = get_object_or_error(Project, request.user, id=project_id)
 
-        filter_backends = self.get_filter_backends()
-        statuses_filter_backends = (f for f in filter_backends if f != filters.UserStoryStatusesFilter)
-        assigned_to_filter_backends = (f for f in filter_backends if f != base_filters.AssignedToFilter)
-        assigned_users_filter_backends = (f for f in filter_backends if f != filters.AssignedUsersFilter)
-        owners_filter_backends = (f for f in filter_backends if f != base_filters.OwnersFilter)
-        epics_filter_backends = (f for f in filter_backends if f != filters.EpicFilter)
-        roles_filter_backends = (f for f in filter_backends if f != base_filters.RoleFilter)
-        tags_filter_backends = (f for f in filter_backends if f != base_filters.TagsFilter)
-
-        queryset = self.get_queryset()
-        # assigned_to is kept for retro-compatibility reasons; but currently filters
-        # are using assigned_users
-        querysets = {
-            "statuses": self.filter_queryset(queryset, filter_backends=statuses_filter_backends),
-            "assigned_to": self.filter_queryset(queryset, filter_backends=assigned_to_filter_backends),
-            "assigned_users": self.filter_queryset(queryset, filter_backends=assigned_users_filter_backends),
-            "owners": self.filter_queryset(queryset, filter_backends=owners_filter_backends),
-            "tags": self.filter_queryset(queryset, filter_backends=tags_filter_backends),
-            "epics": self.filter_queryset(queryset, filter_backends=epics_filter_backends),
-            "roles": self.filter_queryset(queryset, filter_backends=roles_filter_backends)
-        }
-
-        return response.Ok(services.get_userstories_filters_data(project, querysets))
+        def get_filters_data():
+            filter_backends = self.get_filter_backends()
+            statuses_filter_backends = (f for f in filter_backends if f != filters.UserStoryStatusesFilter)
+            assigned_to_filter_backends = (f for f in filter_backends if f != base_filters.AssignedToFilter)
+            assigned_users_filter_backends = (f for f in filter_backends if f != filters.AssignedUsersFilter)
+            owners_filter_backends = (f for f in filter_backends if f != base_filters.OwnersFilter)
+            epics_filter_backends = (f for f in filter_backends if f != filters.EpicFilter)
+            roles_filter_backends = (f for f in filter_backends if f != base_filters.RoleFilter)
+            tags_filter_backends = (f for f in filter_backends if f != base_filters.TagsFilter)
+
+            queryset = self.get_queryset()
+            # assigned_to is kept for retro-compatibility reasons; but currently filters
+            # are using assigned_users
+            querysets = {
+                "statuses": self.filter_queryset(queryset, filter_backends=statuses_filter_backends),
+                "assigned_to": self.filter_queryset(queryset, filter_backends=assigned_to_filter_backends),
+                "assigned_users": self.filter_queryset(queryset, filter_backends=assigned_users_filter_backends),
+                "owners": self.filter_queryset(queryset, filter_backends=owners_filter_backends),
+                "tags": self.filter_queryset(queryset, filter_backends=tags_filter_backends),
+                "epics": self.filter_queryset(queryset, filter_backends=epics_filter_backends),
+                "roles": self.filter_queryset(queryset, filter_backends=roles_filter_backends)
+            }
+            return services.get_userstories_filters_data(project, querysets)
+
+        return response.Ok(facets.get_cached_filters_data("userstories", project, request, get_filters_data))
 
     @list_route(methods=["GET"])
     def csv(self, request):
@@ -376,10 +379,8 @@ class UserStoryViewSet(AssignedUsersSignalMixin, OCCResourceMixin,
 
         project = get_object_or_error(Project, request.user, userstories_csv_uuid=uuid)
         queryset = project.user_stories.all().order_by('ref')
-        data = services.userstories_to_csv(project, queryset)
-        csv_response = HttpResponse(data.getvalue(), content_type='application/csv; charset=utf-8')
-        csv_response['Content-Disposition'] = 'attachment; filename="userstories.csv"'
-        return csv_response
+        return csv_snapshots.get_csv_response(request, project, "userstories", "userstories.csv",
+                                              lambda: services.iter_userstories_csv(project, queryset))
 
     @list_route(methods=["POST"])
     def bulk_create(self, request, **kwargs):
@@ -6,6 +6,7 @@
 # Copyright (c) 2021-present Kaleidos INC
 
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.contenttypes.fields import GenericRelation
 from django.contrib.postgres.fields import ArrayField
 from django.conf import settings
@@ -20,6 +21,7 @@ from taiga.projects.tagging.models import TaggedMixin
 from taiga.projects.occ import OCCModelMixin
 from taiga.projects.notifications.mixins import WatchedModelMixin
 from taiga.projects.mixins.blocked import BlockedMixin
+from taiga.searches.models import SearchableMixin
 
 
 class RolePoints(models.Model):
@@ -62,7 +64,8 @@ class RolePoints(models.Model):
         return self.user_story.project
 
 
-class UserStory(OCCModelMixin, WatchedModelMixin, BlockedMixin, TaggedMixin, DueDateMixin, models.Model):
+class UserStory(OCCModelMixin, WatchedModelMixin, BlockedMixin, TaggedMixin, DueDateMixin, SearchableMixin,
+                models.Model):
     NEW_BACKLOG_ORDER = timestamp_mics
     NEW_SPRINT_ORDER = timestamp_mics
     NEW_KANBAN_ORDER = timestamp_mics
@@ -150,6 +153,9 @@ class UserStory(OCCModelMixin, WatchedModelMixin, BlockedMixin, TaggedMixin, Due
         verbose_name = "user story"
         verbose_name_plural = "user stories"
         ordering = ["project", "backlog_order", "ref"]
+        indexes = [
+            GinIndex(fields=["search_vector"], name="userstories_search_vector_idx"),
+        ]
 
     def save(self, *args, **kwargs):
         if not self._importing or not self.modified_date:
@@ -7,35 +7,33 @@
 
 from typing import List, Optional
 
-import csv
 import io
 from collections import OrderedDict
-from operator import itemgetter
-from contextlib import closing
 
+from django.apps import apps
 from django.conf import settings
 from django.db import connection
 from django.db.models import Q
 from django.utils import timezone
-from django.utils.translation import gettext as _
 
 from psycopg2.extras import execute_values
 
 from taiga.base.utils import db, text
 from taiga.celery import app
 from taiga.events import events
-from taiga.projects.history.services import take_snapshot
+from taiga.projects.history.services import take_snapshots_in_bulk
 from taiga.projects.models import Project, UserStoryStatus, Swimlane
 from taiga.projects.milestones.models import Milestone
 from taiga.projects.notifications.utils import attach_watchers_to_queryset
 from taiga.projects.services import apply_order_updates
+from taiga.projects.services import csv_columns
+from taiga.projects.services import csv_snapshots
+from taiga.projects.services import facets
 from taiga.projects.tasks.models import Task
 from taiga.projects.userstories.apps import connect_userstories_signals
 from taiga.projects.userstories.apps import disconnect_userstories_signals
 from taiga.projects.votes.utils import attach_total_voters_to_queryset
 from taiga.users.models import User
-from taiga.users.gravatar import get_gravatar_id
-from taiga.users.services import get_big_photo_url, get_photo_url
 
 from . import models
 
@@ -115,6 +113,7 @@ def update_userstories_order_in_bulk(
         ids=user_story_ids, content_type="userstories.userstory", projectid=project.pk
     )
     db.update_attr_in_bulk_for_ids(us_orders, field, models.UserStory)
+    csv_snapshots.bump_csv_watermarks(project.id, ("userstories",))
     return us_orders
 
 
@@ -144,6 +143,8 @@ def reset_userstories_kanban_order_in_bulk(
         ids=bulk_userstories, content_type="userstories.userstory", projectid=project.id
     )
 
+    csv_snapshots.bump_csv_watermarks(project.id, ("userstories",))
+
 
 def update_userstories_backlog_or_sprint_order_in_bulk(
     user: User,
@@ -235,6 +236,8 @@ def update_userstories_backlog_or_sprint_order_in_bulk(
     bulk_userstories_objects = project.user_stories.filter(id__in=bulk_userstories)
     bulk_userstories_objects.update(milestone=milestone)
     project.tasks.filter(user_story__in=bulk_userstories).update(milestone=milestone)
+    facets.bump_filters_data_version(project.id)
+    csv_snapshots.bump_csv_watermarks(project.id)
 
     # Generate snapshots for user stories and tasks and calculate if aafected milestones
     # are cosed or open now.
@@ -270,11 +273,9 @@ def _async_tasks_after_backlog_or_sprint_order_change(
         user = None
 
     # Take snapshots for user stories and their taks
-    for userstory in models.UserStory.objects.filter(id__in=userstories_ids):
-        take_snapshot(userstory, user=user)
-
-        for task in userstory.tasks.all():
-            take_snapshot(task, user=user)
+    userstories = list(models.UserStory.objects.filter(id__in=userstories_ids))
+    tasks = list(Task.objects.filter(user_story_id__in=userstories_ids))
+    take_snapshots_in_bulk(userstories + tasks, user=user)
 
     # Check if milestones are open or closed after stories are moved
     for milestone in Milestone.objects.filter(id__in=milestones_ids):
@@ -360,6 +361,8 @@ def update_userstories_kanban_order_in_bulk(
     # execute query for update status, swimlane and kanban_order
     bulk_userstories_objects = project.user_stories.filter(id__in=bulk_userstories)
     bulk_userstories_objects.update(status=status, swimlane=swimlane)
+    facets.bump_filters_data_version(project.id)
+    csv_snapshots.bump_csv_watermarks(project.id)
 
     # Update is_closed attr for user stories and related milestones
     if settings.CELERY_ENABLED:
@@ -392,10 +395,12 @@ def _async_tasks_after_kanban_order_change(userstories_ids, user_id):
     except User.DoesNotExist:
         user = None
 
-    for userstory in models.UserStory.objects.filter(id__in=userstories_ids):
+    userstories = list(models.UserStory.objects.filter(id__in=userstories_ids))
+    for userstory in userstories:
         recalculate_is_closed_for_userstory_and_its_milestone(userstory)
-        # Generate the history entity
-        take_snapshot(userstory, user=user)
+
+    # Generate the history entities
+    take_snapshots_in_bulk(userstories, user=user)
 
 
 def update_userstories_milestone_in_bulk(bulk_data: list, milestone: object):
@@ -434,17 +439,15 @@ def update_userstories_milestone_in_bulk(bulk_data: list, milestone: object):
     Task.objects.filter(user_story_id__in=[e["us_id"] for e in bulk_data]).update(
         milestone=milestone
     )
+    facets.bump_filters_data_version(milestone.project_id)
+    csv_snapshots.bump_csv_watermarks(milestone.project_id)
 
     return us_orders
 
 
 def snapshot_userstories_in_bulk(bulk_data, user):
-    for us_data in bulk_data:
-        try:
-            us = models.UserStory.objects.get(pk=us_data["us_id"])
-            take_snapshot(us, user=user)
-        except models.UserStory.DoesNotExist:
-            pass
+    ids = [us_data["us_id"] for us_data in bulk_data]
+    take_snapshots_in_bulk(models.UserStory.objects.filter(pk__in=ids), user=user)
 
 
 #####################################################
@@ -530,6 +533,16 @@ def _recalculate_is_closed_for_milestone(milestone):
 
 def userstories_to_csv(project, queryset):
     csv_data = io.StringIO()
+    csv_data.writelines(iter_userstories_csv(project, queryset))
+    return csv_data
+
+
+def iter_userstories_csv(project, queryset):
+    """
+    Return an iterator over the CSV text (in chunks) of the userstories of the
+    queryset. The userstories are loaded in batches, so it can be streamed
+    without keeping the whole file in memory.
+    """
     fieldnames = [
         "id",
         "ref",
@@ -583,19 +596,11 @@ def userstories_to_csv(project, queryset):
     for custom_attr in custom_attrs:
         fieldnames.append(custom_attr.name)
 
-    queryset = queryset.prefetch_related(
-        "role_points",
-        "role_points__points",
-        "role_points__role",
-        "tasks",
-        "epics",
-        "attachments",
-        "custom_attributes_values",
-    )
     queryset = queryset.select_related(
         "milestone",
         "project",
         "status",
+        "swimlane",
         "owner",
         "assigned_to",
         "generated_from_issue",
@@ -605,99 +610,105 @@ def userstories_to_csv(project, queryset):
     queryset = attach_total_voters_to_queryset(queryset)
     queryset = attach_watchers_to_queryset(queryset)
 
-    writer = csv.DictWriter(csv_data, fieldnames=fieldnames)
-    writer.writeheader()
-    for us in queryset:
-        row = {
-            "id": us.id,
-            "ref": us.ref,
-            "subject": text.sanitize_csv_text_value(us.subject),
-            "description": text.sanitize_csv_text_value(us.description),
-            "sprint_id": us.milestone.id if us.milestone else None,
-            "sprint": (
-                text.sanitize_csv_text_value(us.milestone.name)
-                if us.milestone
-                else None
-            ),
-            "sprint_estimated_start": (
-                us.milestone.estimated_start if us.milestone else None
-            ),
-            "sprint_estimated_finish": (
-                us.milestone.estimated_finish if us.milestone else None
-            ),
-            "owner": us.owner.username if us.owner else None,
-            "owner_full_name": (
-                text.sanitize_csv_text_value(us.owner.get_full_name())
-                if us.owner
-                else None
-            ),
-            "assigned_to": us.assigned_to.username if us.assigned_to else None,
-            "assigned_to_full_name": (
-                text.sanitize_csv_text_value(us.assigned_to.get_full_name())
-                if us.assigned_to
-                else None
-            ),
-            "assigned_users": ",".join(
-                [assigned_user.username for assigned_user in us.assigned_users.all()]
-            ),
-            "assigned_users_full_name": text.sanitize_csv_text_value(
-                ",".join(
-                    [
-                        assigned_user.get_full_name()
-                        for assigned_user in us.assigned_users.all()
-                    ]
-                )
-            ),
-            "status": us.status.name if us.status else None,
-            "is_closed": us.is_closed,
-            "swimlane": us.swimlane.name if us.swimlane else None,
-            "backlog_order": us.backlog_order,
-            "sprint_order": us.sprint_order,
-            "kanban_order": us.kanban_order,
-            "created_date": us.created_date,
-            "modified_date": us.modified_date,
-            "finish_date": us.finish_date,
-            "client_requirement": us.client_requirement,
-            "team_requirement": us.team_requirement,
-            "attachments": us.attachments.count(),
-            "generated_from_issue": (
-                us.generated_from_issue.ref if us.generated_from_issue else None
-            ),
-            "generated_from_task": (
-                us.generated_from_task.ref if us.generated_from_task else None
-            ),
-            "from_task_ref": us.from_task_ref,
-            "external_reference": us.external_reference,
-            "tasks": ",".join([str(task.ref) for task in us.tasks.all()]),
-            "tags": ",".join(us.tags or []),
-            "watchers": us.watchers,
-            "voters": us.total_voters,
-            "due_date": us.due_date,
-            "due_date_reason": us.due_date_reason,
-            "epics": ",".join([str(epic.ref) for epic in us.epics.all()]),
-        }
+    columns = {
+        "assigned_users": csv_columns.related(User.objects.all(), "assigned_userstories"),
+        "role_points": csv_columns.related(models.RolePoints.objects.all(), "user_story_id",
+                                           "role_id", "points__value"),
+        "tasks": csv_columns.related(Task.objects.all(), "user_story_id", "ref"),
+        "epics": csv_columns.related(apps.get_model("epics", "Epic").objects.all(), "user_stories", "ref"),
+        "attachments": csv_columns.attachments_count(models.UserStory),
+        "custom_attributes_values": csv_columns.custom_attributes_values(models.UserStory),
+    }
+
+    def iter_rows():
+        for us, values in csv_columns.iter_items_with_columns(queryset, columns):
+            row = {
+                "id": us.id,
+                "ref": us.ref,
+                "subject": text.sanitize_csv_text_value(us.subject),
+                "description": text.sanitize_csv_text_value(us.description),
+                "sprint_id": us.milestone.id if us.milestone else None,
+                "sprint": (
+                    text.sanitize_csv_text_value(us.milestone.name)
+                    if us.milestone
+                    else None
+                ),
+                "sprint_estimated_start": (
+                    us.milestone.estimated_start if us.milestone else None
+                ),
+                "sprint_estimated_finish": (
+                    us.milestone.estimated_finish if us.milestone else None
+                ),
+                "owner": us.owner.username if us.owner else None,
+                "owner_full_name": (
+                    text.sanitize_csv_text_value(us.owner.get_full_name())
+                    if us.owner
+                    else None
+                ),
+                "assigned_to": us.assigned_to.username if us.assigned_to else None,
+                "assigned_to_full_name": (
+                    text.sanitize_csv_text_value(us.assigned_to.get_full_name())
+                    if us.assigned_to
+                    else None
+                ),
+                "assigned_users": ",".join(
+                    [assigned_user.username for assigned_user in values["assigned_users"]]
+                ),
+                "assigned_users_full_name": text.sanitize_csv_text_value(
+                    ",".join(
+                        [
+                            assigned_user.get_full_name()
+                            for assigned_user in values["assigned_users"]
+                        ]
+                    )
+                ),
+                "status": us.status.name if us.status else None,
+                "is_closed": us.is_closed,
+                "swimlane": us.swimlane.name if us.swimlane else None,
+                "backlog_order": us.backlog_order,
+                "sprint_order": us.sprint_order,
+                "kanban_order": us.kanban_order,
+                "created_date": us.created_date,
+                "modified_date": us.modified_date,
+                "finish_date": us.finish_date,
+                "client_requirement": us.client_requirement,
+                "team_requirement": us.team_requirement,
+                "attachments": values["attachments"],
+                "generated_from_issue": (
+                    us.generated_from_issue.ref if us.generated_from_issue else None
+                ),
+                "generated_from_task": (
+                    us.generated_from_task.ref if us.generated_from_task else None
+                ),
+                "from_task_ref": us.from_task_ref,
+                "external_reference": us.external_reference,
+                "tasks": ",".join([str(ref) for ref in values["tasks"]]),
+                "tags": ",".join(us.tags or []),
+                "watchers": us.watchers,
+                "voters": us.total_voters,
+                "due_date": us.due_date,
+                "due_date_reason": us.due_date_reason,
+                "epics": ",".join([str(ref) for ref in values["epics"]]),
+            }
 
-        us_role_points_by_role_id = {
-            us_rp.role.id: us_rp.points.value for us_rp in us.role_points.all()
-        }
-        for role in roles:
-            row["{}-points".format(role.slug)] = us_role_points_by_role_id.get(
-                role.id, 0
-            )
+            us_role_points_by_role_id = dict(values["role_points"])
+            for role in roles:
+                row["{}-points".format(role.slug)] = us_role_points_by_role_id.get(
+                    role.id, 0
+                )
 
-        row["total-points"] = us.get_total_points()
+            # The same as UserStory.get_total_points
+            not_null_points = [value for value in us_role_points_by_role_id.values() if value is not None]
+            row["total-points"] = sum(not_null_points) if not_null_points else None
 
-        for custom_attr in custom_attrs:
-            if not hasattr(us, "custom_attributes_values"):
-                continue
-            value = us.custom_attributes_values.attributes_values.get(
-                str(custom_attr.id), None
-            )
-            row[custom_attr.name] = text.sanitize_csv_text_value(value)
+            attributes_values = values["custom_attributes_values"]
+            for custom_attr in custom_attrs:
+                value = attributes_values.get(str(custom_attr.id), None)
+                row[custom_attr.name] = text.sanitize_csv_text_value(value)
 
-        writer.writerow(row)
+            yield row
 
-    return csv_data
+    return text.iter_csv(fieldnames, iter_rows())
 
 
 #####################################################
@@ -705,563 +716,32 @@ def userstories_to_csv(project, queryset):
 #####################################################
 
 
-def _get_userstories_statuses(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(
-        queryset.query, connection, None
-    )
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-
-    extra_sql = """
-     WITH "us_counters" AS (
-         SELECT DISTINCT "userstories_userstory"."status_id" "status_id",
-                         "userstories_userstory"."id" "us_id"
-                    FROM "userstories_userstory"
-              INNER JOIN "projects_project"
-                      ON ("userstories_userstory"."project_id" = "projects_project"."id")
-         LEFT OUTER JOIN "epics_relateduserstory"
-                      ON "userstories_userstory"."id" = "epics_relateduserstory"."user_story_id"
-         LEFT OUTER JOIN "userstories_userstory_assigned_users"
-                      ON "userstories_userstory"."id" = "userstories_userstory_assigned_users"."userstory_id"
-                   WHERE {where}
-            ),
-             "counters" AS (
-                  SELECT "status_id",
-                         COUNT("status_id") "count"
-                    FROM "us_counters"
-                GROUP BY "status_id"
-            )
-
-                 SELECT "projects_userstorystatus"."id",
-                        "projects_userstorystatus"."name",
-                        "projects_userstorystatus"."color",
-                        "projects_userstorystatus"."order",
-                        COALESCE("counters"."count", 0)
-                   FROM "projects_userstorystatus"
-        LEFT OUTER JOIN "counters"
-                     ON "counters"."status_id" = "projects_userstorystatus"."id"
-                  WHERE "projects_userstorystatus"."project_id" = %s
-               ORDER BY "projects_userstorystatus"."order";
-    """.format(
-        where=where
-    )
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + [project.id])
-        rows = cursor.fetchall()
-
-    result = []
-    for id, name, color, order, count in rows:
-        result.append(
-            {
-                "id": id,
-                "name": _(name),
-                "color": color,
-                "order": order,
-                "count": count,
-            }
-        )
-    return sorted(result, key=itemgetter("order"))
-
-
-def _get_userstories_assigned_to(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(
-        queryset.query, connection, None
-    )
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-
-    extra_sql = """
-     WITH "us_counters" AS (
-         SELECT DISTINCT "userstories_userstory"."assigned_to_id" "assigned_to_id",
-                         "userstories_userstory"."id" "us_id"
-                    FROM "userstories_userstory"
-              INNER JOIN "projects_project"
-                      ON ("userstories_userstory"."project_id" = "projects_project"."id")
-                INNER JOIN "projects_userstorystatus"
-                    ON ("userstories_userstory"."status_id" = "projects_userstorystatus"."id")
-         LEFT OUTER JOIN "epics_relateduserstory"
-                      ON "userstories_userstory"."id" = "epics_relateduserstory"."user_story_id"
-         LEFT OUTER JOIN "userstories_userstory_assigned_users"
-                      ON "userstories_userstory"."id" = "userstories_userstory_assigned_users"."userstory_id"
-                   WHERE {where}
-            ),
-
-            "counters" AS (
-                 SELECT "assigned_to_id",
-                        COUNT("assigned_to_id")
-                   FROM "us_counters"
-               GROUP BY "assigned_to_id"
-            )
-
-                 SELECT "projects_membership"."user_id" "user_id",
-                        "users_user"."full_name" "full_name",
-                        "users_user"."username" "username",
-                        COALESCE("counters".count, 0) "count"
-                   FROM "projects_membership"
-        LEFT OUTER JOIN "counters"
-                     ON ("projects_membership"."user_id" = "counters"."assigned_to_id")
-             INNER JOIN "users_user"
-                     ON ("projects_membership"."user_id" = "users_user"."id")
-                  WHERE "projects_membership"."project_id" = %s AND "projects_membership"."user_id" IS NOT NULL
-
-        -- unassigned userstories
-        UNION
-
-                 SELECT NULL "user_id",
-                        NULL "full_name",
-                        NULL "username",
-                        count(coalesce("assigned_to_id", -1)) "count"
-                   FROM "userstories_userstory"
-             INNER JOIN "projects_project"
-                     ON ("userstories_userstory"."project_id" = "projects_project"."id")
-             INNER JOIN "projects_userstorystatus"
-                    ON ("userstories_userstory"."status_id" = "projects_userstorystatus"."id")
-        LEFT OUTER JOIN "epics_relateduserstory"
-                     ON ("userstories_userstory"."id" = "epics_relateduserstory"."user_story_id")
-        LEFT OUTER JOIN "userstories_userstory_assigned_users"
-                      ON "userstories_userstory"."id" = "userstories_userstory_assigned_users"."userstory_id"
-                  WHERE {where} AND "userstories_userstory"."assigned_to_id" IS NULL
-               GROUP BY "assigned_to_id"
-    """.format(
-        where=where
-    )
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + [project.id] + where_params)
-        rows = cursor.fetchall()
-
-    result = []
-    none_valued_added = False
-    for id, full_name, username, count in rows:
-        result.append(
-            {
-                "id": id,
-                "full_name": full_name or username or "",
-                "count": count,
-            }
-        )
-
-        if id is None:
-            none_valued_added = True
-
-    # If there was no userstory with null assigned_to we manually add it
-    if not none_valued_added:
-        result.append(
-            {
-                "id": None,
-                "full_name": "",
-                "count": 0,
-            }
-        )
-
-    return sorted(result, key=itemgetter("full_name"))
-
-
-def _get_userstories_assigned_users(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(
-        queryset.query, connection, None
-    )
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-
-    extra_sql = """
-     WITH "us_counters" AS (
-         SELECT DISTINCT COALESCE("userstories_userstory_assigned_users"."user_id",
-            "userstories_userstory"."assigned_to_id") as "assigned_user_id",
-                "userstories_userstory"."id" "us_id"
-                    FROM "userstories_userstory"
-              LEFT JOIN "userstories_userstory_assigned_users"
-                      ON "userstories_userstory_assigned_users"."userstory_id" = "userstories_userstory"."id"
-              INNER JOIN "projects_project"
-                      ON ("userstories_userstory"."project_id" = "projects_project"."id")
-                INNER JOIN "projects_userstorystatus"
-                    ON ("userstories_userstory"."status_id" = "projects_userstorystatus"."id")
-              LEFT OUTER JOIN "epics_relateduserstory"
-                      ON "userstories_userstory"."id" = "epics_relateduserstory"."user_story_id"
-                   WHERE {where}
-            ),
-
-            "counters" AS (
-                 SELECT "assigned_user_id",
-                        COUNT("assigned_user_id")
-                   FROM "us_counters"
-               GROUP BY "assigned_user_id"
-            )
-
-                 SELECT "projects_membership"."user_id" "user_id",
-                        "users_user"."full_name" "full_name",
-                        "users_user"."username" "username",
-                        COALESCE("counters".count, 0) "count",
-                        "users_user"."photo" "photo",
-                        "users_user"."email" "email"
-                   FROM "projects_membership"
-        LEFT OUTER JOIN "counters"
-                     ON ("projects_membership"."user_id" = "counters"."assigned_user_id")
-             INNER JOIN "users_user"
-                     ON ("projects_membership"."user_id" = "users_user"."id")
-                  WHERE "projects_membership"."project_id" = %s AND "projects_membership"."user_id" IS NOT NULL
-
-        -- unassigned userstories
-        UNION
-
-                 SELECT NULL "user_id",
-                        NULL "full_name",
-                        NULL "username",
-                        count(coalesce("assigned_to_id", -1)) "count",
-                        NULL "photo",
-                        NULL "email"
-                   FROM "userstories_userstory"
-             INNER JOIN "projects_project"
-                     ON ("userstories_userstory"."project_id" = "projects_project"."id")
-            INNER JOIN "projects_userstorystatus"
-                ON ("userstories_userstory"."status_id" = "projects_userstorystatus"."id")
-        LEFT OUTER JOIN "epics_relateduserstory"
-                     ON ("userstories_userstory"."id" = "epics_relateduserstory"."user_story_id")
-                  WHERE {where} AND "userstories_userstory"."id" NOT IN (
-                    SELECT "userstories_userstory_assigned_users"."userstory_id" FROM
-                      "userstories_userstory_assigned_users"
-                      WHERE "userstories_userstory_assigned_users"."userstory_id" = "userstories_userstory"."id"
-                  ) AND "userstories_userstory"."assigned_to_id" IS NULL
-               GROUP BY "username";
-    """.format(
-        where=where
-    )
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + [project.id] + where_params)
-        rows = cursor.fetchall()
-
-    result = []
-    none_valued_added = False
-    for id, full_name, username, count, photo, email in rows:
-        result.append(
-            {
-                "id": id,
-                "full_name": full_name or username or "",
-                "count": count,
-                "photo": get_photo_url(photo),
-                "big_photo": get_big_photo_url(photo),
-                "gravatar_id": get_gravatar_id(email) if email else None,
-            }
-        )
-
-        if id is None:
-            none_valued_added = True
-
-    # If there was no userstory with null assigned_to we manually add it
-    if not none_valued_added:
-        result.append(
-            {
-                "id": None,
-                "full_name": "",
-                "count": 0,
-                "photo": None,
-                "big_photo": None,
-                "gravatar_id": None,
-            }
-        )
-
-    return sorted(result, key=itemgetter("full_name"))
-
-
-def _get_userstories_owners(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(
-        queryset.query, connection, None
-    )
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-
-    extra_sql = """
-     WITH "us_counters" AS(
-         SELECT DISTINCT "userstories_userstory"."owner_id" "owner_id",
-                         "userstories_userstory"."id" "us_id"
-                    FROM "userstories_userstory"
-              INNER JOIN "projects_project"
-                      ON ("userstories_userstory"."project_id" = "projects_project"."id")
-                INNER JOIN "projects_userstorystatus"
-                    ON ("userstories_userstory"."status_id" = "projects_userstorystatus"."id")
-         LEFT OUTER JOIN "epics_relateduserstory"
-                      ON ("userstories_userstory"."id" = "epics_relateduserstory"."user_story_id")
-         LEFT OUTER JOIN "userstories_userstory_assigned_users"
-                      ON "userstories_userstory"."id" = "userstories_userstory_assigned_users"."userstory_id"
-                   WHERE {where}
-            ),
-
-            "counters" AS (
-                 SELECT "owner_id",
-                        COUNT("owner_id")
-                   FROM "us_counters"
-               GROUP BY "owner_id"
-            )
-
-                 SELECT "projects_membership"."user_id" "user_id",
-                        "users_user"."full_name",
-                        "users_user"."username",
-                        COALESCE("counters".count, 0) "count",
-                        "users_user"."photo" "photo",
-                        "users_user"."email" "email"
-                   FROM "projects_membership"
-        LEFT OUTER JOIN "counters"
-                     ON ("projects_membership"."user_id" = "counters"."owner_id")
-             INNER JOIN "users_user"
-                     ON ("projects_membership"."user_id" = "users_user"."id")
-                  WHERE "projects_membership"."project_id" = %s AND "projects_membership"."user_id" IS NOT NULL
-
-        -- System users
-                  UNION
-
-                 SELECT "users_user"."id" "user_id",
-                        "users_user"."full_name" "full_name",
-                        "users_user"."username" "username",
-                        COALESCE("counters"."count", 0) "count",
-                        NULL "photo",
-                        NULL "email"
-                   FROM "users_user"
-        LEFT OUTER JOIN "counters"
-                     ON ("users_user"."id" = "counters"."owner_id")
-                  WHERE ("users_user"."is_system" IS TRUE)
-    """.format(
-        where=where
-    )
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + [project.id])
-        rows = cursor.fetchall()
-
-    result = []
-    for id, full_name, username, count, photo, email in rows:
-        if count > 0:
-            result.append(
-                {
-                    "id": id,
-                    "full_name": full_name or username or "",
-                    "count": count,
-                    "photo": get_photo_url(photo),
-                    "big_photo": get_big_photo_url(photo),
-                    "gravatar_id": get_gravatar_id(email) if email else None,
-                }
-            )
-    return sorted(result, key=itemgetter("full_name"))
-
-
-def _get_userstories_tags(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(
-        queryset.query, connection, None
-    )
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-
-    extra_sql = """
-           WITH "userstories_tags" AS (
-                   SELECT "tag",
-                          COUNT("tag") "counter"
-                     FROM (
-                      SELECT DISTINCT "userstories_userstory"."id" "us_id",
-                                       UNNEST("userstories_userstory"."tags") "tag"
-                                 FROM "userstories_userstory"
-                        INNER JOIN "projects_project"
-                            ON ("userstories_userstory"."project_id" = "projects_project"."id")
-                        INNER JOIN "projects_userstorystatus"
-                            ON ("userstories_userstory"."status_id" = "projects_userstorystatus"."id")
-                        LEFT OUTER JOIN "epics_relateduserstory"
-                            ON ("userstories_userstory"."id" = "epics_relateduserstory"."user_story_id")
-                        LEFT OUTER JOIN "userstories_userstory_assigned_users"
-                            ON "userstories_userstory"."id" = "userstories_userstory_assigned_users"."userstory_id"
-                                WHERE {where}
-                          ) "tags"
-                    GROUP BY "tag"),
-
-                "project_tags" AS (
-                       SELECT reduce_dim("tags_colors") "tag_color"
-                         FROM "projects_project"
-                        WHERE "id"=%s)
-
-         SELECT "tag_color"[1] "tag",
-                "tag_color"[2] "color",
-                COALESCE("userstories_tags"."counter", 0) "counter"
-           FROM "project_tags"
-LEFT OUTER JOIN "userstories_tags"
-             ON "project_tags"."tag_color"[1] = "userstories_tags"."tag"
-       ORDER BY "tag"
-    """.format(
-        where=where
-    )
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + [project.id])
-        rows = cursor.fetchall()
-
-    result = []
-    for name, color, count in rows:
-        result.append(
-            {
-                "name": name,
-                "color": color,
-                "count": count,
-            }
-        )
-    return sorted(result, key=itemgetter("name"))
+def _get_userstories_epics(project, counters):
+    epic_model = apps.get_model("epics", "Epic")
+    rows = epic_model.objects.filter(project_id=project.id).values_list("id", "ref", "subject", "epics_order")
 
-
-def _get_userstories_epics(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(
-        queryset.query, connection, None
-    )
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-    extra_sql = """
-       WITH "counters" AS (
-               SELECT "epics_relateduserstory"."epic_id" AS "epic_id",
-                      count("epics_relateduserstory"."id") AS "counter"
-                 FROM "epics_relateduserstory"
-           INNER JOIN "userstories_userstory"
-                   ON ("userstories_userstory"."id" = "epics_relateduserstory"."user_story_id")
-           INNER JOIN "projects_project"
-                   ON ("userstories_userstory"."project_id" = "projects_project"."id")
-            INNER JOIN "projects_userstorystatus"
-                    ON ("userstories_userstory"."status_id" = "projects_userstorystatus"."id")
-            LEFT OUTER JOIN "userstories_userstory_assigned_users"
-                ON "userstories_userstory"."id" = "userstories_userstory_assigned_users"."userstory_id"
-                WHERE {where}
-             GROUP BY "epics_relateduserstory"."epic_id"
-       )
-
-         -- User stories with no epics (return results only if there are userstories)
-               SELECT NULL AS "id",
-                      NULL AS "ref",
-                      NULL AS "subject",
-                      0 AS "order",
-                      count(COALESCE("epics_relateduserstory"."epic_id", -1)) AS "counter"
-                 FROM "userstories_userstory"
-      LEFT OUTER JOIN "epics_relateduserstory"
-                   ON ("epics_relateduserstory"."user_story_id" = "userstories_userstory"."id")
-           INNER JOIN "projects_project"
-                   ON ("userstories_userstory"."project_id" = "projects_project"."id")
-            INNER JOIN "projects_userstorystatus"
-                ON ("userstories_userstory"."status_id" = "projects_userstorystatus"."id")
-         LEFT OUTER JOIN "userstories_userstory_assigned_users"
-                      ON "userstories_userstory"."id" = "userstories_userstory_assigned_users"."userstory_id"
-                WHERE {where} AND "epics_relateduserstory"."epic_id" IS NULL
-             GROUP BY "epics_relateduserstory"."epic_id"
-
-                UNION
-
-               SELECT "epics_epic"."id" AS "id",
-                      "epics_epic"."ref" AS "ref",
-                      "epics_epic"."subject" AS "subject",
-                      "epics_epic"."epics_order" AS "order",
-                      COALESCE("counters"."counter", 0) AS "counter"
-                 FROM "epics_epic"
-      LEFT OUTER JOIN "counters"
-                   ON ("counters"."epic_id" = "epics_epic"."id")
-                WHERE "epics_epic"."project_id" = %s
-        """.format(
-        where=where
-    )
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + where_params + [project.id])
-        rows = cursor.fetchall()
-
-    result = []
-    for id, ref, subject, order, count in rows:
+    # User stories with no epics
+    result = [
+        {
+            "id": None,
+            "ref": None,
+            "subject": None,
+            "order": 0,
+            "count": counters.get(None, 0),
+        }
+    ]
+    for id, ref, subject, order in rows:
         result.append(
             {
                 "id": id,
                 "ref": ref,
                 "subject": subject,
                 "order": order,
-                "count": count,
+                "count": counters.get(id, 0),
             }
         )
 
-    result = sorted(result, key=lambda k: (k["order"], k["id"] or 0))
-
-    # Add row when there is no user stories with no epics
-    if result == [] or result[0]["id"] is not None:
-        result.insert(
-            0,
-            {
-                "id": None,
-                "ref": None,
-                "subject": None,
-                "order": 0,
-                "count": 0,
-            },
-        )
-    return result
-
-
-def _get_userstories_roles(project, queryset):
-    compiler = connection.ops.compiler(queryset.query.compiler)(
-        queryset.query, connection, None
-    )
-    queryset_where_tuple = queryset.query.where.as_sql(compiler, connection)
-    where = queryset_where_tuple[0]
-    where_params = queryset_where_tuple[1]
-
-    extra_sql = """
-     WITH "us_counters" AS (
-         SELECT DISTINCT "userstories_userstory"."status_id" "status_id",
-                         "userstories_userstory"."id" "us_id",
-                         "projects_membership"."role_id" "role_id"
-                    FROM "userstories_userstory"
-              INNER JOIN "projects_project"
-                      ON ("userstories_userstory"."project_id" = "projects_project"."id")
-            INNER JOIN "projects_userstorystatus"
-                ON ("userstories_userstory"."status_id" = "projects_userstorystatus"."id")
-         LEFT OUTER JOIN "epics_relateduserstory"
-                      ON "userstories_userstory"."id" = "epics_relateduserstory"."user_story_id"
-         LEFT OUTER JOIN "userstories_userstory_assigned_users"
-                      ON "userstories_userstory_assigned_users"."userstory_id" = "userstories_userstory"."id"
-         LEFT OUTER JOIN "projects_membership"
-                      ON "projects_membership"."user_id" = "userstories_userstory"."assigned_to_id"
-                      OR "projects_membership"."user_id" = "userstories_userstory_assigned_users"."user_id"
-                   WHERE {where}
-            ),
-             "counters" AS (
-                  SELECT "role_id" as "role_id",
-                         COUNT("role_id") "count"
-                    FROM "us_counters"
-                GROUP BY "role_id"
-            )
-
-                 SELECT "users_role"."id",
-                        "users_role"."name",
-                        "users_role"."order",
-                        COALESCE("counters"."count", 0)
-                   FROM "users_role"
-        LEFT OUTER JOIN "counters"
-                     ON "counters"."role_id" = "users_role"."id"
-                  WHERE "users_role"."project_id" = %s
-               ORDER BY "users_role"."order";
-    """.format(
-        where=where
-    )
-
-    with closing(connection.cursor()) as cursor:
-        cursor.execute(extra_sql, where_params + [project.id])
-        rows = cursor.fetchall()
-
-    result = []
-    for id, name, order, count in rows:
-        result.append(
-            {
-                "id": id,
-                "name": _(name),
-                "color": None,
-                "order": order,
-                "count": count,
-            }
-        )
-    return sorted(result, key=itemgetter("order"))
+    return sorted(result, key=lambda k: (k["order"], k["id"] or 0))
 
 
 def get_userstories_filters_data(project, querysets):
@@ -1269,21 +749,42 @@ def get_userstories_filters_data(project, querysets):
     Given a project and an userstories queryset, return a simple data structure
     of all possible filters for the userstories in the queryset.
     """
+    table = '"userstories_userstory"'
+    counters = facets.count_facets(project, models.UserStory, OrderedDict([
+        ("statuses", facets.Facet(querysets["statuses"], table + '."status_id"', facets.FACET_VALUE)),
+        ("assigned_to", facets.Facet(querysets["assigned_to"], table + '."assigned_to_id"', facets.FACET_VALUE)),
+        ("assigned_users", facets.Facet(querysets["assigned_users"],
+                                        'COALESCE("userstories_userstory_assigned_users"."user_id", '
+                                        '"userstories_userstory"."assigned_to_id")',
+                                        facets.FACET_VALUE)),
+        ("owners", facets.Facet(querysets["owners"], table + '."owner_id"', facets.FACET_VALUE)),
+        ("tags", facets.Facet(querysets["tags"], table + '."tags"', facets.FACET_TAGS)),
+        ("epics", facets.Facet(querysets["epics"], '"epics_relateduserstory"."epic_id"', facets.FACET_VALUE)),
+        ("roles", facets.Facet(querysets["roles"],
+                               'ARRAY["userstories_userstory"."assigned_to_id", '
+                               '"userstories_userstory_assigned_users"."user_id"]',
+                               facets.FACET_ROLES)),
+    ]), joins="""
+         LEFT OUTER JOIN "projects_userstorystatus"
+                      ON ("userstories_userstory"."status_id" = "projects_userstorystatus"."id")
+         LEFT OUTER JOIN "epics_relateduserstory"
+                      ON ("userstories_userstory"."id" = "epics_relateduserstory"."user_story_id")
+         LEFT OUTER JOIN "userstories_userstory_assigned_users"
+                      ON ("userstories_userstory"."id" = "userstories_userstory_assigned_users"."userstory_id")
+    """)
+
     data = OrderedDict(
         [
-            ("statuses", _get_userstories_statuses(project, querysets["statuses"])),
-            (
-                "assigned_to",
-                _get_userstories_assigned_to(project, querysets["assigned_to"]),
-            ),
+            ("statuses", facets.get_choices_facet_data(project, UserStoryStatus, counters["statuses"])),
+            ("assigned_to", facets.get_assigned_users_facet_data(project, counters["assigned_to"])),
             (
                 "assigned_users",
-                _get_userstories_assigned_users(project, querysets["assigned_users"]),
+                facets.get_assigned_users_facet_data(project, counters["assigned_users"], with_photos=True),
             ),
-            ("owners", _get_userstories_owners(project, querysets["owners"])),
-            ("tags", _get_userstories_tags(project, querysets["tags"])),
-            ("epics", _get_userstories_epics(project, querysets["epics"])),
-            ("roles", _get_userstories_roles(project, querysets["roles"])),
+            ("owners", facets.get_owners_facet_data(project, counters["owners"], with_photos=True)),
+            ("tags", facets.get_tags_facet_data(project, counters["tags"])),
+            ("epics", _get_userstories_epics(project, counters["epics"])),
+            ("roles", facets.get_roles_facet_data(project, counters["roles"])),
         ]
     )
 
@@ -6,6 +6,7 @@
 # Copyright (c) 2021-present Kaleidos INC
 
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
 from django.contrib.contenttypes.fields import GenericRelation
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
@@ -16,9 +17,10 @@ from taiga.base.utils.slug import slugify_uniquely_for_queryset
 from taiga.base.utils.time import timestamp_ms
 from taiga.projects.notifications.mixins import WatchedModelMixin
 from taiga.projects.occ import OCCModelMixin
+from taiga.searches.models import SearchableMixin
 
 
-class WikiPage(OCCModelMixin, WatchedModelMixin, models.Model):
+class WikiPage(OCCModelMixin, WatchedModelMixin, SearchableMixin, models.Model):
     project = models.ForeignKey(
         "projects.Project",
         null=False,
@@ -60,6 +62,9 @@ class WikiPage(OCCModelMixin, WatchedModelMixin, models.Model):
         verbose_name_plural = "wiki pages"
         ordering = ["project", "slug"]
         unique_together = ("project", "slug",)
+        indexes = [
+            GinIndex(fields=["search_vector"], name="wiki_search_vector_idx"),
+        ]
 
     def __str__(self):
         return "project {0} - {1}".format(self.project_id, self.slug)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+# Examples:
+# python manage.py update_search_vectors
+# python manage.py update_search_vectors --only-missing --batch-size 5000
+# python manage.py update_search_vectors --project 1 --model issues.Issue
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from taiga.searches import services
+
+
+class Command(BaseCommand):
+    help = 'Recompute, in batches, the search vectors of epics, user stories, tasks, issues and wiki pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model',
+                            action='append',
+                            dest='models',
+                            default=None,
+                            help='Selected model (for example issues.Issue), all the searchable ones by default')
+        parser.add_argument('--project',
+                            action='store',
+                            dest='project',
+                            type=int,
+                            default=None,
+                            help='Selected project id')
+        parser.add_argument('--batch-size',
+                            action='store',
+                            dest='batch_size',
+                            type=int,
+                            default=1000,
+                            help='Number of ids updated in every batch')
+        parser.add_argument('--only-missing',
+                            action='store_true',
+                            dest='only_missing',
+                            default=False,
+                            help='Only update the rows without search vector')
+
+    @override_settings(DEBUG=False)
+    def handle(self, *args, **options):
+        searchable_models = [model_label for model_label, _ in services.SEARCHABLE_MODELS]
+        models = options["models"] or searchable_models
+        for model_label in models:
+            if model_label not in searchable_models:
+                raise CommandError("Invalid model {}, choose one of: {}".format(model_label,
+                                                                               ", ".join(searchable_models)))
+
+        for model_label in models:
+            updated = 0
+            for count, batch_updated in enumerate(services.update_search_vectors(model_label,
+                                                                                 batch_size=options["batch_size"],
+                                                                                 only_missing=options["only_missing"],
+                                                                                 project_id=options["project"])):
+                updated += batch_updated
+                if (count + 1) % 100 == 0:
+                    self.stdout.write("{}: {} rows updated".format(model_label, updated))
+
+            self.stdout.write("{}: {} search vectors updated".format(model_label, updated))
@@ -5,3 +5,16 @@
 #
 # Copyright (c) 2021-present Kaleidos INC
 
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class SearchableMixin(models.Model):
+    # Maintained by the `*_search_vector_update` triggers of the database
+    # (see the migration 0069 of projects).
+    search_vector = SearchVectorField(null=True, blank=True, editable=False, serialize=False,
+                                      verbose_name=_("search vector"))
+
+    class Meta:
+        abstract = True
@@ -27,9 +27,13 @@ class UserStorySearchResultsSerializer(serializers.LightSerializer):
     milestone_slug = MethodField()
 
     def get_milestone_name(self, obj):
+        if hasattr(obj, "milestone_name_attr"):
+            return obj.milestone_name_attr
         return obj.milestone.name if obj.milestone else None
 
     def get_milestone_slug(self, obj):
+        if hasattr(obj, "milestone_slug_attr"):
+            return obj.milestone_slug_attr
         return obj.milestone.slug if obj.milestone else None
 
     def get_total_points(self, obj):
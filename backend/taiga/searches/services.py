@@ -5,81 +5,237 @@
 #
 # Copyright (c) 2021-present Kaleidos INC
 
+import hashlib
+from collections import namedtuple
+
 from django.apps import apps
 from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
 from taiga.base.utils.db import to_tsquery
-from taiga.projects.userstories.utils import attach_total_points
 
 MAX_RESULTS = getattr(settings, "SEARCHES_MAX_RESULTS", 150)
-
-
-def search_epics(project, text):
-    model = apps.get_model("epics", "Epic")
-    queryset = model.objects.filter(project_id=project.pk)
-    table = "epics_epic"
-    return _search_items(queryset, table, text)
-
-
-def search_user_stories(project, text):
-    model = apps.get_model("userstories", "UserStory")
-    queryset = model.objects.filter(project_id=project.pk)
-    table = "userstories_userstory"
-    return _search_items(queryset, table, text)
-
-
-def search_tasks(project, text):
-    model = apps.get_model("tasks", "Task")
-    queryset = model.objects.filter(project_id=project.pk)
-    table = "tasks_task"
-    return _search_items(queryset, table, text)
-
-
-def search_issues(project, text):
-    model = apps.get_model("issues", "Issue")
-    queryset = model.objects.filter(project_id=project.pk)
-    table = "issues_issue"
-    return _search_items(queryset, table, text)
-
-
-def search_wiki_pages(project, text):
-    model = apps.get_model("wiki", "WikiPage")
-    queryset = model.objects.filter(project_id=project.pk)
-    tsquery = "to_tsquery('simple', %s)"
-    tsvector = """
-        setweight(to_tsvector('simple', coalesce(wiki_wikipage.slug)), 'A') ||
-        setweight(to_tsvector('simple', coalesce(wiki_wikipage.content)), 'B')
+TYPEAHEAD_MAX_RESULTS = getattr(settings, "SEARCHES_TYPEAHEAD_MAX_RESULTS", 10)
+TYPEAHEAD_CACHE_TIMEOUT = getattr(settings, "SEARCHES_TYPEAHEAD_CACHE_TIMEOUT", 30)
+
+# Models with a search_vector column, and the column of each one whose update
+# fires the trigger that recomputes it.
+SEARCHABLE_MODELS = (
+    ("epics.Epic", "subject"),
+    ("userstories.UserStory", "subject"),
+    ("tasks.Task", "subject"),
+    ("issues.Issue", "subject"),
+    ("wiki.WikiPage", "slug"),
+)
+
+
+# The entities returned by `search`, in the order of the response, with their
+# model and the permission needed to view them.
+SEARCH_TYPES = (
+    ("epics", "epics.Epic", "view_epics"),
+    ("userstories", "userstories.UserStory", "view_us"),
+    ("tasks", "tasks.Task", "view_tasks"),
+    ("issues", "issues.Issue", "view_issues"),
+    ("wikipages", "wiki.WikiPage", "view_wiki_pages"),
+)
+
+SearchResult = namedtuple("SearchResult", ["type", "id", "ref", "subject", "slug", "status_id",
+                                           "assigned_to_id", "total_points_attr", "milestone_name_attr",
+                                           "milestone_slug_attr", "rank"])
+
+
+def search(project, text, types):
     """
+    Search `text` in the entities of `types` (keys of SEARCH_TYPES) of a
+    project with a single UNION ALL query of the (ranked and limited) results
+    of every type.
 
-    return _search_by_query(queryset, tsquery, tsvector, text)
-
-
-def _search_items(queryset, table, text):
-    tsquery = "to_tsquery('simple', %s)"
-    tsvector = """
-        setweight(to_tsvector('simple',
-                              coalesce({table}.subject) || ' ' ||
-                              coalesce({table}.ref)), 'A') ||
-        setweight(to_tsvector('simple', coalesce(inmutable_array_to_string({table}.tags))), 'B') ||
-        setweight(to_tsvector('simple', coalesce({table}.description)), 'C')
-    """.format(table=table)
-    return _search_by_query(queryset, tsquery, tsvector, text)
+    Return a dict with a list of `SearchResult` rows, sorted by rank, per type.
+    """
+    result = {key: [] for key in types}
+    branches = [_get_search_branch_sql(key, model_label, bool(text))
+                for key, model_label, perm in SEARCH_TYPES if key in types]
+    if not branches:
+        return result
+
+    # Every branch is already sorted (by rank and the default order of its
+    # model), and the rows are split per type
+    sql = "\n UNION ALL \n".join(branches)
+    params = {"project_id": project.pk, "text": to_tsquery(text), "limit": MAX_RESULTS}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for row in cursor.fetchall():
+            row = SearchResult(*row)
+            result[row.type].append(row)
+
+    return result
+
+
+def _get_search_branch_sql(key, model_label, with_text):
+    model = apps.get_model(model_label)
+    columns = {
+        "ref": "NULL::integer",
+        "subject": "NULL::text",
+        "slug": "NULL::text",
+        "status_id": "NULL::integer",
+        "assigned_to_id": "NULL::integer",
+        "total_points": "NULL::double precision",
+        "milestone_name": "NULL::text",
+        "milestone_slug": "NULL::text",
+    }
+    joins = ""
+
+    if key == "wikipages":
+        columns["slug"] = "item.slug"
+    else:
+        columns.update({
+            "ref": "item.ref",
+            "subject": "item.subject",
+            "status_id": "item.status_id",
+        })
+
+    if key in ("epics", "tasks", "issues"):
+        columns["assigned_to_id"] = "item.assigned_to_id"
+
+    if key == "userstories":
+        columns.update({
+            "total_points": """(SELECT SUM(projects_points.value)
+                                  FROM userstories_rolepoints
+                            INNER JOIN projects_points ON userstories_rolepoints.points_id = projects_points.id
+                                 WHERE userstories_rolepoints.user_story_id = item.id)""",
+            "milestone_name": "milestone.name",
+            "milestone_slug": "milestone.slug",
+        })
+        joins = "LEFT JOIN milestones_milestone AS milestone ON milestone.id = item.milestone_id"
+
+    if with_text:
+        rank = "ts_rank(item.search_vector, to_tsquery('simple', %(text)s))"
+        where = "AND item.search_vector @@ to_tsquery('simple', %(text)s)"
+    else:
+        rank = "0::real"
+        where = ""
+
+    # Within the same rank, keep the default order of the model
+    ordering = []
+    for field_name in model._meta.ordering:
+        descending = field_name.startswith("-")
+        field = model._meta.get_field(field_name.lstrip("-"))
+        if field.name == "project":
+            continue
+        ordering.append("item.{}{}".format(field.column, " DESC" if descending else ""))
+
+    return """
+        (SELECT '{key}', item.id, {ref}, {subject}, {slug}, {status_id}, {assigned_to_id},
+                {total_points}, {milestone_name}, {milestone_slug}, {rank} AS rank
+           FROM {table} AS item
+                {joins}
+          WHERE item.project_id = %(project_id)s {where}
+       ORDER BY rank DESC, {ordering}
+          LIMIT %(limit)s)
+    """.format(key=key, table=model._meta.db_table, joins=joins, rank=rank, where=where,
+               ordering=", ".join(ordering), **columns)
+
+
+TYPEAHEAD_TYPES = ("epics", "userstories", "tasks", "issues")
+
+
+def typeahead(project, text, types):
+    """
+    Find the items of `types` (keys of TYPEAHEAD_TYPES) of a project whose ref
+    starts with `text` (with or without the leading #) or whose subject
+    contains it, for the pickers that search while the user is typing. It
+    doesn't use the full text search, so partial words match too.
 
+    Return a list of dicts with the type, id, ref and subject of the best
+    TYPEAHEAD_MAX_RESULTS items: exact refs first, then prefixes of refs,
+    then prefixes of subjects and finally the newest ones.
 
-def _search_by_query(queryset, tsquery, tsvector, text):
-    select = {
-        "rank": "ts_rank({tsvector},{tsquery})".format(tsquery=tsquery,
-                                                       tsvector=tsvector),
+    The results are shared by all the users with the same `types` for a few
+    seconds (see SEARCHES_TYPEAHEAD_CACHE_TIMEOUT).
+    """
+    text = text.strip().lower()
+    types = [key for key in TYPEAHEAD_TYPES if key in types]
+    if not text or not types:
+        return []
+
+    cache_key = "search-typeahead:{}:{}:{}".format(project.pk, ",".join(types),
+                                                    hashlib.sha1(text.encode("utf-8")).hexdigest())
+    result = cache.get(cache_key)
+    if result is not None:
+        return result
+
+    ref = text[1:] if text.startswith("#") else text
+    if not ref.isdigit():
+        ref = None
+
+    escaped_text = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    params = {
+        "project_id": project.pk,
+        "ref": ref,
+        "ref_prefix": "{}%".format(ref) if ref is not None else None,
+        "subject_prefix": "{}%".format(escaped_text),
+        "subject_contains": "%{}%".format(escaped_text),
+        "limit": TYPEAHEAD_MAX_RESULTS,
     }
-    order_by = ["-rank", ]
-    where = ["{tsvector} @@ {tsquery}".format(tsquery=tsquery,
-                                              tsvector=tsvector), ]
-
-    if text:
-        queryset = queryset.extra(select=select,
-                                  select_params=[to_tsquery(text)],
-                                  where=where,
-                                  params=[to_tsquery(text)],
-                                  order_by=order_by)
-
-    queryset = attach_total_points(queryset)
-    return queryset[:MAX_RESULTS]
+
+    ref_where = "OR (item.ref::text) LIKE %(ref_prefix)s" if ref is not None else ""
+    branches = []
+    for key, model_label, perm in SEARCH_TYPES:
+        if key not in types:
+            continue
+
+        branches.append("""
+            (SELECT '{key}' AS type, item.id, item.ref, item.subject,
+                    CASE WHEN (item.ref::text) = %(ref)s THEN 3
+                         WHEN (item.ref::text) LIKE %(ref_prefix)s THEN 2
+                         WHEN lower(item.subject) LIKE %(subject_prefix)s THEN 1
+                         ELSE 0
+                    END AS rank
+               FROM {table} AS item
+              WHERE item.project_id = %(project_id)s
+                AND (lower(item.subject) LIKE %(subject_contains)s {ref_where})
+           ORDER BY rank DESC, item.ref DESC
+              LIMIT %(limit)s)
+        """.format(key=key, table=apps.get_model(model_label)._meta.db_table, ref_where=ref_where))
+
+    sql = "\n UNION ALL \n".join(branches) + "\n ORDER BY rank DESC, ref DESC LIMIT %(limit)s"
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        result = [{"type": row[0], "id": row[1], "ref": row[2], "subject": row[3]}
+                  for row in cursor.fetchall()]
+
+    cache.set(cache_key, result, TYPEAHEAD_CACHE_TIMEOUT)
+    return result
+
+
+def update_search_vectors(model_label, batch_size=1000, only_missing=False, project_id=None):
+    """
+    Recompute the search_vector of the rows of a searchable model in batches
+    of ids, yielding the number of updated rows of every batch.
+    """
+    column = dict(SEARCHABLE_MODELS)[model_label]
+    table = apps.get_model(model_label)._meta.db_table
+
+    filters = ""
+    params = {}
+    if only_missing:
+        filters += " AND search_vector IS NULL"
+    if project_id is not None:
+        filters += " AND project_id = %(project_id)s"
+        params["project_id"] = project_id
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT min(id), max(id) FROM {table}".format(table=table))
+        min_id, max_id = cursor.fetchone()
+        if min_id is None:
+            return
+
+        sql = """
+            UPDATE {table}
+               SET {column} = {column}
+             WHERE id >= %(from_id)s AND id < %(to_id)s {filters}
+        """.format(table=table, column=column, filters=filters)
+
+        for from_id in range(min_id, max_id + 1, batch_size):
+            cursor.execute(sql, dict(params, from_id=from_id, to_id=from_id + batch_size))
+            yield cursor.rowcount
@@ -8,6 +8,7 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.db.models import Q
 
 from taiga.base import response
@@ -61,10 +62,51 @@ class TimelineViewSet(ReadOnlyListViewSet):
     def get_timeline(self, obj):
         raise NotImplementedError
 
+    def get_timeline_namespace(self, obj):
+        raise NotImplementedError
+
+    def get_page_cache_key(self, obj):
+        # In fan-out on read mode the first pages of every timeline are cached
+        # until a new event is added to it or the memberships of the user change.
+        if not service.is_fanout_on_read_enabled():
+            return None
+
+        try:
+            page = int(self.request.QUERY_PARAMS.get(self.page_kwarg, 1))
+        except ValueError:
+            return None
+
+        if page > settings.TIMELINE_PAGE_CACHE_MAX_PAGE:
+            return None
+
+        return service.get_timeline_page_cache_key(self.get_timeline_namespace(obj),
+                                                   self.request.user,
+                                                   self.__class__.__name__,
+                                                   obj.pk,
+                                                   self.request.GET.urlencode(),
+                                                   "x-lazy-pagination" in self.request.headers,
+                                                   "x-disable-pagination" in self.request.headers)
+
     def retrieve(self, request, pk):
         obj = self.get_object()
         self.check_permissions(request, "retrieve", obj)
 
+        cache_key = self.get_page_cache_key(obj)
+        if cache_key is not None:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                self.headers.update(cached["headers"])
+                return response.Ok(cached["data"])
+
+        result = self._retrieve_timeline(request, obj)
+
+        if cache_key is not None:
+            cache.set(cache_key, {"data": result.data, "headers": dict(self.headers)},
+                      settings.TIMELINE_PAGE_CACHE_TIMEOUT)
+
+        return result
+
+    def _retrieve_timeline(self, request, obj):
         qs = self.get_timeline(obj)
 
         if request.GET.get("only_relevant", None) is not None:
@@ -93,6 +135,9 @@ class ProfileTimeline(TimelineViewSet):
     def get_timeline(self, user):
         return service.get_profile_timeline(user, accessing_user=self.request.user)
 
+    def get_timeline_namespace(self, user):
+        return service.build_user_namespace(user)
+
 
 class UserTimeline(TimelineViewSet):
     content_type = settings.AUTH_USER_MODEL.lower()
@@ -101,6 +146,9 @@ class UserTimeline(TimelineViewSet):
     def get_timeline(self, user):
         return service.get_user_timeline(user, accessing_user=self.request.user)
 
+    def get_timeline_namespace(self, user):
+        return service.build_user_namespace(user)
+
 
 class ProjectTimeline(TimelineViewSet):
     content_type = "projects.project"
@@ -108,3 +156,6 @@ class ProjectTimeline(TimelineViewSet):
 
     def get_timeline(self, project):
         return service.get_project_timeline(project, accessing_user=self.request.user)
+
+    def get_timeline_namespace(self, project):
+        return service.build_project_namespace(project)
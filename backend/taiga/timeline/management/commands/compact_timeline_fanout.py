@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+# Examples:
+# python manage.py compact_timeline_fanout
+# python manage.py compact_timeline_fanout --project 1
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from taiga.projects.models import Project
+
+
+# Move the author and the related people of the user timeline rows
+# of every project event to the project timeline row of the event. The
+# fan-out copies of an event have its author in their namespace and the
+# same data (with the event object) than the project row of the event.
+COMPACT_SQL = """
+WITH fanout AS (
+    SELECT event_type,
+           created,
+           data_content_type_id,
+           namespace,
+           data,
+           array_agg(DISTINCT object_id ORDER BY object_id) AS related_users,
+           split_part(namespace, ':', 2)::integer AS actor_id
+      FROM timeline_timeline
+     WHERE project_id = %(project_id)s
+       AND content_type_id = %(user_ct)s
+       AND namespace LIKE 'user:%%'
+  GROUP BY event_type, created, data_content_type_id, namespace, data
+)
+UPDATE timeline_timeline
+   SET related_users = fanout.related_users,
+       actor_id = fanout.actor_id
+  FROM fanout
+ WHERE timeline_timeline.project_id = %(project_id)s
+   AND timeline_timeline.content_type_id = %(project_ct)s
+   AND timeline_timeline.related_users IS NULL
+   AND timeline_timeline.event_type = fanout.event_type
+   AND timeline_timeline.created = fanout.created
+   AND timeline_timeline.data_content_type_id = fanout.data_content_type_id
+   AND timeline_timeline.data = fanout.data
+"""
+
+# Remove the user timeline rows that have been moved to a project timeline row.
+DELETE_SQL = """
+DELETE FROM timeline_timeline AS fanout
+      USING timeline_timeline AS event
+      WHERE fanout.project_id = %(project_id)s
+        AND fanout.content_type_id = %(user_ct)s
+        AND fanout.namespace LIKE 'user:%%'
+        AND event.project_id = %(project_id)s
+        AND event.content_type_id = %(project_ct)s
+        AND event.related_users IS NOT NULL
+        AND event.event_type = fanout.event_type
+        AND event.created = fanout.created
+        AND event.data_content_type_id = fanout.data_content_type_id
+        AND event.data = fanout.data
+        AND fanout.namespace = 'user:' || event.actor_id
+"""
+
+
+class Command(BaseCommand):
+    help = 'Compact the fan-out user timeline rows into the project timeline rows (for TIMELINE_FANOUT_ON_READ)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project',
+                            action='store',
+                            dest='project',
+                            default=None,
+                            help='Selected project id for timeline compaction')
+
+    @override_settings(DEBUG=False)
+    def handle(self, *args, **options):
+        projects = Project.objects.order_by("id")
+        if options["project"] is not None:
+            projects = projects.filter(id=options["project"])
+
+        params = {
+            "user_ct": ContentType.objects.get_for_model(get_user_model()).id,
+            "project_ct": ContentType.objects.get_for_model(Project).id,
+        }
+
+        total = projects.count()
+        for count, project_id in enumerate(projects.values_list("id", flat=True).iterator()):
+            params["project_id"] = project_id
+
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(COMPACT_SQL, params)
+                cursor.execute(DELETE_SQL, params)
+                deleted = cursor.rowcount
+
+            self.stdout.write("{}/{} project {}: {} timeline rows removed".format(count + 1, total,
+                                                                                  project_id, deleted))
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+# Generated by Django 3.2.25 on 2026-10-17 18:33
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timeline', '0008_auto_20190606_1528'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeline',
+            name='actor_id',
+            field=models.PositiveIntegerField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='timeline',
+            name='related_users',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.PositiveIntegerField(), blank=True, default=None, null=True, size=None),
+        ),
+        migrations.AddIndex(
+            model_name='timeline',
+            index=models.Index(condition=models.Q(('actor_id__isnull', False)), fields=['actor_id', '-created'], name='timeline_actor_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeline',
+            index=django.contrib.postgres.indexes.GinIndex(condition=models.Q(('related_users__isnull', False)), fields=['related_users'], name='timeline_related_users_idx'),
+        ),
+    ]
@@ -5,6 +5,8 @@
 #
 # Copyright (c) 2021-present Kaleidos INC
 
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from taiga.base.db.models.fields import JSONField
 from django.utils import timezone
@@ -26,10 +28,19 @@ class Timeline(models.Model):
     data_content_type = models.ForeignKey(ContentType, related_name="data_timelines", on_delete=models.CASCADE)
     created = models.DateTimeField(default=timezone.now, db_index=True)
 
+    # Only used by the project events stored in fan-out on read mode
+    # (see settings.TIMELINE_FANOUT_ON_READ)
+    actor_id = models.PositiveIntegerField(null=True, blank=True, default=None)
+    related_users = ArrayField(models.PositiveIntegerField(), null=True, blank=True, default=None)
+
     class Meta:
         indexes = [
             models.Index(fields=['namespace', '-created']),
             models.Index(fields=['content_type', 'object_id', '-created']),
+            models.Index(fields=['actor_id', '-created'], name='timeline_actor_created_idx',
+                         condition=models.Q(actor_id__isnull=False)),
+            GinIndex(fields=['related_users'], name='timeline_related_users_idx',
+                     condition=models.Q(related_users__isnull=False)),
         ]
 
 
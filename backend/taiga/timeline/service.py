@@ -5,7 +5,12 @@
 #
 # Copyright (c) 2021-present Kaleidos INC
 
+import logging
+import time
+import uuid
+
 from django.apps import apps
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.db.models import Model
@@ -13,14 +18,21 @@ from django.db.models.expressions import RawSQL
 from django.db.models import Q
 from django.db.models.query import QuerySet
 from django.db import connection
+from django.core.cache import cache
 
 from functools import partial, wraps
 
 from taiga.base.utils.db import get_typename_for_model_class
+from taiga.permissions.services import get_memberships_cache_version
 from taiga.celery import app
 
 _timeline_impl_map = {}
 
+# Max number of timeline entries inserted by a single query
+BULK_CREATE_BATCH_SIZE = 1000
+
+logger = logging.getLogger("taiga.timeline")
+
 
 def _get_impl_key_from_model(model: Model, event_type: str):
     if issubclass(model, Model):
@@ -43,9 +55,16 @@ def build_project_namespace(project: object):
     return "{0}:{1}".format("project", project.id)
 
 
-def _add_to_object_timeline(obj: object, instance: object, event_type: str, created_datetime: object,
-                            namespace: str="default", extra_data: dict={}):
-    assert isinstance(obj, Model), "obj must be a instance of Model"
+def is_fanout_on_read_enabled():
+    return getattr(settings, "TIMELINE_FANOUT_ON_READ", False)
+
+
+def _build_timeline_entries(objects, instance: object, event_type: str, created_datetime: object,
+                            namespace: str="default", extra_data: dict={}, **fields):
+    """
+    Build (without saving) the timeline entries of an event for many objects.
+    The event payload and its content type are computed only once.
+    """
     assert isinstance(instance, Model), "instance must be a instance of Model"
     from .models import Timeline
     event_type_key = _get_impl_key_from_model(instance.__class__, event_type)
@@ -55,29 +74,72 @@ def _add_to_object_timeline(obj: object, instance: object, event_type: str, crea
     if hasattr(instance, "project"):
         project = instance.project
 
-    Timeline.objects.create(
-        content_object=obj,
-        namespace=namespace,
-        event_type=event_type_key,
-        project=project,
-        data=impl(instance, extra_data=extra_data),
-        data_content_type=ContentType.objects.get_for_model(instance.__class__),
-        created=created_datetime,
-    )
+    data = impl(instance, extra_data=extra_data)
+    data_content_type = ContentType.objects.get_for_model(instance.__class__)
+
+    entries = []
+    for obj in objects:
+        assert isinstance(obj, Model), "obj must be a instance of Model"
+        entries.append(Timeline(
+            content_object=obj,
+            namespace=namespace,
+            event_type=event_type_key,
+            project=project,
+            data=data,
+            data_content_type=data_content_type,
+            created=created_datetime,
+            **fields
+        ))
+
+    return entries
+
+
+def _add_to_object_timeline(obj: object, instance: object, event_type: str, created_datetime: object,
+                            namespace: str="default", extra_data: dict={}):
+    assert isinstance(obj, Model), "obj must be a instance of Model"
+    entry, = _build_timeline_entries([obj], instance, event_type, created_datetime, namespace, extra_data)
+    entry.save(force_insert=True)
+    return 1
 
 
 def _add_to_objects_timeline(objects, instance: object, event_type: str, created_datetime: object,
                              namespace: str="default", extra_data: dict={}):
-    for obj in objects:
-        _add_to_object_timeline(obj, instance, event_type, created_datetime, namespace, extra_data)
+    from .models import Timeline
+    entries = _build_timeline_entries(objects, instance, event_type, created_datetime, namespace, extra_data)
+    Timeline.objects.bulk_create(entries, batch_size=BULK_CREATE_BATCH_SIZE)
+    return len(entries)
+
+
+def _add_to_project_timeline(project: object, instance: object, event_type: str, created_datetime: object,
+                             extra_data: dict={}, actor: object=None, related_people=None):
+    """
+    Store a project event only once, with its author and the ids of its related people,
+    so the user and profile timelines can be built when they are read.
+    """
+    related_users = None
+    if related_people is not None:
+        related_users = sorted(set(related_people.values_list("id", flat=True)))
+
+    entry, = _build_timeline_entries([project], instance, event_type, created_datetime,
+                                     namespace=build_project_namespace(project),
+                                     extra_data=extra_data,
+                                     actor_id=actor.id if actor else None,
+                                     related_users=related_users)
+    entry.save(force_insert=True)
+
+    namespaces = [build_project_namespace(project)]
+    if related_users:
+        namespaces += ["{0}:{1}".format("user", user_id) for user_id in related_users + [actor.id]]
+    bump_timeline_page_cache_versions(namespaces)
+    return 1
 
 
 def _push_to_timeline(objects, instance: object, event_type: str, created_datetime: object,
                       namespace: str="default", extra_data: dict={}):
     if isinstance(objects, Model):
-        _add_to_object_timeline(objects, instance, event_type, created_datetime, namespace, extra_data)
+        return _add_to_object_timeline(objects, instance, event_type, created_datetime, namespace, extra_data)
     elif isinstance(objects, QuerySet) or isinstance(objects, list):
-        _add_to_objects_timeline(objects, instance, event_type, created_datetime, namespace, extra_data)
+        return _add_to_objects_timeline(objects, instance, event_type, created_datetime, namespace, extra_data)
     else:
         raise Exception("Invalid objects parameter")
 
@@ -85,6 +147,10 @@ def _push_to_timeline(objects, instance: object, event_type: str, created_dateti
 @app.task
 def push_to_timelines(project_id, user_id, obj_app_label, obj_model_name, obj_id, event_type,
                       created_datetime, extra_data={}, refresh_totals=True):
+    from taiga.projects.services.totals import bump_project_totals
+
+    start = time.perf_counter()
+    rows = 0
 
     ObjModel = apps.get_model(obj_app_label, obj_model_name)
     try:
@@ -106,26 +172,52 @@ def push_to_timelines(project_id, user_id, obj_app_label, obj_model_name, obj_id
         except projectModel.DoesNotExist:
             return
 
+        if is_fanout_on_read_enabled():
+            related_people = None
+            if hasattr(obj, "get_related_people"):
+                related_people = obj.get_related_people()
+
+            rows += _add_to_project_timeline(project, obj, event_type, created_datetime,
+                                             extra_data=extra_data, actor=user,
+                                             related_people=related_people)
+
+            if refresh_totals:
+                bump_project_totals(project, activity=1, created_datetime=created_datetime)
+
+            _log_timeline_event(obj, event_type, rows, start)
+            return
+
         # Project timeline
-        _push_to_timeline(project, obj, event_type, created_datetime,
-                          namespace=build_project_namespace(project),
-                          extra_data=extra_data)
+        rows += _push_to_timeline(project, obj, event_type, created_datetime,
+                                  namespace=build_project_namespace(project),
+                                  extra_data=extra_data)
 
         if refresh_totals:
-            project.refresh_totals()
+            bump_project_totals(project, activity=1, created_datetime=created_datetime)
 
         if hasattr(obj, "get_related_people"):
             related_people = obj.get_related_people()
 
-            _push_to_timeline(related_people, obj, event_type, created_datetime,
-                              namespace=build_user_namespace(user),
-                              extra_data=extra_data)
+            rows += _push_to_timeline(related_people, obj, event_type, created_datetime,
+                                      namespace=build_user_namespace(user),
+                                      extra_data=extra_data)
     else:
         # Actions not related with a project
         # - Me
-        _push_to_timeline(user, obj, event_type, created_datetime,
-                          namespace=build_user_namespace(user),
-                          extra_data=extra_data)
+        rows += _push_to_timeline(user, obj, event_type, created_datetime,
+                                  namespace=build_user_namespace(user),
+                                  extra_data=extra_data)
+
+        if is_fanout_on_read_enabled():
+            bump_timeline_page_cache_versions([build_user_namespace(user)])
+
+    _log_timeline_event(obj, event_type, rows, start)
+
+
+def _log_timeline_event(obj, event_type, rows, start):
+    elapsed = (time.perf_counter() - start) * 1000
+    logger.debug("Timeline event %s.%s: %d rows written in %.2f ms",
+                 get_typename_for_model_class(obj.__class__), event_type, rows, elapsed)
 
 
 def get_timeline(obj, namespace=None):
@@ -177,15 +269,13 @@ def filter_timeline_for_user(timeline, user, namespace=None):
 
     # Filtering private projects where user is member
     if not user.is_anonymous:
-        for membership in user.cached_memberships:
-            # Admin roles can see everything in a project
-            if membership.is_admin:
-                tl_filter |= Q(project=membership.project)
+        visible_projects = _get_visible_projects_index(user, content_types, membership_content_type)
+        for data_content_types, project_ids in visible_projects.items():
+            if data_content_types is None:
+                # Admin roles can see everything in a project
+                tl_filter |= Q(project_id__in=project_ids)
             else:
-                data_content_types = list(filter(None, [content_types.get(a, None) for a in
-                                                        membership.role.permissions]))
-                data_content_types.append(membership_content_type)
-                tl_filter |= Q(project=membership.project, data_content_type__in=data_content_types)
+                tl_filter |= Q(project_id__in=project_ids, data_content_type__in=data_content_types)
 
     timeline = timeline.filter(tl_filter)
 
@@ -195,7 +285,34 @@ def filter_timeline_for_user(timeline, user, namespace=None):
     return timeline
 
 
-def _get_not_allowed_epic_related_query(accessing_user, namespace):
+def _get_visible_projects_index(user, content_types, membership_content_type):
+    """
+    Group the projects where the user is member by the set of timeline content
+    types the user can see on them (None means everything), so the timeline
+    filter has one condition per distinct set of permissions instead of one per
+    membership. The index is computed once per user instance.
+    """
+    index = getattr(user, "_timeline_visible_projects_index", None)
+    if index is not None:
+        return index
+
+    index = {}
+    for membership in user.cached_memberships:
+        if membership.is_admin:
+            data_content_types = None
+        else:
+            data_content_types = {content_types[a].id for a in membership.role.permissions
+                                  if a in content_types}
+            data_content_types.add(membership_content_type.id)
+            data_content_types = tuple(sorted(data_content_types))
+
+        index.setdefault(data_content_types, []).append(membership.project_id)
+
+    user._timeline_visible_projects_index = index
+    return index
+
+
+def _get_not_allowed_epic_related_query(accessing_user, namespace=None):
     sql = """
     select tt.id
     from timeline_timeline tt
@@ -218,28 +335,100 @@ def _get_not_allowed_epic_related_query(accessing_user, namespace):
             and pm.project_id = pp.id
             and 'view_us' = ANY(ur.permissions))
         )
-        and tt.namespace = %s
         and tt.event_type = 'epics.relateduserstory.create'
     """
     accessing_user_id = accessing_user.id or -1  # -1 just in case of anonymous user
-    return RawSQL(sql, (accessing_user_id, accessing_user_id, namespace))
+    params = (accessing_user_id, accessing_user_id)
+
+    if namespace is not None:
+        sql += " and tt.namespace = %s"
+        params += (namespace, )
+
+    return RawSQL(sql, params)
 
 
 def get_profile_timeline(user, accessing_user=None):
-    timeline = get_timeline(user)
+    if is_fanout_on_read_enabled():
+        timeline = _get_fanout_on_read_timeline(user, Q(related_users__contains=[user.id]),
+                                                Q(object_id=user.pk))
+    else:
+        timeline = get_timeline(user)
+
     if accessing_user is not None:
         timeline = filter_timeline_for_user(timeline, accessing_user)
     return timeline
 
 
 def get_user_timeline(user, accessing_user=None):
+    """
+    Timeline of the actions of `user`.
+
+    In fan-out on read mode every project event of the user is returned only
+    once (a row of the project timeline, with the ids of its related people in
+    `related_users`), while the fan-out on write timeline has a copy of the
+    event for every related person (with the person as its content object), so
+    the pages of both timelines don't have the same rows.
+    """
     namespace = build_user_namespace(user)
+
+    if is_fanout_on_read_enabled():
+        timeline = _get_fanout_on_read_timeline(user, Q(actor_id=user.id, related_users__len__gt=0),
+                                                Q(namespace=namespace))
+        if accessing_user is not None:
+            timeline = filter_timeline_for_user(timeline, accessing_user)
+            timeline = timeline.exclude(id__in=_get_not_allowed_epic_related_query(accessing_user))
+        return timeline
+
     timeline = get_timeline(user, namespace)
     if accessing_user is not None:
         timeline = filter_timeline_for_user(timeline, accessing_user, namespace)
     return timeline
 
 
+def _get_fanout_on_read_timeline(user, project_events_filter, user_events_filter):
+    """
+    Build a user timeline from the project events that match `project_events_filter`
+    plus the events stored in the user timeline itself (events without project and
+    the fan-out rows written before the fan-out on read mode was enabled).
+    """
+    from .models import Timeline
+
+    project_ct = ContentType.objects.get_for_model(apps.get_model("projects", "Project"))
+    user_ct = ContentType.objects.get_for_model(user.__class__)
+
+    timeline = Timeline.objects.filter(Q(content_type=project_ct) & project_events_filter |
+                                       Q(content_type=user_ct) & user_events_filter)
+    return timeline.order_by("-created")
+
+
+def _get_timeline_page_cache_version(namespace):
+    key = "timeline-version:{}".format(namespace)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(key, version, None)
+    return version
+
+
+def bump_timeline_page_cache_versions(namespaces):
+    cache.set_many({"timeline-version:{}".format(ns): uuid.uuid4().hex for ns in namespaces}, None)
+
+
+def get_timeline_page_cache_key(namespace, accessing_user, *params):
+    """
+    Key of a cached timeline page. It changes every time a new event is
+    added to the timeline of `namespace` and every time the memberships of
+    `accessing_user` change (the page is filtered with their permissions).
+    """
+    version = _get_timeline_page_cache_version(namespace)
+    accessing_user_id = getattr(accessing_user, "id", None)
+    if accessing_user_id is None:
+        accessing_user_key = ["anon"]
+    else:
+        accessing_user_key = [str(accessing_user_id), get_memberships_cache_version(accessing_user_id)]
+    return ":".join(["timeline-page", namespace, version] + accessing_user_key + [str(p) for p in params])
+
+
 def get_project_timeline(project, accessing_user=None):
     namespace = build_project_namespace(project)
     timeline = get_timeline(project, namespace)
@@ -5,10 +5,15 @@
 #
 # Copyright (c) 2021-present Kaleidos INC
 
+import io
 import pytest
 
 from unittest.mock import patch
 
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import signals
+
 from django.urls import reverse
 from django.utils import timezone
 
@@ -17,6 +22,7 @@ from .. import factories as f
 from taiga.base.utils import json
 from taiga.projects.history import services
 from taiga.projects.history.models import HistoryEntry
+from taiga.projects.history.models import HistorySnapshotState
 from taiga.projects.history.choices import HistoryType
 from taiga.projects.history.services import make_key_from_model_object
 
@@ -132,6 +138,147 @@ def test_real_snapshot_frequency(settings):
     assert qs_partials.count() == 2
 
 
+def test_snapshot_state_is_updated_with_every_entry(settings):
+    settings.MAX_PARTIAL_DIFFS = 2
+
+    issue = f.IssueFactory.create()
+    key = make_key_from_model_object(issue)
+
+    for counter in range(5):
+        issue.description = "desc{}".format(counter)
+        issue.save()
+        services.take_snapshot(issue, user=issue.owner)
+
+        state = HistorySnapshotState.objects.get(key=key)
+        fobj, need_real_snapshot = services.get_last_snapshot_for_key(key)
+        assert state.snapshot == fobj.snapshot
+        assert state.snapshot["description"] == "desc{}".format(counter)
+        assert state.last_entry_id == HistoryEntry.objects.filter(key=key).order_by("-created_at").first().id
+        assert services.check_snapshot_state_for_key(key)
+
+
+def test_snapshot_state_produces_the_same_entries_as_the_replay(settings):
+    settings.MAX_PARTIAL_DIFFS = 2
+
+    def _make_changes(issue):
+        for counter in range(4):
+            issue.subject = "subject{}".format(counter)
+            issue.save()
+            services.take_snapshot(issue, user=issue.owner)
+
+        return list(HistoryEntry.objects.filter(key=make_key_from_model_object(issue))
+                                        .order_by("created_at")
+                                        .values_list("diff", "is_snapshot"))
+
+    settings.HISTORY_SNAPSHOT_STATE_ENABLED = False
+    replay_entries = _make_changes(f.IssueFactory.create())
+    assert HistorySnapshotState.objects.count() == 0
+
+    settings.HISTORY_SNAPSHOT_STATE_ENABLED = True
+    state_entries = _make_changes(f.IssueFactory.create())
+    assert HistorySnapshotState.objects.count() == 1
+
+    assert replay_entries == state_entries
+
+
+def test_snapshot_state_is_invalidated_by_external_entries():
+    issue = f.IssueFactory.create()
+    key = make_key_from_model_object(issue)
+
+    services.take_snapshot(issue, user=issue.owner)
+    assert HistorySnapshotState.objects.filter(key=key).exists()
+
+    f.HistoryEntryFactory.create(project=issue.project, type=HistoryType.change, key=key,
+                                 diff={}, user={"pk": issue.owner.id})
+    assert not HistorySnapshotState.objects.filter(key=key).exists()
+
+    issue.subject = "new subject"
+    issue.save()
+    entry = services.take_snapshot(issue, user=issue.owner)
+    assert entry.diff["subject"][1] == "new subject"
+    assert services.check_snapshot_state_for_key(key)
+
+
+def test_backfill_and_check_history_snapshot_states_commands():
+    issue = f.IssueFactory.create()
+    key = make_key_from_model_object(issue)
+
+    services.take_snapshot(issue, user=issue.owner)
+    issue.subject = "new subject"
+    issue.save()
+    services.take_snapshot(issue, user=issue.owner)
+    HistorySnapshotState.objects.all().delete()
+
+    call_command("backfill_history_snapshot_states", stdout=io.StringIO())
+    state = HistorySnapshotState.objects.get(key=key)
+    assert state.snapshot["subject"] == "new subject"
+    assert state.partial_diffs == 1
+
+    call_command("check_history_snapshot_states", stdout=io.StringIO())
+
+    HistorySnapshotState.objects.filter(key=key).update(snapshot={})
+    with pytest.raises(CommandError):
+        call_command("check_history_snapshot_states", stdout=io.StringIO())
+
+    call_command("check_history_snapshot_states", fix=True, stdout=io.StringIO())
+    assert HistorySnapshotState.objects.get(key=key).snapshot["subject"] == "new subject"
+
+
+def test_take_snapshots_in_bulk():
+    project = f.create_project()
+    uss = [f.create_userstory(project=project) for i in range(3)]
+    task = f.TaskFactory.create(project=project)
+
+    entries = services.take_snapshots_in_bulk(uss + [task], user=project.owner)
+    assert len(entries) == 4
+    assert all(entry.type == HistoryType.create and entry.is_snapshot for entry in entries)
+    assert HistoryEntry.objects.count() == 4
+    assert HistorySnapshotState.objects.count() == 4
+
+    # Without changes no entries are created
+    assert services.take_snapshots_in_bulk(uss, user=project.owner) == []
+
+    uss[0].subject = "new subject"
+    uss[0].save()
+    entries = services.take_snapshots_in_bulk(uss + [task], user=project.owner)
+    assert len(entries) == 1
+    assert entries[0].key == make_key_from_model_object(uss[0])
+    assert entries[0].diff["subject"][1] == "new subject"
+    assert services.check_snapshot_state_for_key(entries[0].key)
+
+
+def test_freeze_model_instances_in_bulk():
+    project = f.create_project()
+    us = f.create_userstory(project=project)
+    f.RolePointsFactory.create(user_story=us)
+    us.assigned_users.add(us.owner)
+    task = f.TaskFactory.create(project=project, user_story=us)
+    issue = f.IssueFactory.create(project=project)
+
+    fobjs = services.freeze_model_instances_in_bulk([us, task, issue])
+
+    for obj in (us, task, issue):
+        key = make_key_from_model_object(obj)
+        assert fobjs[key] == services.freeze_model_instance(obj)
+
+
+def test_take_snapshots_in_bulk_sends_post_save_signals():
+    us = f.create_userstory()
+    received = []
+
+    def _on_new_history_entry(sender, instance, created, **kwargs):
+        received.append((instance.key, created))
+
+    signals.post_save.connect(_on_new_history_entry, sender=HistoryEntry)
+    try:
+        entries = services.take_snapshots_in_bulk([us], user=us.owner)
+    finally:
+        signals.post_save.disconnect(_on_new_history_entry, sender=HistoryEntry)
+
+    assert received == [(entries[0].key, True)]
+    assert HistorySnapshotState.objects.filter(key=entries[0].key).exists()
+
+
 def test_issue_resource_history_test(client):
     user = f.UserFactory.create()
     project = f.ProjectFactory.create(owner=user)
@@ -5,16 +5,22 @@
 #
 # Copyright (c) 2021-present Kaleidos INC
 
+import io
+import gzip
 import pytest
 import base64
 import logging
+import zipfile
 
 from django.apps import apps
+from django.core import mail
 from django.urls import reverse
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 
 from taiga.base.utils import json
 from taiga.export_import import services
+from taiga.export_import import tasks
 from taiga.export_import.exceptions import  TaigaImportError
 from taiga.projects.models import Project, Membership
 from taiga.projects.issues.models import Issue
@@ -1892,3 +1898,85 @@ def test_dump_import_duplicated_project(client):
     assert response.status_code == 201
     assert response.data["name"] == "Test import"
     assert response.data["slug"] == "{}-test-import".format(user.username)
+
+
+def test_valid_dump_archive_import(client):
+    user = f.UserFactory.create()
+    project = f.ProjectFactory.create(owner=user, logo=None)
+    role = f.RoleFactory.create(project=project)
+    f.MembershipFactory(project=project, user=user, role=role, is_admin=True)
+    status = f.UserStoryStatusFactory.create(project=project)
+    us1 = f.UserStoryFactory.create(project=project, status=status, milestone=None)
+    us2 = f.UserStoryFactory.create(project=project, status=status, milestone=None)
+    apps.get_model("userstories", "RolePoints").objects.filter(user_story__project=project).delete()
+    same_attachments = [
+        f.UserStoryAttachmentFactory.create(project=project, owner=user, content_object=us,
+                                            attached_file=ContentFile(b"same content", name="same.txt"))
+        for us in (us1, us2)
+    ]
+    other_attachment = f.UserStoryAttachmentFactory.create(project=project, owner=user, content_object=us2,
+                                                           attached_file=ContentFile(b"other content",
+                                                                                     name="other.txt"))
+
+    dump = io.BytesIO()
+    services.render_project_archive(project, dump)
+
+    # The files are out of the document and only stored once
+    dump.seek(0)
+    with zipfile.ZipFile(dump) as dump_archive:
+        assert sorted(dump_archive.namelist()) == sorted([
+            "project.json",
+            "files/{}".format(same_attachments[0].sha1),
+            "files/{}".format(other_attachment.sha1),
+        ])
+        document = json.loads(dump_archive.read("project.json").decode("utf-8"))
+
+    attached_files = [attachment["attached_file"] for us in document["user_stories"]
+                      for attachment in us["attachments"]]
+    assert len(attached_files) == 3
+    assert all("data" not in attached_file and attached_file["sha1"] for attached_file in attached_files)
+
+    client.login(user)
+    url = reverse("importer-load-dump")
+    data = ContentFile(dump.getvalue(), name="dump.zip")
+
+    response = client.post(url, {'dump': data})
+    assert response.status_code == 201
+
+    attachment_model = apps.get_model("attachments", "Attachment")
+    attachments = attachment_model.objects.filter(project_id=response.data["id"])
+    assert sorted(attachment.attached_file.read() for attachment in attachments) == [
+        b"other content", b"same content", b"same content"
+    ]
+
+
+def test_load_project_dump_task_with_a_loaded_dump():
+    # The tasks queued by older versions have the loaded dump instead of its path
+    user = f.UserFactory.create()
+    tasks.load_project_dump(user, {
+        "slug": "valid-project",
+        "name": "Valid project",
+        "description": "Valid project desc",
+        "is_private": True
+    })
+
+    assert Project.objects.filter(slug="valid-project", owner=user).count() == 1
+    assert len(mail.outbox) == 1
+
+
+def test_load_project_dump_task_with_a_truncated_gzip_file(caplog):
+    user = f.UserFactory.create()
+    dump = gzip.compress(bytes(json.dumps({
+        "slug": "valid-project",
+        "name": "Valid project",
+        "description": "Valid project desc",
+        "is_private": True
+    }), "utf-8"))
+    dump_path = default_storage.save("exports/truncated-dump.json.gz", ContentFile(dump[:len(dump) // 2]))
+
+    with caplog.at_level(logging.CRITICAL, logger="taiga.export_import"):  # Disable logger
+        tasks.load_project_dump(user, dump_path, is_gzip=True)
+
+    assert Project.objects.filter(slug="valid-project").count() == 0
+    assert len(mail.outbox) == 1
+    assert not default_storage.exists(dump_path)
@@ -61,3 +61,37 @@ def test_proccessor_valid_email():
     result = render(dummy_project, "**beta.tester@taiga.io**")
     expected_result = "<p><strong><a href=\"mailto:beta.tester@taiga.io\" target=\"_blank\">beta.tester@taiga.io</a></strong></p>"
     assert result == expected_result
+
+
+def test_render_and_extract_resolves_mentions_and_references_in_bulk(django_assert_max_num_queries):
+    user1 = factories.UserFactory(username="user1", full_name="test name 1")
+    user2 = factories.UserFactory(username="user2", full_name="test name 2")
+    project = factories.ProjectFactory()
+    factories.MembershipFactory(user=user1, project=project)
+    factories.MembershipFactory(user=user2, project=project)
+    us = factories.UserStoryFactory(project=project)
+    task = factories.TaskFactory(project=project)
+    issue = factories.IssueFactory(project=project)
+
+    text = "@user1 #{} @user2 #{} @notvaliduser #{} #99999 @user1 #{}".format(us.ref, task.ref, issue.ref, us.ref)
+    with django_assert_max_num_queries(5):
+        (result, extracted) = render_and_extract(project, text)
+
+    assert result.count('class="mention"') == 3
+    assert 'class="reference user-story"' in result
+    assert 'class="reference task"' in result
+    assert 'class="reference issue"' in result
+    assert "#99999" in result
+    assert extracted["mentions"] == [user1, user2, user1]
+    assert extracted["references"] == [us, task, issue, us]
+
+
+def test_render_cache_is_invalidated_when_the_project_members_change():
+    user = factories.UserFactory(username="user3", full_name="test name")
+    project = factories.ProjectFactory()
+    text = "Hi **@user3**, this text is long enough to be cached"
+
+    assert 'class="mention"' not in render(project, text)
+
+    factories.MembershipFactory(user=user, project=project)
+    assert 'class="mention"' in render(project, text)
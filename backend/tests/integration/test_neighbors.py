@@ -7,6 +7,12 @@
 
 import pytest
 
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
 from taiga.projects.userstories.models import UserStory
 from taiga.projects.issues.models import Issue
 from taiga.base import neighbors as n
@@ -92,6 +98,29 @@ class TestUserStories:
         assert neighbors.left is None
         assert neighbors.right == us2
 
+    def test_keyset_neighbors_are_the_window_ones(self):
+        project = f.ProjectFactory.create()
+        now = timezone.now()
+
+        user_stories = [
+            f.UserStoryFactory.create(project=project, backlog_order=1, finish_date=None),
+            f.UserStoryFactory.create(project=project, backlog_order=1, finish_date=now),
+            f.UserStoryFactory.create(project=project, backlog_order=2, finish_date=None),
+            f.UserStoryFactory.create(project=project, backlog_order=0, finish_date=now - timedelta(days=1)),
+            f.UserStoryFactory.create(project=project, backlog_order=2, finish_date=now),
+        ]
+
+        for ordering in [("backlog_order", "id"), ("-finish_date", "backlog_order", "-id"),
+                         ("finish_date", "-backlog_order", "id")]:
+            results_set = UserStory.objects.filter(project=project).order_by(*ordering)
+            assert n._get_keyset_ordering(results_set) is not None
+
+            for us in user_stories:
+                with CaptureQueriesContext(connection) as captured:
+                    neighbors = n.get_neighbors(us, results_set=results_set)
+                assert not [q for q in captured.captured_queries if "ROW_NUMBER" in q["sql"]]
+                assert neighbors == n._get_neighbors_by_window(us, results_set.filter(project_id=project.id))
+
 
 @pytest.mark.django_db
 class TestIssues:
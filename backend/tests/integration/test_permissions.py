@@ -7,6 +7,8 @@
 
 import pytest
 
+from django.urls import reverse
+
 from taiga.permissions import services, choices
 from django.contrib.auth.models import AnonymousUser
 
@@ -120,3 +122,65 @@ def test_authenticated_user_has_perm_on_project_related_object():
 def test_authenticated_user_has_perm_on_invalid_object():
     user1 = factories.UserFactory()
     assert services.user_has_perm(user1, "test", user1) is False
+
+
+def test_user_memberships_cache_is_shared_between_requests(django_assert_num_queries):
+    user1 = factories.UserFactory()
+    project = factories.ProjectFactory()
+    role = factories.RoleFactory(project=project, permissions=["view_us"])
+    factories.MembershipFactory(user=user1, project=project, role=role, is_admin=False)
+
+    assert services.get_user_project_permissions(user1, project) >= {"view_us"}
+
+    # A new instance of the user, as loaded by another request
+    user1 = user1.__class__.objects.get(id=user1.id)
+    with django_assert_num_queries(0):
+        assert services.get_user_memberships_cache(user1) == {project.id: (False, ["view_us"])}
+        assert services.user_has_perm(user1, "view_us", project) is True
+        assert services.is_project_admin(user1, project) is False
+        assert services.get_user_project_ids_with_perm(user1, "view_us") == [project.id]
+        assert services.get_user_project_ids_with_perm(user1, "view_us", project_id=project.id + 1) == []
+        assert services.get_user_project_ids_with_perm(user1) == []
+
+
+def test_user_memberships_cache_is_invalidated():
+    user1 = factories.UserFactory()
+    project = factories.ProjectFactory()
+    role = factories.RoleFactory(project=project, permissions=["view_us"])
+    membership = factories.MembershipFactory(user=user1, project=project, role=role, is_admin=False)
+
+    assert services.user_has_perm(user1, "view_us", project) is True
+
+    role.permissions = ["view_tasks"]
+    role.save()
+    assert services.user_has_perm(user1, "view_us", project) is False
+    assert services.user_has_perm(user1, "view_tasks", project) is True
+
+    membership.is_admin = True
+    membership.save()
+    assert services.is_project_admin(user1, project) is True
+
+    membership.delete()
+    assert services.get_user_memberships_cache(user1) == {}
+    assert services.is_project_admin(user1, project) is False
+
+
+def test_user_memberships_cache_is_invalidated_when_its_role_is_deleted(client):
+    admin = factories.UserFactory()
+    user1 = factories.UserFactory()
+    project = factories.ProjectFactory(owner=admin)
+    admin_role = factories.RoleFactory(project=project)
+    factories.MembershipFactory(user=admin, project=project, role=admin_role, is_admin=True)
+    role = factories.RoleFactory(project=project, permissions=["view_us"])
+    role_dest = factories.RoleFactory(project=project, permissions=["view_tasks"])
+    factories.MembershipFactory(user=user1, project=project, role=role, is_admin=False)
+
+    assert services.user_has_perm(user1, "view_us", project) is True
+
+    client.login(admin)
+    url = reverse("roles-detail", kwargs={"pk": role.pk}) + "?moveTo={}".format(role_dest.pk)
+    response = client.delete(url)
+    assert response.status_code == 204, response.data
+
+    assert services.user_has_perm(user1, "view_us", project) is False
+    assert services.user_has_perm(user1, "view_tasks", project) is True
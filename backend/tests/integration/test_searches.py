@@ -7,6 +7,10 @@
 
 import pytest
 
+from django.contrib.postgres.search import SearchQuery
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from .. import factories as f
@@ -89,6 +93,19 @@ def test_search_all_objects_in_my_project(client, searches_initial_data):
     assert len(response.data["wikipages"]) == 4
 
 
+def test_search_all_objects_in_the_default_order(client, searches_initial_data):
+    data = searches_initial_data
+
+    client.login(data.member1.user)
+
+    response = client.get(reverse("search-list"), {"project": data.project1.id})
+    assert response.status_code == 200
+    assert [issue["id"] for issue in response.data["issues"]] == \
+        list(data.project1.issues.order_by("-id").values_list("id", flat=True))
+    assert [us["id"] for us in response.data["userstories"]] == \
+        list(data.project1.user_stories.order_by("backlog_order", "ref").values_list("id", flat=True))
+
+
 def test_search_all_objects_in_project_is_not_mine(client, searches_initial_data):
     data = searches_initial_data
 
@@ -140,3 +157,73 @@ def test_search_text_query_with_an_invalid_project_id(client, searches_initial_d
 
     response = client.get(reverse("search-list"), {"project": "new", "text": "future"})
     assert response.status_code == 404
+
+
+def test_update_search_vectors_command(searches_initial_data):
+    data = searches_initial_data
+    Issue = data.issue11.__class__
+
+    # The vectors are maintained by the database
+    assert Issue.objects.filter(project=data.project1, search_vector__isnull=True).count() == 0
+    assert set(Issue.objects.filter(project=data.project1,
+                                    search_vector=SearchQuery("future", config="simple")).values_list("id", flat=True)) == \
+        {data.issue11.id, data.issue12.id, data.issue14.id}
+
+    Issue.objects.update(search_vector=None)
+    call_command("update_search_vectors", models=["issues.Issue"], only_missing=True, batch_size=2)
+
+    assert Issue.objects.filter(search_vector__isnull=True).count() == 0
+    assert set(Issue.objects.filter(project=data.project1,
+                                    search_vector=SearchQuery("future", config="simple")).values_list("id", flat=True)) == \
+        {data.issue11.id, data.issue12.id, data.issue14.id}
+
+
+def test_search_all_types_with_a_single_query(client, searches_initial_data):
+    data = searches_initial_data
+    milestone = f.MilestoneFactory(project=data.project1, name="Sprint 1")
+    data.us11.milestone = milestone
+    data.us11.save()
+
+    client.login(data.member1.user)
+
+    url = reverse("search-list")
+    with CaptureQueriesContext(connection) as captured:
+        response = client.get(url, {"project": data.project1.id, "text": "future"})
+    assert response.status_code == 200
+    assert len([q for q in captured.captured_queries if "UNION ALL" in q["sql"]]) == 1
+
+    assert response.data["count"] == 12
+    us11 = [obj for obj in response.data["userstories"] if obj["id"] == data.us11.id][0]
+    assert us11["milestone_name"] == "Sprint 1"
+    assert us11["milestone_slug"] == milestone.slug
+    # Subject matches rank higher than description or tags ones
+    assert response.data["epics"][0]["id"] == data.epic11.id
+
+
+def test_typeahead_search_by_ref_and_subject_prefix(client, searches_initial_data):
+    data = searches_initial_data
+
+    client.login(data.member1.user)
+
+    url = reverse("search-typeahead")
+    response = client.get(url, {"project": data.project1.id, "text": "Backe"})
+    assert response.status_code == 200
+    assert {(obj["type"], obj["id"]) for obj in response.data} == {("issues", data.issue14.id)}
+
+    response = client.get(url, {"project": data.project1.id, "text": "#{}".format(data.us11.ref)})
+    assert response.status_code == 200
+    assert (response.data[0]["type"], response.data[0]["id"]) == ("userstories", data.us11.id)
+
+    response = client.get(url, {"project": data.project1.id, "text": ""})
+    assert response.status_code == 200
+    assert response.data == []
+
+
+def test_typeahead_search_in_project_is_not_mine(client, searches_initial_data):
+    data = searches_initial_data
+
+    client.login(data.member1.user)
+
+    response = client.get(reverse("search-typeahead"), {"project": data.project2.id, "text": "back"})
+    assert response.status_code == 200
+    assert response.data == []
@@ -5,11 +5,16 @@
 #
 # Copyright (c) 2021-present Kaleidos INC
 
+import io
 from datetime import timedelta
+from unittest.mock import patch
+
 import pytest
 
 from .. import factories
 from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.urls import reverse
 from django.utils import timezone
 from taiga.timeline.service import build_project_namespace, build_user_namespace, get_timeline
 from taiga.projects.history import services as history_services
@@ -34,6 +39,28 @@ def test_add_to_object_timeline():
     assert Timeline.objects.order_by("-id")[0].data == id(task)
 
 
+def test_add_to_objects_timeline_in_bulk():
+    Timeline.objects.all().delete()
+    users = [factories.UserFactory() for i in range(3)]
+    task = factories.TaskFactory()
+    calls = []
+
+    def impl(x, extra_data=None):
+        calls.append(x)
+        return id(x)
+
+    service.register_timeline_implementation("tasks.task", "test", impl)
+
+    with patch("taiga.timeline.models.Timeline.save") as save_mock:
+        assert service._add_to_objects_timeline(users, task, "test", task.created_date) == 3
+        assert save_mock.call_count == 0
+        assert calls == [task]
+
+    entries = Timeline.objects.filter(event_type="tasks.task.test")
+    assert sorted(entries.values_list("object_id", flat=True)) == sorted(u.id for u in users)
+    assert {e.data for e in entries} == {id(task)}
+
+
 def test_get_timeline():
     Timeline.objects.all().delete()
 
@@ -669,3 +696,152 @@ def _helper_get_timelines_for_accessing_users(project, users):
             timeline_counts['user_timelines'][users.index(accessing_user)].append(user_timeline.count())
 
     return timeline_counts
+
+
+def test_fanout_on_read_stores_project_events_once(settings):
+    settings.TIMELINE_FANOUT_ON_READ = True
+
+    user_watcher = factories.UserFactory()
+    user_story = factories.UserStoryFactory.create(subject="test us timeline")
+    user_story.add_watcher(user_watcher)
+
+    Timeline.objects.all().delete()
+    history_services.take_snapshot(user_story, user=user_story.owner)
+
+    assert Timeline.objects.count() == 1
+    event = Timeline.objects.get()
+    assert event.namespace == build_project_namespace(user_story.project)
+    assert event.actor_id == user_story.owner.id
+    assert event.related_users == sorted([user_story.owner.id, user_watcher.id])
+
+    assert list(service.get_project_timeline(user_story.project)) == [event]
+    assert list(service.get_profile_timeline(user_watcher)) == [event]
+    assert list(service.get_profile_timeline(user_story.owner)) == [event]
+    assert list(service.get_user_timeline(user_story.owner)) == [event]
+    assert list(service.get_user_timeline(user_watcher)) == []
+
+
+def test_fanout_on_read_timelines_include_user_events(settings):
+    settings.TIMELINE_FANOUT_ON_READ = True
+
+    user_story = factories.UserStoryFactory.create(subject="test us timeline")
+    history_services.take_snapshot(user_story, user=user_story.owner)
+
+    profile_timeline = service.get_profile_timeline(user_story.owner)
+    assert [t.event_type for t in profile_timeline] == ["userstories.userstory.create", "users.user.create"]
+
+
+def test_compact_timeline_fanout_command(settings):
+    user_watcher = factories.UserFactory()
+    user_story = factories.UserStoryFactory.create(subject="test us timeline")
+    user_story.add_watcher(user_watcher)
+    history_services.take_snapshot(user_story, user=user_story.owner)
+
+    event_type = "userstories.userstory.create"
+    assert Timeline.objects.filter(event_type=event_type).count() == 3
+    fanout_profile_timeline = list(service.get_profile_timeline(user_watcher).values_list("event_type", "data"))
+
+    call_command("compact_timeline_fanout", project=user_story.project_id, stdout=io.StringIO())
+
+    assert Timeline.objects.filter(event_type=event_type).count() == 1
+    event = Timeline.objects.get(event_type=event_type)
+    assert event.actor_id == user_story.owner.id
+    assert event.related_users == sorted([user_story.owner.id, user_watcher.id])
+
+    settings.TIMELINE_FANOUT_ON_READ = True
+    profile_timeline = list(service.get_profile_timeline(user_watcher).values_list("event_type", "data"))
+    assert profile_timeline == fanout_profile_timeline
+
+
+def test_compact_timeline_fanout_command_with_simultaneous_events():
+    project = factories.ProjectFactory.create()
+    user_watcher = factories.UserFactory()
+    user_story1 = factories.UserStoryFactory.create(project=project, subject="test us timeline 1")
+    user_story2 = factories.UserStoryFactory.create(project=project, subject="test us timeline 2")
+    user_story1.add_watcher(user_watcher)
+    history_services.take_snapshot(user_story1, user=user_story1.owner)
+    history_services.take_snapshot(user_story2, user=user_story2.owner)
+
+    event_type = "userstories.userstory.create"
+    Timeline.objects.filter(event_type=event_type).update(created=timezone.now())
+    assert Timeline.objects.filter(event_type=event_type).count() == 5
+
+    call_command("compact_timeline_fanout", project=project.id, stdout=io.StringIO())
+
+    events = Timeline.objects.filter(event_type=event_type)
+    assert sorted((e.data["userstory"]["id"], e.actor_id, e.related_users) for e in events) == sorted([
+        (user_story1.id, user_story1.owner.id, sorted([user_story1.owner.id, user_watcher.id])),
+        (user_story2.id, user_story2.owner.id, [user_story2.owner.id]),
+    ])
+
+
+def test_fanout_on_read_timeline_pages_are_cached(client, settings):
+    settings.TIMELINE_FANOUT_ON_READ = True
+
+    project = factories.ProjectFactory.create(is_private=False, anon_permissions=["view_project", "view_us"],
+                                              public_permissions=["view_project", "view_us"])
+    user_story = factories.UserStoryFactory.create(project=project, subject="test us timeline")
+    history_services.take_snapshot(user_story, user=user_story.owner)
+
+    url = reverse("project-timeline-detail", args=[project.id])
+    response = client.get(url)
+    assert response.status_code == 200
+    assert len(response.data) == 1
+
+    with patch("taiga.timeline.api.ProjectTimeline.get_timeline") as get_timeline_mock:
+        cached_response = client.get(url)
+        assert get_timeline_mock.call_count == 0
+    assert cached_response.data == response.data
+    assert cached_response["x-pagination-current"] == response["x-pagination-current"]
+
+    user_story.subject = "test us timeline updated"
+    user_story.save()
+    history_services.take_snapshot(user_story, user=user_story.owner)
+
+    response = client.get(url)
+    assert len(response.data) == 2
+
+
+def test_fanout_on_read_user_timeline_has_one_row_per_event(settings):
+    user_watcher = factories.UserFactory()
+    user_story = factories.UserStoryFactory.create(subject="test us timeline")
+    user_story.add_watcher(user_watcher)
+    history_services.take_snapshot(user_story, user=user_story.owner)
+
+    # Fan-out on write: a copy of the event for every related person
+    user_timeline = service.get_user_timeline(user_story.owner).filter(event_type="userstories.userstory.create")
+    assert sorted(user_timeline.values_list("object_id", flat=True)) == sorted([user_story.owner.id,
+                                                                                user_watcher.id])
+
+    call_command("compact_timeline_fanout", project=user_story.project_id, stdout=io.StringIO())
+
+    # Fan-out on read: the project event, only once
+    settings.TIMELINE_FANOUT_ON_READ = True
+    user_timeline = service.get_user_timeline(user_story.owner).filter(event_type="userstories.userstory.create")
+    assert [(t.namespace, t.object_id) for t in user_timeline] == [(build_project_namespace(user_story.project),
+                                                                    user_story.project_id)]
+
+
+def test_fanout_on_read_timeline_pages_are_cached_until_the_memberships_change(client, settings):
+    settings.TIMELINE_FANOUT_ON_READ = True
+
+    project = factories.ProjectFactory.create(is_private=True, anon_permissions=[], public_permissions=[])
+    user_story = factories.UserStoryFactory.create(project=project, subject="test us timeline")
+    factories.MembershipFactory.create(project=project, user=user_story.owner, is_admin=True)
+    history_services.take_snapshot(user_story, user=user_story.owner)
+    role = factories.RoleFactory.create(project=project, permissions=["view_project"])
+    membership = factories.MembershipFactory.create(project=project, role=role)
+
+    url = reverse("user-timeline-detail", args=[user_story.owner.id])
+    client.login(membership.user)
+    response = client.get(url)
+    assert response.status_code == 200
+    assert [t["event_type"] for t in response.data if t["event_type"].startswith("userstories.")] == []
+
+    role.permissions = ["view_project", "view_us"]
+    role.save()
+
+    response = client.get(url)
+    assert response.status_code == 200
+    user_story_events = [t["event_type"] for t in response.data if t["event_type"].startswith("userstories.")]
+    assert user_story_events == ["userstories.userstory.create"]
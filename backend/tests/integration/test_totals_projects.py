@@ -13,6 +13,9 @@ from .. import factories as f
 
 from taiga.projects.history.choices import HistoryType
 from taiga.projects.models import Project
+from taiga.projects.services.totals import get_bucket_day
+from taiga.projects.services.totals import get_totals_windows_start_days
+from taiga.projects.services.totals import refresh_projects_totals_windows
 
 from django.urls import reverse
 from django.utils import timezone
@@ -148,3 +151,95 @@ def test_project_totals_updated_on_like(client):
     assert project.total_fans_last_month == 2
     assert project.total_fans_last_year == 3
     assert project.totals_updated_datetime > totals_updated_datetime
+
+
+def test_project_totals_buckets_on_activity():
+    project = f.create_project()
+    now = timezone.now()
+    us = f.UserStoryFactory.create(project=project, owner=project.owner)
+
+    for days in (0, 3, 13):
+        f.HistoryEntryFactory.create(
+            project=project,
+            user={"pk": project.owner.id},
+            comment="",
+            type=HistoryType.change,
+            key="userstories.userstory:{}".format(us.id),
+            is_hidden=False,
+            diff=[],
+            created_at=now - datetime.timedelta(days=days)
+        )
+
+    buckets = {b.day: b.activity for b in project.totals_buckets.all()}
+    assert buckets[get_bucket_day(now)] >= 1
+    assert buckets[get_bucket_day(now - datetime.timedelta(days=3))] == 1
+    assert buckets[get_bucket_day(now - datetime.timedelta(days=13))] == 1
+
+    project = Project.objects.get(id=project.id)
+    totals = (project.total_activity, project.total_activity_last_week,
+              project.total_activity_last_month, project.total_activity_last_year)
+
+    project.refresh_totals()
+    project = Project.objects.get(id=project.id)
+    assert (project.total_activity, project.total_activity_last_week,
+            project.total_activity_last_month, project.total_activity_last_year) == totals
+    assert {b.day: b.activity for b in project.totals_buckets.all()} == buckets
+
+
+def test_project_refresh_totals_windows_start_at_midnight():
+    project = f.create_project()
+    week_start = datetime.datetime.combine(get_totals_windows_start_days()["week"], datetime.time.min,
+                                           tzinfo=timezone.utc)
+
+    l = f.LikeFactory.create(content_object=project)
+    l.created_date = week_start
+    l.save()
+
+    l = f.LikeFactory.create(content_object=project)
+    l.created_date = week_start - datetime.timedelta(seconds=1)
+    l.save()
+
+    project.refresh_totals()
+    project = Project.objects.get(id=project.id)
+
+    # The first like is older than a week, but it is in the first day of the window
+    assert project.total_fans == 2
+    assert project.total_fans_last_week == 1
+    assert project.total_fans_last_month == 2
+
+
+def test_refresh_projects_totals_windows():
+    project = f.create_project()
+    now = timezone.now()
+    Project.objects.filter(id=project.id).update(total_fans=3, total_fans_last_week=3,
+                                                 total_fans_last_month=3, total_fans_last_year=3)
+    project.totals_buckets.all().delete()
+    project.totals_buckets.create(day=get_bucket_day(now - datetime.timedelta(days=10)), fans=2)
+    project.totals_buckets.create(day=get_bucket_day(now - datetime.timedelta(days=100)), fans=1)
+    project.totals_buckets.create(day=get_bucket_day(now - datetime.timedelta(days=400)), fans=5)
+
+    refresh_projects_totals_windows()
+
+    project = Project.objects.get(id=project.id)
+    assert project.total_fans == 3
+    assert project.total_fans_last_week == 0
+    assert project.total_fans_last_month == 2
+    assert project.total_fans_last_year == 3
+    assert project.totals_buckets.count() == 2
+
+
+def test_project_totals_updated_on_unlike(client):
+    project = f.create_project()
+    f.MembershipFactory.create(project=project, user=project.owner, is_admin=True)
+
+    client.login(project.owner)
+    client.post(reverse("projects-like", args=(project.id,)))
+    project = Project.objects.get(id=project.id)
+    assert project.total_fans == 1
+    assert project.total_fans_last_week == 1
+
+    client.post(reverse("projects-unlike", args=(project.id,)))
+    project = Project.objects.get(id=project.id)
+    assert project.total_fans == 0
+    assert project.total_fans_last_week == 0
+    assert project.totals_buckets.get().fans == 0
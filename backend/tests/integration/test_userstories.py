@@ -12,12 +12,17 @@ from datetime import timedelta
 from urllib.parse import quote
 
 from unittest import mock
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
 from taiga.base.utils import json
 from taiga.permissions.choices import MEMBERS_PERMISSIONS, ANON_PERMISSIONS
 from taiga.projects.occ import OCCResourceMixin
+from taiga.projects.services import facets
+from taiga.projects.tagging import services as tagging_services
 from taiga.projects.userstories import services, models
 
 from .. import factories as f
@@ -1199,6 +1204,60 @@ def test_api_filters_data_roles_with_assigned_users(client):
                        response.data["roles"]))["count"] == 1
 
 
+def test_api_filters_data_counts_all_the_facets_in_one_query(client):
+    data = create_uss_fixtures()
+    project = data["project"]
+    (user1, user2, user3, ) = data["users"]
+
+    url = reverse("userstories-filters-data") + "?project={}&owner={}".format(project.id, user1.id)
+    client.login(user1)
+
+    with CaptureQueriesContext(connection) as captured:
+        response = client.get(url)
+    assert response.status_code == 200
+    assert len([q for q in captured.captured_queries if 'FROM "userstories_userstory"' in q["sql"]]) == 1
+
+    # The owners facet ignores its own filter
+    assert next(filter(lambda i: i['id'] == user2.id, response.data["owners"]))["count"] == 4
+    assert sum(status["count"] for status in response.data["statuses"]) == 3
+
+
+def test_api_filters_data_is_cached_until_the_project_changes(client):
+    data = create_uss_fixtures()
+    project = data["project"]
+    (user1, user2, user3, ) = data["users"]
+    (status0, status1, status2, status3, ) = data["statuses"]
+
+    url = reverse("userstories-filters-data") + "?project={}".format(project.id)
+    client.login(user1)
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert next(filter(lambda i: i['id'] == status0.id, response.data["statuses"]))["count"] == 3
+
+    with CaptureQueriesContext(connection) as captured:
+        response = client.get(url)
+    assert response.status_code == 200
+    assert not [q for q in captured.captured_queries if 'FROM "userstories_userstory"' in q["sql"]]
+
+    f.UserStoryFactory.create(project=project, owner=user1, status=status0)
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert next(filter(lambda i: i['id'] == status0.id, response.data["statuses"]))["count"] == 4
+
+
+def test_filters_data_version_is_bumped_again_when_the_transaction_is_committed():
+    project = f.ProjectFactory.create()
+
+    with transaction.atomic():
+        f.UserStoryFactory.create(project=project)
+        # The version a concurrent request could cache the old data with
+        version = facets._get_filters_data_version(project.id)
+
+    assert facets._get_filters_data_version(project.id) != version
+
+
 def test_get_invalid_csv(client):
     url = reverse("userstories-csv")
     project = f.ProjectFactory.create()
@@ -1220,6 +1279,132 @@ def test_get_valid_csv(client):
     assert response.status_code == 200
 
 
+def test_get_valid_csv_is_streamed(client):
+    url = reverse("userstories-csv")
+    project = f.ProjectFactory.create(userstories_csv_uuid=uuid.uuid4().hex)
+    f.UserStoryFactory.create_batch(3, project=project)
+
+    response = client.get(
+        "{}?uuid={}".format(url, project.userstories_csv_uuid))
+    assert response.status_code == 200
+    assert response.streaming
+
+    content = b"".join(response.streaming_content).decode("utf-8")
+    queryset = project.user_stories.all().order_by("ref")
+    assert content == services.userstories_to_csv(project, queryset).getvalue()
+    assert len(list(csv.reader(content.splitlines()))) == 4
+
+
+def test_get_csv_is_conditional_and_served_from_its_snapshot(client):
+    url = reverse("userstories-csv")
+    project = f.ProjectFactory.create(userstories_csv_uuid=uuid.uuid4().hex)
+    us = f.UserStoryFactory.create(project=project, subject="first subject")
+    url = "{}?uuid={}".format(url, project.userstories_csv_uuid)
+
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response["ETag"]
+    assert response["Last-Modified"]
+    assert "first subject" in b"".join(response.streaming_content).decode("utf-8")
+
+    snapshot = project.csv_snapshots.get(entity="userstories")
+    assert snapshot.generated_date == snapshot.modified_date
+    assert default_storage.exists(snapshot.file_name)
+
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response["ETag"] == etag
+
+    with mock.patch("taiga.projects.userstories.services.iter_userstories_csv") as iter_userstories_csv:
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response["ETag"] == etag
+        assert "first subject" in b"".join(response.streaming_content).decode("utf-8")
+        assert not iter_userstories_csv.called
+
+    us.subject = "second subject"
+    us.save()
+
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+    assert "second subject" in b"".join(response.streaming_content).decode("utf-8")
+    assert not default_storage.exists(snapshot.file_name)
+
+    # Other projects and entities don't move the watermark
+    etag = response["ETag"]
+    f.UserStoryFactory.create()
+    f.IssueStatusFactory.create(project=project)
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+
+def test_get_csv_snapshot_is_regenerated_when_the_tags_are_renamed(client):
+    url = reverse("userstories-csv")
+    project = f.ProjectFactory.create(userstories_csv_uuid=uuid.uuid4().hex, tags_colors=[["tag", None]])
+    f.UserStoryFactory.create(project=project, tags=["tag"])
+    url = "{}?uuid={}".format(url, project.userstories_csv_uuid)
+
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response["ETag"]
+
+    tagging_services.rename_tag(project, "tag", "renamed-tag")
+
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert "renamed-tag" in b"".join(response.streaming_content).decode("utf-8")
+
+
+def test_csv_watermarks_are_moved_when_the_transaction_is_committed():
+    project = f.ProjectFactory.create()
+    us = f.UserStoryFactory.create(project=project)
+    snapshot = project.csv_snapshots.create(entity="userstories", modified_date=timezone.now())
+
+    with transaction.atomic():
+        us.subject = "new subject"
+        us.save()
+        assert project.csv_snapshots.get(entity="userstories").modified_date == snapshot.modified_date
+
+    assert project.csv_snapshots.get(entity="userstories").modified_date > snapshot.modified_date
+
+
+def test_csv_generation_queries_dont_depend_on_the_number_of_userstories():
+    project = f.ProjectFactory.create()
+    f.RoleFactory.create(project=project, computable=True)
+    f.UserStoryCustomAttributeFactory.create(project=project)
+    epic = f.EpicFactory.create(project=project)
+    user = f.UserFactory.create()
+
+    def create_userstory():
+        us = f.UserStoryFactory.create(project=project)
+        us.assigned_users.add(user)
+        f.RelatedUserStory.create(epic=epic, user_story=us)
+        f.TaskFactory.create(project=project, user_story=us)
+        f.UserStoryAttachmentFactory.create(project=project, content_object=us)
+
+    def count_queries():
+        queryset = project.user_stories.all().order_by("ref")
+        with CaptureQueriesContext(connection) as ctx:
+            services.userstories_to_csv(project, queryset)
+        return len(ctx.captured_queries)
+
+    create_userstory()
+    queries = count_queries()
+
+    for i in range(5):
+        create_userstory()
+    assert count_queries() == queries
+
+    data = services.userstories_to_csv(project, project.user_stories.all().order_by("ref"))
+    data.seek(0)
+    rows = list(csv.DictReader(data))
+    assert len(rows) == 6
+    assert all(row["attachments"] == "1" for row in rows)
+    assert all(row["assigned_users"] == user.username for row in rows)
+    assert all(row["epics"] == str(epic.ref) for row in rows)
+
+
 def test_custom_fields_csv_generation():
     project = f.ProjectFactory.create(userstories_csv_uuid=uuid.uuid4().hex)
     attr = f.UserStoryCustomAttributeFactory.create(project=project,
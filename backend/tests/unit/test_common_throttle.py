@@ -5,11 +5,15 @@
 #
 # Copyright (c) 2021-present Kaleidos INC
 
+import ipaddress
+
 from django.test import RequestFactory
 from django.core.cache import cache
 from django.contrib.auth.models import AnonymousUser
 
+from taiga.base.api.throttling import SlidingWindowCounter
 from taiga.base.throttling import CommonThrottle
+from taiga.base.throttling import ThrottleWhitelist, get_throttle_whitelist
 from taiga.users.models import User
 
 
@@ -282,3 +286,68 @@ def test_not_whitelisted_subnet_anon_throttling(settings, rf):
     cache.clear()
     settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']['anon-read'] = None
     settings.REST_FRAMEWORK['DEFAULT_THROTTLE_WHITELIST'] = []
+
+def test_sliding_window_counter_weights_the_previous_window():
+    counter = SlidingWindowCounter(cache, timer=lambda: 1000.0)
+    rates = [("test-sliding-window", 4, 60)]
+
+    # Window [960, 1020): 40 seconds elapsed
+    for x in range(4):
+        assert counter.hit(rates) is None
+    assert counter.hit(rates) == 20 + 60 * (1 - 3 / 4)
+    assert counter.check(rates) == 20 + 60 * (1 - 3 / 4)
+
+    # Window [1020, 1080): the 4 previous requests weight 4 * (1 - 30 / 60)
+    counter.timer = lambda: 1050.0
+    assert counter.hit(rates) is None
+    assert counter.hit(rates) is None
+    assert counter.hit(rates) == 60 * (1 - (4 - 1 - 2) / 4) - 30
+    cache.clear()
+
+
+def test_sliding_window_counter_checks_all_the_rates_at_once():
+    counter = SlidingWindowCounter(cache, timer=lambda: 1000.0)
+    rates = [("test-sliding-window-1", 1, 60), ("test-sliding-window-2", 10, 3600)]
+
+    assert counter.hit(rates) is None
+    assert counter.hit(rates) is not None
+    assert cache.get_many(["test-sliding-window-1:16", "test-sliding-window-2:0"]) == {
+        "test-sliding-window-1:16": 1,
+        "test-sliding-window-2:0": 1,
+    }
+
+    counter.add(rates, cost=2)
+    assert cache.get("test-sliding-window-2:0") == 3
+    cache.clear()
+
+
+def test_throttle_whitelist():
+    whitelist = ThrottleWhitelist([1, "10.0.0.0/8", "10.1.0.0/16", "192.168.1.1", "2001:db8::/32", "invalid"])
+
+    assert whitelist.invalid_entries == ["invalid"]
+    assert whitelist.starts[4] == [int(ipaddress.ip_address("10.0.0.0")), int(ipaddress.ip_address("192.168.1.1"))]
+
+    assert whitelist.match(1)
+    assert not whitelist.match(2)
+    assert whitelist.match("10.200.3.4")
+    assert whitelist.match("192.168.1.1")
+    assert not whitelist.match("192.168.1.2")
+    assert not whitelist.match("9.255.255.255")
+    assert not whitelist.match("11.0.0.0")
+    assert whitelist.match("2001:db8::1")
+    assert not whitelist.match("2001:db9::1")
+    assert whitelist.match("::ffff:10.0.0.1")
+    assert not whitelist.match("unknown")
+
+    assert whitelist.stats == {"lookups": 11, "user_matches": 1, "network_matches": 4, "invalid_idents": 1}
+
+
+def test_throttle_whitelist_is_compiled_once(settings):
+    settings.REST_FRAMEWORK['DEFAULT_THROTTLE_WHITELIST'] = ["127.0.0.1"]
+    whitelist = get_throttle_whitelist()
+    assert get_throttle_whitelist() is whitelist
+
+    settings.REST_FRAMEWORK['DEFAULT_THROTTLE_WHITELIST'] = ["127.0.0.2"]
+    assert get_throttle_whitelist() is not whitelist
+    assert get_throttle_whitelist().match("127.0.0.2")
+    settings.REST_FRAMEWORK['DEFAULT_THROTTLE_WHITELIST'] = []
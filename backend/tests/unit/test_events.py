@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Copyright (c) 2021-present Kaleidos INC
+
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+
+from django.core.signals import request_finished
+from django.db import transaction
+
+from taiga.events import events
+from taiga.events.backends import rabbitmq
+
+from .. import factories as f
+from ..utils import FakeAmqpBroker
+
+
+@pytest.fixture
+def broker():
+    broker = FakeAmqpBroker()
+    with patch("taiga.events.backends.rabbitmq.AmqpConnection", broker.connection):
+        rabbitmq._reset_publishers_after_fork()
+        yield broker
+    rabbitmq._reset_publishers_after_fork()
+
+
+@pytest.fixture
+def rabbitmq_settings(settings):
+    settings.EVENTS_PUSH_BACKEND = "taiga.events.backends.rabbitmq.EventsPushBackend"
+    settings.EVENTS_PUSH_BACKEND_OPTIONS = {"url": "//guest:guest@127.0.0.1/"}
+    return settings
+
+
+def _event(n, channel="events"):
+    return {"message": "message-{}".format(n), "routing_key": "key.{}".format(n), "channel": channel}
+
+
+def test_rabbitmq_backend_reuses_the_connection(broker):
+    backend = rabbitmq.EventsPushBackend(url="//guest:guest@127.0.0.1/")
+    backend.emit_event("message-1", routing_key="key.1")
+    backend.emit_events([_event(2), _event(3, channel="other")])
+
+    assert len(broker.connections) == 1
+    assert broker.declared_exchanges == ["events", "other"]
+    assert broker.messages == [("events", "key.1", "message-1"),
+                               ("events", "key.2", "message-2"),
+                               ("other", "key.3", "message-3")]
+
+
+def test_rabbitmq_backend_reconnects_when_the_connection_is_lost(broker):
+    backend = rabbitmq.EventsPushBackend(url="//guest:guest@127.0.0.1/")
+    backend.emit_event("message-1", routing_key="key.1")
+    broker.drop_connections()
+    backend.emit_events([_event(2), _event(3)])
+
+    assert len(broker.connections) == 2
+    assert broker.declared_exchanges == ["events", "events"]
+    assert [m[2] for m in broker.messages] == ["message-1", "message-2", "message-3"]
+
+
+def test_rabbitmq_backend_backoff(broker):
+    backend = rabbitmq.EventsPushBackend(url="//guest:guest@127.0.0.1/")
+    broker.down = True
+    backend.emit_event("message-1", routing_key="key.1")
+    broker.down = False
+
+    # The connection is not retried until the backoff expires
+    backend.emit_event("message-2", routing_key="key.2")
+    assert len(broker.connections) == 1
+    assert broker.messages == []
+
+    publisher = rabbitmq.get_publisher("//guest:guest@127.0.0.1/")
+    publisher.retry_at = 0
+    backend.emit_event("message-3", routing_key="key.3")
+    assert len(broker.connections) == 2
+    assert broker.messages == [("events", "key.3", "message-3")]
+
+
+def test_rabbitmq_publishers_are_not_shared_with_forked_processes(broker):
+    publisher = rabbitmq.get_publisher("//guest:guest@127.0.0.1/")
+    assert rabbitmq.get_publisher("//guest:guest@127.0.0.1/") is publisher
+
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if rabbitmq.get_publisher("//guest:guest@127.0.0.1/") is not publisher else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_events_of_a_transaction_are_sent_in_one_batch(broker, rabbitmq_settings):
+    with patch.object(rabbitmq.EventsPushBackend, "emit_events", autospec=True,
+                      side_effect=rabbitmq.EventsPushBackend.emit_events) as emit_events_mock:
+        with transaction.atomic():
+            events.emit_event({"n": 1}, "key.1", sessionid="session")
+            try:
+                with transaction.atomic():
+                    events.emit_event({"n": 2}, "key.2", sessionid="session")
+                    raise Exception()
+            except Exception:
+                pass
+            with transaction.atomic():
+                events.emit_event({"n": 3}, "key.3", sessionid="session")
+            events.emit_event({"n": 4}, "key.4", sessionid="session")
+
+            assert broker.messages == []
+
+        assert emit_events_mock.call_count == 1
+        assert [json.loads(m[2])["data"]["n"] for m in broker.messages] == [1, 3, 4]
+        assert [m[1] for m in broker.messages] == ["key.1", "key.3", "key.4"]
+
+        with transaction.atomic():
+            events.emit_event({"n": 5}, "key.5", sessionid="session")
+        assert emit_events_mock.call_count == 2
+
+        with transaction.atomic():
+            events.emit_event({"n": 6}, "key.6", sessionid="session")
+            try:
+                with transaction.atomic():
+                    raise Exception()
+            except Exception:
+                pass
+        assert emit_events_mock.call_count == 3
+        assert len(broker.messages) == 5
+
+
+@pytest.mark.django_db(transaction=True)
+def test_events_of_a_transaction_are_sent_when_the_last_one_is_rolled_back(broker, rabbitmq_settings):
+    with transaction.atomic():
+        events.emit_event({"n": 1}, "key.1", sessionid="session")
+        try:
+            with transaction.atomic():
+                events.emit_event({"n": 2}, "key.2", sessionid="session")
+                raise Exception()
+        except Exception:
+            pass
+
+    assert broker.messages == []
+    request_finished.send(sender=None)
+    assert [json.loads(m[2])["data"]["n"] for m in broker.messages] == [1]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_events_outbox_is_bounded(broker, rabbitmq_settings):
+    rabbitmq_settings.EVENTS_PUSH_OUTBOX_MAX_SIZE = 2
+
+    with patch.object(rabbitmq.EventsPushBackend, "emit_events", autospec=True,
+                      side_effect=rabbitmq.EventsPushBackend.emit_events) as emit_events_mock:
+        with transaction.atomic():
+            for n in range(5):
+                events.emit_event({"n": n}, "key", sessionid="session")
+
+        assert [len(c.args[1]) for c in emit_events_mock.call_args_list] == [2, 2, 1]
+        assert len(broker.messages) == 5
+
+
+@pytest.mark.django_db(transaction=True)
+def test_model_events_of_a_transaction_are_coalesced(broker, rabbitmq_settings):
+    with transaction.atomic():
+        events.emit_event_for_ids([1], "userstories.userstory", 1, sessionid="session")
+        events.emit_event_for_ids([2, 3], "userstories.userstory", 1, sessionid="session")
+        events.emit_event_for_ids([1], "userstories.userstory", 1, sessionid="session")
+        events.emit_event_for_ids([4], "userstories.userstory", 1, type="create", sessionid="session")
+        events.emit_event_for_ids([1], "tasks.task", 1, sessionid="session")
+        events.emit_event_for_ids([3], "userstories.userstory", 1, type="delete", sessionid="other")
+        events.emit_event({"title": "notification"}, "live_notifications.1", sessionid="session")
+
+    messages = [(m[1], json.loads(m[2])) for m in broker.messages]
+    assert messages == [
+        ("changes.project.1.userstories",
+         {"session_id": "session", "data": {"type": "change", "matches": "userstories.userstory", "pk": [1, 2]}}),
+        ("changes.project.1.userstories",
+         {"session_id": "session", "data": {"type": "create", "matches": "userstories.userstory", "pk": [4]}}),
+        ("changes.project.1.tasks",
+         {"session_id": "session", "data": {"type": "change", "matches": "tasks.task", "pk": [1]}}),
+        ("changes.project.1.userstories",
+         {"session_id": "other", "data": {"type": "delete", "matches": "userstories.userstory", "pk": [3]}}),
+        ("live_notifications.1",
+         {"session_id": "session", "data": {"title": "notification"}}),
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_single_model_events_are_not_changed(broker, rabbitmq_settings):
+    project = f.ProjectFactory.create()
+    us = f.UserStoryFactory.build(id=10, project=project)
+
+    with transaction.atomic():
+        events.emit_event_for_model(us, sessionid="session")
+        events.emit_event_for_model(us, sessionid="session")
+
+    messages = [json.loads(m[2])["data"] for m in broker.messages if m[1].startswith("changes.project")]
+    assert messages[-1:] == [
+        {"type": "change", "matches": "userstories.userstory", "pk": 10},
+    ]
@@ -10,7 +10,12 @@ import io
 from .. import factories as f
 
 from taiga.base.utils import json
-from taiga.export_import.services import render_project, store_project_from_dict
+from taiga.export_import.services import render_project, store_project_from_dict, open_dump, read_dump
+from taiga.export_import.services.read import DumpSection
+from taiga.projects.history.models import HistoryEntry
+from taiga.projects.history.services import make_key_from_model_object, take_snapshot
+from taiga.projects.notifications.services import add_watcher
+from taiga.timeline.models import Timeline
 
 pytestmark = pytest.mark.django_db(transaction=True)
 
@@ -44,3 +49,131 @@ def test_import_epic_with_user_stories(client):
     assert related_userstory.user_story.ref == user_story.ref
     assert related_userstory.order == 55
     assert related_userstory.epic.ref == epic.ref
+
+
+def test_import_read_dump_with_user_stories_generated_from_issues(client):
+    project = f.ProjectFactory()
+    project.default_points = f.PointsFactory.create(project=project)
+    project.default_issue_type = f.IssueTypeFactory.create(project=project)
+    project.default_issue_status = f.IssueStatusFactory.create(project=project)
+    project.default_us_status = f.UserStoryStatusFactory.create(project=project)
+    project.default_priority = f.PriorityFactory.create(project=project)
+    project.default_severity = f.SeverityFactory.create(project=project)
+
+    issue = f.IssueFactory.create(project=project, status=project.default_issue_status,
+                                  type=project.default_issue_type, priority=project.default_priority,
+                                  severity=project.default_severity, milestone=None)
+    user_stories = f.UserStoryFactory.create_batch(3, project=project, status=project.default_us_status,
+                                                   milestone=None, generated_from_issue=issue)
+    output = io.BytesIO()
+    render_project(project, output)
+    project.delete()
+
+    output.seek(0)
+    document, dump_archive = open_dump(output)
+    project_data = read_dump(document)
+    assert dump_archive is None
+    assert isinstance(project_data["user_stories"], DumpSection)
+    assert isinstance(project_data["issues"], DumpSection)
+    assert [us["ref"] for us in project_data["user_stories"]] == [us.ref for us in user_stories]
+
+    project = store_project_from_dict(project_data)
+    assert project.user_stories.count() == 3
+    assert project.issues.count() == 1
+    assert all(us.generated_from_issue.ref == issue.ref for us in project.user_stories.all())
+
+
+def _get_imported_project_state(project):
+    custom_attributes = dict(project.userstorycustomattributes.values_list("id", "name"))
+
+    def get_items_state(items):
+        return [{
+            "ref": item.ref,
+            "subject": item.subject,
+            "status": item.status.name,
+            "tags": item.tags,
+            "is_closed": getattr(item, "is_closed", None),
+            "finished_date": getattr(item, "finished_date", None) is not None,
+            "watchers": sorted(user.email for user in item.get_watchers()),
+            "custom_attributes_values": {
+                custom_attributes[int(attribute_id)]: value
+                for attribute_id, value in item.custom_attributes_values.attributes_values.items()
+            },
+            "history": sorted(HistoryEntry.objects.filter(key=make_key_from_model_object(item))
+                                                  .values_list("type", "is_snapshot")),
+        } for item in items.order_by("ref")]
+
+    return {
+        "epics": get_items_state(project.epics.all()),
+        "epics_user_stories": [sorted(epic.user_stories.values_list("ref", flat=True))
+                               for epic in project.epics.order_by("ref")],
+        "user_stories": get_items_state(project.user_stories.all()),
+        "user_stories_points": [sorted(us.role_points.values_list("role__name", "points__name"))
+                                for us in project.user_stories.order_by("ref")],
+        "user_stories_assigned_users": [sorted(us.assigned_users.values_list("email", flat=True))
+                                        for us in project.user_stories.order_by("ref")],
+        "user_stories_generated_from_issue": [us.generated_from_issue and us.generated_from_issue.ref
+                                              for us in project.user_stories.order_by("ref")],
+        "tasks": get_items_state(project.tasks.all()),
+        "issues": get_items_state(project.issues.all()),
+        "milestones": [(m.name, m.closed) for m in project.milestones.order_by("name")],
+        "references": sorted(project.references.values_list("ref", flat=True)),
+        "timeline": Timeline.objects.filter(project=project).count(),
+    }
+
+
+def test_import_dump_in_bulk_and_item_by_item(client, settings):
+    project = f.ProjectFactory()
+    project.default_points = f.PointsFactory.create(project=project, name="1", value=1)
+    project.default_issue_type = f.IssueTypeFactory.create(project=project)
+    project.default_issue_status = f.IssueStatusFactory.create(project=project)
+    project.default_epic_status = f.EpicStatusFactory.create(project=project)
+    project.default_us_status = f.UserStoryStatusFactory.create(project=project)
+    project.default_task_status = f.TaskStatusFactory.create(project=project)
+    project.default_priority = f.PriorityFactory.create(project=project)
+    project.default_severity = f.SeverityFactory.create(project=project)
+
+    role = f.RoleFactory.create(project=project, computable=True)
+    points = f.PointsFactory.create(project=project, name="5", value=5)
+    user = f.UserFactory.create()
+    f.MembershipFactory.create(project=project, user=user, role=role)
+    attribute = f.UserStoryCustomAttributeFactory.create(project=project)
+    closed_task_status = f.TaskStatusFactory.create(project=project, is_closed=True)
+    milestone = f.MilestoneFactory.create(project=project)
+
+    issue = f.IssueFactory.create(project=project, status=project.default_issue_status,
+                                  type=project.default_issue_type, priority=project.default_priority,
+                                  severity=project.default_severity, milestone=None)
+    user_stories = f.UserStoryFactory.create_batch(3, project=project, status=project.default_us_status,
+                                                   milestone=milestone, generated_from_issue=issue)
+    user_stories[0].assigned_users.add(user)
+    user_stories[0].role_points.filter(role=role).update(points=points)
+    user_stories[0].custom_attributes_values.attributes_values = {str(attribute.id): "value"}
+    user_stories[0].custom_attributes_values.save()
+    add_watcher(user_stories[0], user)
+    take_snapshot(user_stories[0], user=user)
+    for us in user_stories[:2]:
+        f.TaskFactory.create(project=project, user_story=us, milestone=milestone, status=closed_task_status)
+    epic = f.EpicFactory.create(project=project, status=project.default_epic_status)
+    f.RelatedUserStory.create(epic=epic, user_story=user_stories[1])
+
+    output = io.BytesIO()
+    render_project(project, output)
+    project.delete_related_content()
+    project.delete()
+
+    states = []
+    for bulk in (False, True):
+        settings.IMPORTS_BULK_STORE_ENABLED = bulk
+        output.seek(0)
+        document, _ = open_dump(output)
+        project = store_project_from_dict(read_dump(document))
+        states.append(_get_imported_project_state(project))
+        project.delete_related_content()
+        project.delete()
+
+    assert states[0] == states[1]
+    assert states[1]["user_stories_points"][0] == [(role.name, "5")]
+    assert states[1]["user_stories"][0]["watchers"] == [user.email]
+    assert states[1]["user_stories"][0]["custom_attributes_values"] == {attribute.name: "value"}
+    assert [us["is_closed"] for us in states[1]["user_stories"]] == [True, True, False]
@@ -5,6 +5,8 @@
 #
 # Copyright (c) 2021-present Kaleidos INC
 
+import io
+import json
 import pytest
 
 from unittest import mock
@@ -12,7 +14,8 @@ from unittest import mock
 import django_sites as sites
 import re
 
-from taiga.base.utils.text import sanitize_csv_text_value
+from taiga.base.utils.text import sanitize_csv_text_value, iter_csv
+from taiga.base.utils.json import iter_object
 from taiga.base.utils.urls import (
     get_absolute_url,
     is_absolute_url,
@@ -163,3 +166,53 @@ def test_validate_good_destination_address(url):
 @pytest.mark.parametrize("value, expected", [("=(3+3)", "'=(3+3)"), (5, 5)])
 def test_sanitize_csv_text_value(value, expected):
     assert expected == sanitize_csv_text_value(value)
+
+
+def test_iter_csv():
+    rows = [{"id": i, "subject": "subject, {}\n".format(i)} for i in range(10)]
+
+    chunks = list(iter_csv(["id", "subject"], iter(rows), chunk_size=32))
+    assert len(chunks) > 1
+    assert all(len(chunk) >= 32 for chunk in chunks[:-1])
+
+    data = "".join(chunks)
+    assert data == "".join(iter_csv(["id", "subject"], iter(rows)))
+    assert data.startswith("id,subject\r\n0,\"subject, 0\n\"\r\n")
+
+    assert list(iter_csv(["id"], iter([]))) == ["id\r\n"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_iter_object(chunk_size):
+    data = {
+        "name": "Project",
+        "items": [{"id": i, "subject": "subject {}".format(i)} for i in range(10)],
+        "skipped": [[1, 2], [3]],
+        "empty": [],
+        "not_an_array": 12345,
+    }
+    text = json.dumps(data, indent=2)
+
+    members = []
+    for name, value in iter_object(io.StringIO(text), arrays=("items", "skipped", "empty", "not_an_array"),
+                                   chunk_size=chunk_size):
+        if name in ("items", "empty"):
+            value = list(value)
+        if name != "skipped":
+            members.append((name, value))
+
+    assert members == [(name, value) for name, value in data.items() if name != "skipped"]
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 24))
+def test_iter_object_with_numbers_cut_by_the_chunks(chunk_size):
+    text = '{"a": 12.5, "b": -1.5e+10, "c": 1E-2, "d": 100, "e": 0.25}'
+
+    assert list(iter_object(io.StringIO(text), chunk_size=chunk_size)) == list(json.loads(text).items())
+
+
+@pytest.mark.parametrize("text", ["[]", "{", '{"name": }', '{"a": 1 "b": 2}', '{"items": [1 2]}'])
+def test_iter_object_with_invalid_json(text):
+    with pytest.raises(ValueError):
+        for name, value in iter_object(io.StringIO(text), arrays=("items",)):
+            pass
@@ -7,6 +7,8 @@
 
 from django.db.models import signals
 
+from amqp.exceptions import RecoverableConnectionError
+
 DUMMY_BMP_DATA = b'BM:\x00\x00\x00\x00\x00\x00\x006\x00\x00\x00(\x00\x00\x00\x01\x00\x00\x00\x01\x00\x00\x00\x01\x00\x18\x00\x00\x00\x00\x00\x04\x00\x00\x00\x13\x0b\x00\x00\x13\x0b\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
 
 
@@ -66,3 +68,65 @@ def helper_test_http_method_and_count(client, method, url, data, users, after_ea
 def helper_test_http_method_and_keys(client, method, url, data, users, after_each_request=None):
     responses = _helper_test_http_method_responses(client, method, url, data, users, after_each_request)
     return list(map(lambda r: (r.status_code, set(r.data.keys() if isinstance(r.data, dict) and 200 <= r.status_code < 300 else [])), responses))
+
+
+class FakeAmqpBroker:
+    """
+    A local stand-in for RabbitMQ: use `broker.connection` instead of
+    `amqp.Connection` to record the published messages without a real broker.
+    """
+
+    def __init__(self):
+        self.connections = []
+        self.declared_exchanges = []
+        self.messages = []
+        self.down = False
+
+    def connection(self, **kwargs):
+        connection = FakeAmqpConnection(self, **kwargs)
+        self.connections.append(connection)
+        return connection
+
+    def drop_connections(self):
+        for connection in self.connections:
+            connection.broken = True
+
+
+class FakeAmqpConnection:
+    def __init__(self, broker, **kwargs):
+        self.broker = broker
+        self.kwargs = kwargs
+        self.connected = False
+        self.broken = False
+
+    def connect(self):
+        if self.broker.down:
+            raise ConnectionRefusedError()
+        self.connected = True
+
+    def channel(self):
+        return FakeAmqpChannel(self)
+
+    def close(self):
+        self.connected = False
+
+
+class FakeAmqpChannel:
+    def __init__(self, connection):
+        self.connection = connection
+
+    @property
+    def is_open(self):
+        return self.connection.connected
+
+    def _check(self):
+        if self.connection.broken:
+            raise RecoverableConnectionError("connection lost")
+
+    def exchange_declare(self, exchange, type, **kwargs):
+        self._check()
+        self.connection.broker.declared_exchanges.append(exchange)
+
+    def basic_publish(self, msg, exchange="", routing_key="", **kwargs):
+        self._check()
+        self.connection.broker.messages.append((exchange, routing_key, msg.body))